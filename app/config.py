@@ -0,0 +1,177 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+from dotenv import load_dotenv
+import os
+
+
+def _flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+@dataclass(frozen=True)
+class Settings:
+    database_url: Optional[str]
+    database_replica_url: Optional[str]
+    replica_max_lag: float
+    replica_check_interval: float
+    replica_retry_seconds: float
+    background_workers: bool
+    port: int
+    web_concurrency: int
+    db_max_connections: int
+    db_reserved_connections: int
+    db_pool_timeout: float
+    graceful_timeout: float
+
+    jwt_secret: Optional[str]
+    jwt_algorithm: Optional[str]
+    jwt_expiry_hours: Optional[str]
+    google_client_id: Optional[str]
+    google_client_secret: Optional[str]
+    redirect_url: Optional[str]
+    google_token_url: str
+    google_certs_url: str
+    google_timeout: float
+    google_jwks_refresh_margin: float
+
+    paystack_secret: Optional[str]
+    paystack_base_url: str
+    paystack_max_connections: int
+    paystack_max_keepalive: int
+    paystack_keepalive_expiry: float
+    paystack_timeout: float
+    paystack_connect_timeout: float
+    paystack_breaker_failures: int
+    paystack_breaker_reset: float
+
+    api_key_cache_size: int
+    api_key_cache_ttl: float
+    invalid_api_key_cache_ttl: float
+    principal_cache_size: int
+    principal_cache_ttl: float
+
+    api_key_rate_limit: int
+    api_key_max_rate_limit: int
+    user_rate_limit: int
+    rate_limit_shards: int
+    rate_limit_max_buckets: int
+    load_shed_pool_ratio: float
+
+    export_batch_size: int
+    webhook_batch_size: int
+    webhook_poll_interval: float
+    snapshot_interval: float
+    snapshot_min_entries: int
+    snapshot_batch_size: int
+    snapshot_settle_seconds: int
+    idempotency_ttl_hours: int
+    idempotency_wait_timeout: float
+    idempotency_poll_interval: float
+    idempotency_sweep_batch_size: int
+    idempotency_sweep_interval: float
+    pubsub_backend: str
+    deposit_stream_timeout: float
+    sse_heartbeat_interval: float
+    api_key_sweep_interval: float
+    api_key_sweep_batch_size: int
+    api_key_archive_grace_days: int
+    reconcile_interval: float
+    reconcile_min_age: float
+    reconcile_batch_size: int
+    reconcile_concurrency: int
+    reconcile_rate: float
+    transaction_hot_months: int
+    transaction_partitions_ahead: int
+    archive_interval: float
+    archive_batch_size: int
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        load_dotenv()
+        return cls(
+            database_url=os.getenv("DATABASE_URL"),
+            database_replica_url=os.getenv("DATABASE_REPLICA_URL") or None,
+            replica_max_lag=float(os.getenv("REPLICA_MAX_LAG", "5")),
+            replica_check_interval=float(os.getenv("REPLICA_CHECK_INTERVAL", "2")),
+            replica_retry_seconds=float(os.getenv("REPLICA_RETRY_SECONDS", "30")),
+            background_workers=_flag("BACKGROUND_WORKERS", "true"),
+            port=int(os.getenv("PORT", "8000")),
+            web_concurrency=int(os.getenv("WEB_CONCURRENCY") or os.cpu_count() or 1),
+            db_max_connections=int(os.getenv("DB_MAX_CONNECTIONS", "100")),
+            db_reserved_connections=int(os.getenv("DB_RESERVED_CONNECTIONS", "10")),
+            db_pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "10")),
+            graceful_timeout=float(os.getenv("GRACEFUL_TIMEOUT", "30")),
+
+            jwt_secret=os.getenv("JWT_SECRET"),
+            jwt_algorithm=os.getenv("JWT_ALGORITHM"),
+            jwt_expiry_hours=os.getenv("JWT_EXPIRY_HOURS"),
+            google_client_id=os.getenv("GOOGLE_CLIENT_ID"),
+            google_client_secret=os.getenv("GOOGLE_CLIENT_SECRET"),
+            redirect_url=os.getenv("REDIRECT_URL"),
+            google_token_url=os.getenv("GOOGLE_TOKEN_URL", "https://oauth2.googleapis.com/token"),
+            google_certs_url=os.getenv("GOOGLE_CERTS_URL", "https://www.googleapis.com/oauth2/v3/certs"),
+            google_timeout=float(os.getenv("GOOGLE_TIMEOUT", "10")),
+            google_jwks_refresh_margin=float(os.getenv("GOOGLE_JWKS_REFRESH_MARGIN", "300")),
+
+            paystack_secret=os.getenv("PAYSTACK_SECRET"),
+            paystack_base_url=os.getenv("PAYSTACK_BASE_URL", "https://api.paystack.co"),
+            paystack_max_connections=int(os.getenv("PAYSTACK_MAX_CONNECTIONS", "100")),
+            paystack_max_keepalive=int(os.getenv("PAYSTACK_MAX_KEEPALIVE", "20")),
+            paystack_keepalive_expiry=float(os.getenv("PAYSTACK_KEEPALIVE_EXPIRY", "30")),
+            paystack_timeout=float(os.getenv("PAYSTACK_TIMEOUT", "10")),
+            paystack_connect_timeout=float(os.getenv("PAYSTACK_CONNECT_TIMEOUT", "5")),
+            paystack_breaker_failures=int(os.getenv("PAYSTACK_BREAKER_FAILURES", "5")),
+            paystack_breaker_reset=float(os.getenv("PAYSTACK_BREAKER_RESET", "30")),
+
+            api_key_cache_size=int(os.getenv("API_KEY_CACHE_SIZE", "10000")),
+            api_key_cache_ttl=float(os.getenv("API_KEY_CACHE_TTL", "60")),
+            invalid_api_key_cache_ttl=float(os.getenv("INVALID_API_KEY_CACHE_TTL", "30")),
+            principal_cache_size=int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000")),
+            principal_cache_ttl=float(os.getenv("PRINCIPAL_CACHE_TTL", "300")),
+
+            api_key_rate_limit=int(os.getenv("API_KEY_RATE_LIMIT", "600")),
+            api_key_max_rate_limit=int(
+                os.getenv("API_KEY_MAX_RATE_LIMIT") or os.getenv("API_KEY_RATE_LIMIT", "600")),
+            user_rate_limit=int(os.getenv("USER_RATE_LIMIT", "600")),
+            rate_limit_shards=int(os.getenv("RATE_LIMIT_SHARDS", "64")),
+            rate_limit_max_buckets=int(os.getenv("RATE_LIMIT_MAX_BUCKETS", "100000")),
+            load_shed_pool_ratio=float(os.getenv("LOAD_SHED_POOL_RATIO", "0.9")),
+
+            export_batch_size=int(os.getenv("EXPORT_BATCH_SIZE", "1000")),
+            webhook_batch_size=int(os.getenv("WEBHOOK_BATCH_SIZE", "200")),
+            webhook_poll_interval=float(os.getenv("WEBHOOK_POLL_INTERVAL", "1")),
+            snapshot_interval=float(os.getenv("SNAPSHOT_INTERVAL", "300")),
+            snapshot_min_entries=int(os.getenv("SNAPSHOT_MIN_ENTRIES", "100")),
+            snapshot_batch_size=int(os.getenv("SNAPSHOT_BATCH_SIZE", "500")),
+            snapshot_settle_seconds=int(os.getenv("SNAPSHOT_SETTLE_SECONDS", "60")),
+            idempotency_ttl_hours=int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24")),
+            idempotency_wait_timeout=float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", "30")),
+            idempotency_poll_interval=float(os.getenv("IDEMPOTENCY_POLL_INTERVAL", "0.2")),
+            idempotency_sweep_batch_size=int(os.getenv("IDEMPOTENCY_SWEEP_BATCH_SIZE", "500")),
+            idempotency_sweep_interval=float(os.getenv("IDEMPOTENCY_SWEEP_INTERVAL", "60")),
+            pubsub_backend=os.getenv("PUBSUB_BACKEND", "local"),
+            deposit_stream_timeout=float(os.getenv("DEPOSIT_STREAM_TIMEOUT", "600")),
+            sse_heartbeat_interval=float(os.getenv("SSE_HEARTBEAT_INTERVAL", "15")),
+            api_key_sweep_interval=float(os.getenv("API_KEY_SWEEP_INTERVAL", "300")),
+            api_key_sweep_batch_size=int(os.getenv("API_KEY_SWEEP_BATCH_SIZE", "500")),
+            api_key_archive_grace_days=int(os.getenv("API_KEY_ARCHIVE_GRACE_DAYS", "7")),
+            reconcile_interval=float(os.getenv("RECONCILE_INTERVAL", "300")),
+            reconcile_min_age=float(os.getenv("RECONCILE_MIN_AGE", "900")),
+            reconcile_batch_size=int(os.getenv("RECONCILE_BATCH_SIZE", "100")),
+            reconcile_concurrency=int(os.getenv("RECONCILE_CONCURRENCY", "8")),
+            reconcile_rate=float(os.getenv("RECONCILE_RATE", "20")),
+            transaction_hot_months=int(os.getenv("TRANSACTION_HOT_MONTHS", "6")),
+            transaction_partitions_ahead=int(os.getenv("TRANSACTION_PARTITIONS_AHEAD", "2")),
+            archive_interval=float(os.getenv("ARCHIVE_INTERVAL", "86400")),
+            archive_batch_size=int(os.getenv("ARCHIVE_BATCH_SIZE", "1000")),
+        )
+
+
+@lru_cache
+def get_settings() -> Settings:
+    """Read configuration from the environment (and .env) once per process"""
+    return Settings.from_env()
+
+
+settings = get_settings()
@@ -1,24 +1,65 @@
-from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from dotenv import load_dotenv
-import os
-
-load_dotenv()
-
-DATABASE_URL = os.getenv("DATABASE_URL")
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={
-        "check_same_thread": False} if "sqlite" in DATABASE_URL else {},
-    pool_pre_ping=True,
-    pool_recycle=1800)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+from app.config import settings
+
+DATABASE_URL = settings.database_url
+DATABASE_REPLICA_URL = settings.database_replica_url
+# Every process sizes its pools so WEB_CONCURRENCY of them together stay
+# within DB_MAX_CONNECTIONS, less DB_RESERVED_CONNECTIONS for operators
+WEB_CONCURRENCY = settings.web_concurrency
+DB_MAX_CONNECTIONS = settings.db_max_connections
+DB_RESERVED_CONNECTIONS = settings.db_reserved_connections
+DB_POOL_TIMEOUT = settings.db_pool_timeout
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "postgresql+psycopg": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(url: str) -> str:
+    """Swap the sync driver in a database URL for its asyncio equivalent"""
+    scheme, sep, rest = url.partition("://")
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}{sep}{rest}"
+
+
+def pool_limits(workers: int = WEB_CONCURRENCY) -> tuple[int, int]:
+    """Per-process (pool_size, max_overflow) for a connection budget shared by `workers` processes"""
+    per_worker = (DB_MAX_CONNECTIONS - DB_RESERVED_CONNECTIONS) // max(workers, 1)
+    if settings.pubsub_backend == "postgres":
+        # The LISTEN connection sits outside the pool
+        per_worker -= 1
+    per_worker = max(per_worker, 1)
+    max_overflow = per_worker // 4
+    return per_worker - max_overflow, max_overflow
+
+
+def make_engine(url: str):
+    url = to_async_url(url)
+    options = {"pool_pre_ping": True, "pool_recycle": 1800}
+    if not url.startswith("sqlite"):
+        pool_size, max_overflow = pool_limits()
+        options.update(
+            pool_size=pool_size, max_overflow=max_overflow, pool_timeout=DB_POOL_TIMEOUT)
+    return create_async_engine(url, **options)
+
+
+async_engine = make_engine(DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# Optional read replica for read-only routes; see app/utils/replicas.py
+replica_engine = make_engine(DATABASE_REPLICA_URL) if DATABASE_REPLICA_URL else None
+ReplicaSessionLocal = async_sessionmaker(
+    replica_engine, class_=AsyncSession, autoflush=False,
+    expire_on_commit=False) if replica_engine else None
+
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
@@ -1,12 +1,53 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.responses import JSONResponse
-import uvicorn
-import os
+from contextlib import asynccontextmanager
+import asyncio
 
 from app.app_routers.v1 import api_router
 from app.routes.health.health import router as health_router
+from app.config import settings
+from app.db.connectDB import async_engine, replica_engine
+from app.utils import google, paystack, pubsub, lifecycle
+from app.utils.rate_limit import RateLimitMiddleware
+from app.utils.metrics import MetricsMiddleware
+from app.workers import webhooks, snapshots, idempotency, reconciler, replica, api_keys, archival
 
-app = FastAPI(title="Wallet Service")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await paystack.open_client()
+    await google.open_client()
+    await pubsub.start()
+    lifecycle.watch_shutdown_signals()
+    tasks = []
+    if lifecycle.runs_background:
+        tasks.append(asyncio.create_task(webhooks.run()))
+        tasks.append(asyncio.create_task(snapshots.run()))
+        tasks.append(asyncio.create_task(idempotency.run()))
+        tasks.append(asyncio.create_task(reconciler.run()))
+        tasks.append(asyncio.create_task(api_keys.run()))
+        tasks.append(asyncio.create_task(archival.run()))
+    if replica_engine is not None:
+        # Replica health is per process, so every worker probes it
+        tasks.append(asyncio.create_task(replica.run()))
+    try:
+        yield
+    finally:
+        await lifecycle.drain(settings.graceful_timeout)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await pubsub.stop()
+        await paystack.close_client()
+        await google.close_client()
+        await async_engine.dispose()
+        if replica_engine is not None:
+            await replica_engine.dispose()
+
+
+app = FastAPI(title="Wallet Service", lifespan=lifespan)
+app.add_middleware(RateLimitMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 @app.get('/')
 def hello():
@@ -20,7 +61,8 @@ def hello():
 async def http_exception_handler(request, exc):
     return JSONResponse(
         status_code=exc.status_code,
-        content={"detail": exc.detail}
+        content={"detail": exc.detail},
+        headers=exc.headers
     )
 
 
@@ -28,5 +70,5 @@ app.include_router(health_router)
 app.include_router(api_router)
 
 if __name__ == "__main__":
-    port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=settings.port)
@@ -0,0 +1,145 @@
+from sqlalchemy import select
+from app.db.connectDB import AsyncSessionLocal, Base, async_engine
+from app.schemas.schemas import Wallet
+from app.utils.shards import set_shard_count
+from app.utils.rollups import backfill
+from app.utils.ledger import convert_legacy_balances
+from app.utils.schema import add_missing_columns, add_missing_indexes
+from app.utils import api_keys
+from app.utils.partitions import ensure_partitions, archive_once, hot_cutoff, ARCHIVE_BATCH_SIZE
+from datetime import date, datetime
+import argparse
+import asyncio
+
+
+async def migrate(args=None):
+    """Bring the schema up to date: missing tables, columns, indexes and partitions"""
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        added = await add_missing_columns(conn)
+        if added:
+            print(f"Added columns {', '.join(added)}")
+        indexed = await add_missing_indexes(conn)
+        if indexed:
+            print(f"Created indexes {', '.join(indexed)}")
+        if await convert_legacy_balances(conn):
+            print("Converted wallet balances to minor units and opened their ledgers")
+        created = await ensure_partitions(conn)
+    if created:
+        print(f"Created partitions {', '.join(created)}")
+    if {"users.active_api_keys", "api_keys.counted"} & set(added):
+        # New counters start at 0; count the keys that were already active
+        async with AsyncSessionLocal() as db:
+            await api_keys.recount(db)
+        print("Counted existing active API keys")
+    print("Schema is up to date")
+
+
+async def shard_wallet(args):
+    """Spread a wallet's balance over N shard rows (0 unshards it)"""
+    async with AsyncSessionLocal() as db:
+        wallet_id = await db.scalar(select(Wallet.id).filter(
+            Wallet.wallet_number == args.wallet_number))
+        if not wallet_id:
+            raise SystemExit(f"error: wallet {args.wallet_number} not found")
+        await set_shard_count(db, wallet_id, args.shard_count)
+    print(f"Wallet {args.wallet_number} now has {args.shard_count} shard(s)")
+
+
+async def unshard_wallet(args):
+    """Fold a sharded wallet back into a single row"""
+    args.shard_count = 0
+    await shard_wallet(args)
+
+
+async def backfill_rollups(args):
+    """Rebuild daily wallet rollups for past days from the ledger"""
+    until = args.until or datetime.utcnow().date()
+    async with AsyncSessionLocal() as db:
+        processed = await backfill(db, until, args.batch_size)
+    print(f"Rolled up {processed} ledger entries before {until}")
+
+
+async def recount_api_keys(args):
+    """Rebuild per-user active API key counters from the keys table"""
+    async with AsyncSessionLocal() as db:
+        await api_keys.recount(db)
+    print("Active API key counters rebuilt")
+
+
+async def archive_transactions(args):
+    """Move transactions older than the hot window into transactions_archive"""
+    moved = 0
+    async with AsyncSessionLocal() as db:
+        while True:
+            batch = await archive_once(db)
+            moved += batch
+            if batch < ARCHIVE_BATCH_SIZE:
+                break
+    print(f"Transactions before {hot_cutoff().date()} are archived ({moved} rows copied)")
+
+
+def shard_count(value: str) -> int:
+    count = int(value)
+    if count < 0:
+        raise argparse.ArgumentTypeError("must not be negative")
+    return count
+
+
+def rollup_until(value: str) -> date:
+    try:
+        until = date.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM-DD, got {value!r}")
+    if until > datetime.utcnow().date():
+        # Today's rows are being written live; rebuilding them would drop those writes
+        raise argparse.ArgumentTypeError("cannot be later than today")
+    return until
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.manage", description="Wallet service operator commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate_command = commands.add_parser("migrate", help=migrate.__doc__)
+    migrate_command.set_defaults(handler=migrate)
+
+    shard = commands.add_parser("shard", help=shard_wallet.__doc__)
+    shard.add_argument("wallet_number")
+    shard.add_argument("shard_count", type=shard_count)
+    shard.set_defaults(handler=shard_wallet)
+
+    unshard = commands.add_parser("unshard", help=unshard_wallet.__doc__)
+    unshard.add_argument("wallet_number")
+    unshard.set_defaults(handler=unshard_wallet)
+
+    rollups = commands.add_parser("backfill-rollups", help=backfill_rollups.__doc__)
+    rollups.add_argument("--until", type=rollup_until,
+                         help="first day not to rebuild (default: today, UTC)")
+    rollups.add_argument("--batch-size", type=int, default=5000)
+    rollups.set_defaults(handler=backfill_rollups)
+
+    recount = commands.add_parser("recount-api-keys", help=recount_api_keys.__doc__)
+    recount.set_defaults(handler=recount_api_keys)
+
+    archive = commands.add_parser("archive-transactions", help=archive_transactions.__doc__)
+    archive.set_defaults(handler=archive_transactions)
+
+    return parser
+
+
+async def run(args):
+    try:
+        await args.handler(args)
+    finally:
+        await async_engine.dispose()
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
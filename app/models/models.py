@@ -1,7 +1,9 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
+from decimal import Decimal
 from enum import Enum
-from typing import List
-from datetime import datetime
+from typing import List, Optional
+from datetime import datetime, date
+from app.config import settings
 
 
 class PermissionEnum(str, Enum):
@@ -17,6 +19,18 @@ class ExpiryEnum(str, Enum):
     ONE_YEAR = "1Y"
 
 
+class ExportFormatEnum(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+def whole_kobo(amount: float) -> float:
+    """Reject amounts with fractions of a kobo, which the ledger would round away"""
+    if Decimal(str(amount)).as_tuple().exponent < -2:
+        raise ValueError("Amount must have at most 2 decimal places")
+    return amount
+
+
 class GoogleTokenRequest(BaseModel):
     token: str
 
@@ -25,6 +39,8 @@ class CreateApiKeyRequest(BaseModel):
     name: str
     permissions: List[PermissionEnum]
     expiry: ExpiryEnum
+    # Keys may set their own limit, but never above the operator's cap
+    rate_limit: Optional[int] = Field(None, gt=0, le=settings.api_key_max_rate_limit)
 
 
 class RolloverApiKeyRequest(BaseModel):
@@ -35,11 +51,19 @@ class RolloverApiKeyRequest(BaseModel):
 class DepositRequest(BaseModel):
     amount: float = Field(gt=0)
 
+    _whole_kobo = field_validator("amount")(whole_kobo)
+
 
 class TransferRequest(BaseModel):
     wallet_number: str
     amount: float = Field(gt=0)
 
+    _whole_kobo = field_validator("amount")(whole_kobo)
+
+
+class BatchTransferRequest(BaseModel):
+    transfers: List[TransferRequest] = Field(min_length=1, max_length=1000)
+
 
 class ApiKeyResponse(BaseModel):
     api_id: str
@@ -47,6 +71,17 @@ class ApiKeyResponse(BaseModel):
     expires_at: datetime
 
 
+class ApiKeyInfo(BaseModel):
+    api_id: str
+    name: Optional[str]
+    permissions: List[str]
+    rate_limit: Optional[int]
+    expires_at: datetime
+    revoked: bool
+    active: bool
+    created_at: datetime
+
+
 class DepositResponse(BaseModel):
     reference: str
     authorization_url: str
@@ -57,11 +92,52 @@ class WalletBalance(BaseModel):
 
 
 class TransactionResponse(BaseModel):
+    id: str
     type: str
     amount: float
     status: str
+    reference: Optional[str] = None
+    created_at: datetime
+
+
+class TransactionPage(BaseModel):
+    transactions: List[TransactionResponse]
+    next_cursor: Optional[str] = None
+
+
+class SummaryTotals(BaseModel):
+    deposits: float
+    deposits_count: int
+    transfers_in: float
+    transfers_in_count: int
+    transfers_out: float
+    transfers_out_count: int
+
+
+class DailySummary(SummaryTotals):
+    day: date
+
+
+class WalletSummary(BaseModel):
+    start: date
+    end: date
+    totals: SummaryTotals
+    days: List[DailySummary]
 
 
 class TransferResponse(BaseModel):
     status: str
     message: str
+
+
+class BatchTransferItemResult(BaseModel):
+    wallet_number: str
+    amount: float
+    status: str
+    message: str
+
+
+class BatchTransferResponse(BaseModel):
+    status: str
+    total: float
+    results: List[BatchTransferItemResult]
@@ -2,24 +2,18 @@ from fastapi import APIRouter, HTTPException, Depends
 from fastapi.responses import RedirectResponse
 from app.schemas.schemas import User, Wallet
 from app.db.connectDB import get_db
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
-import google.auth.transport.requests
-import google.oauth2.id_token
+from app.utils import google
+from app.config import settings
 import secrets
-import httpx
 import jwt
-import os
 
-load_dotenv()
-
-GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
-GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
-JWT_SECRET = os.getenv("JWT_SECRET")
-JWT_ALGORITHM = os.getenv("JWT_ALGORITHM")
-JWT_EXPIRY_HOURS = os.getenv("JWT_EXPIRY_HOURS")
-REDIRECT_URL = os.getenv('REDIRECT_URL')
+GOOGLE_CLIENT_ID = settings.google_client_id
+JWT_SECRET = settings.jwt_secret
+JWT_ALGORITHM = settings.jwt_algorithm
+JWT_EXPIRY_HOURS = settings.jwt_expiry_hours
+REDIRECT_URL = settings.redirect_url
 
 router = APIRouter(prefix="/auth/google", tags=["Authentication"])
 
@@ -32,33 +26,18 @@ async def google_login():
 
 
 @router.get("/callback")
-async def google_callback(code: str, db: Session = Depends(get_db)):
+async def google_callback(code: str, db: AsyncSession = Depends(get_db)):
     """Handle Google OAuth callback"""
     try:
-        async with httpx.AsyncClient() as client:
-            token_response = await client.post(
-                "https://oauth2.googleapis.com/token",
-                data={
-                    "code": code,
-                    "client_id": GOOGLE_CLIENT_ID,
-                    "client_secret": GOOGLE_CLIENT_SECRET,
-                    "redirect_uri": f"{REDIRECT_URL}/auth/google/callback",
-                    "grant_type": "authorization_code"
-                }
-            )
-
-        token_data = token_response.json()
-        id_token = token_data.get("id_token")
-
-        request = google.auth.transport.requests.Request()
-        id_info = google.oauth2.id_token.verify_oauth2_token(
-            id_token, request, GOOGLE_CLIENT_ID)
+        id_token = await google.exchange_code(
+            code, f"{REDIRECT_URL}/auth/google/callback")
+        id_info = await google.verify_id_token(id_token)
 
         user_id = id_info["sub"]
         email = id_info["email"]
         name = id_info.get("name", "")
 
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await db.get(User, user_id)
         if not user:
             user = User(id=user_id, email=email, name=name)
             db.add(user)
@@ -67,7 +46,7 @@ async def google_callback(code: str, db: Session = Depends(get_db)):
             wallet = Wallet(id=secrets.token_hex(
                 8), user_id=user_id, wallet_number=wallet_number)
             db.add(wallet)
-            db.commit()
+            await db.commit()
 
         payload = {
             "sub": user_id,
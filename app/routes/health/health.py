@@ -1,4 +1,11 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Response
+from fastapi.responses import JSONResponse
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.connectDB import get_db
+from app.utils.replicas import check_replica
+from app.utils import paystack, lifecycle
+from app.workers import webhooks, reconciler
 
 router = APIRouter(prefix="", tags=["Health"])
 
@@ -7,3 +14,42 @@ router = APIRouter(prefix="", tags=["Health"])
 async def health_check():
     """Health check endpoint"""
     return {"status": "ok"}
+
+
+@router.get("/healthz/worker")
+async def worker_health():
+    """This worker process's identity, drain state and DB pool; 503 while draining"""
+    return JSONResponse(
+        status_code=503 if lifecycle.draining else 200,
+        content=lifecycle.stats()
+    )
+
+
+@router.get("/healthz/webhooks")
+async def webhook_queue_health(db: AsyncSession = Depends(get_db)):
+    """Webhook queue depth, lag and worker counters"""
+    return await webhooks.queue_stats(db)
+
+
+@router.get("/healthz/reconciler")
+async def reconciler_health():
+    """Pending-deposit reconciliation backlog and counters"""
+    return reconciler.stats
+
+
+@router.get("/healthz/paystack")
+async def paystack_health():
+    """Paystack circuit breaker state"""
+    return paystack.breaker.snapshot()
+
+
+@router.get("/healthz/replica")
+async def replica_health():
+    """Read replica reachability, lag and whether reads are using it"""
+    return await check_replica()
+
+
+@router.get("/metrics")
+async def metrics():
+    """Prometheus metrics"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,40 +1,66 @@
 from fastapi import APIRouter, HTTPException, Depends
-from app.models.models import RolloverApiKeyRequest, ApiKeyResponse, CreateApiKeyRequest
-from app.utils.utils import get_current_user, get_db, convert_expiry
+from app.models.models import RolloverApiKeyRequest, ApiKeyResponse, CreateApiKeyRequest, ApiKeyInfo
+from app.utils.utils import get_current_user, get_db, convert_expiry, hash_api_key, invalidate_api_key
 from app.schemas.schemas import ApiKey
 from app.db.connectDB import get_db
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from app.utils import api_keys
+from typing import List
 from datetime import datetime
-from dotenv import load_dotenv
 import secrets
-import hashlib
-
-load_dotenv()
 
 router = APIRouter(prefix="/keys", tags=["API Keys"])
 
 
+@router.get("", response_model=List[ApiKeyInfo])
+async def list_api_keys(
+    current_user: tuple = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """List your API keys, newest first (archived keys are not included)"""
+    user_id, _ = current_user
+
+    result = await db.execute(
+        select(ApiKey)
+        .filter(ApiKey.user_id == user_id)
+        .order_by(ApiKey.created_at.desc())
+    )
+    now = datetime.utcnow()
+    return [
+        ApiKeyInfo(
+            api_id=key.id,
+            name=key.name,
+            permissions=key.permissions.split(",") if key.permissions else [],
+            rate_limit=key.rate_limit,
+            expires_at=key.expires_at,
+            revoked=bool(key.revoked),
+            active=not key.revoked and key.expires_at > now,
+            created_at=key.created_at
+        )
+        for key in result.scalars()
+    ]
+
+
 @router.post("/create", response_model=ApiKeyResponse)
 async def create_api_key(
     req: CreateApiKeyRequest,
     current_user: tuple = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new API key"""
     user_id, _ = current_user
 
-    active_keys = db.query(ApiKey).filter(
-        ApiKey.user_id == user_id,
-        ApiKey.revoked == False,
-        ApiKey.expires_at > datetime.utcnow()
-    ).count()
-
-    if active_keys >= 5:
+    # One conditional UPDATE on the user's counter instead of a count() per call;
+    # it also closes the race where two concurrent creates both passed the check
+    if not await api_keys.claim_slot(db, user_id):
+        await db.rollback()
         raise HTTPException(
-            status_code=400, detail="Maximum 5 active API keys allowed")
+            status_code=400,
+            detail=f"Maximum {api_keys.MAX_ACTIVE_API_KEYS} active API keys allowed")
 
     raw_key = f"sk_live_{secrets.token_urlsafe(32)}"
-    key_hash = hashlib.sha256(raw_key.encode()).hexdigest()
+    key_hash = hash_api_key(raw_key)
     expires_at = convert_expiry(req.expiry)
 
     api_key = ApiKey(
@@ -43,10 +69,12 @@ async def create_api_key(
         key_hash=key_hash,
         name=req.name,
         permissions=",".join(req.permissions),
-        expires_at=expires_at
+        rate_limit=req.rate_limit,
+        expires_at=expires_at,
+        counted=True
     )
     db.add(api_key)
-    db.commit()
+    await db.commit()
 
     return ApiKeyResponse(api_id=api_key.id, api_key=raw_key, expires_at=expires_at)
 
@@ -55,15 +83,16 @@ async def create_api_key(
 async def rollover_api_key(
     req: RolloverApiKeyRequest,
     current_user: tuple = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Rollover an expired API key"""
     user_id, _ = current_user
 
-    expired_key = db.query(ApiKey).filter(
+    result = await db.execute(select(ApiKey).filter(
         ApiKey.id == req.expired_key_id,
         ApiKey.user_id == user_id
-    ).first()
+    ))
+    expired_key = result.scalars().first()
 
     if not expired_key:
         raise HTTPException(status_code=404, detail="API key not found")
@@ -75,8 +104,15 @@ async def rollover_api_key(
     if expired_key.expires_at > datetime.utcnow():
         raise HTTPException(status_code=400, detail="API key must be expired")
 
+    # Revoking first also settles concurrent rollovers of the same key:
+    # only one of them gets to mint a replacement
+    if not await api_keys.revoke_key(db, expired_key.id):
+        await db.rollback()
+        raise HTTPException(
+            status_code=400, detail="Cannot rollover a revoked API key")
+
     raw_key = f"sk_live_{secrets.token_urlsafe(32)}"
-    key_hash = hashlib.sha256(raw_key.encode()).hexdigest()
+    key_hash = hash_api_key(raw_key)
     expires_at = convert_expiry(req.expiry)
 
     new_key = ApiKey(
@@ -85,13 +121,14 @@ async def rollover_api_key(
         key_hash=key_hash,
         name=expired_key.name,
         permissions=expired_key.permissions,
-        expires_at=expires_at
+        rate_limit=expired_key.rate_limit,
+        expires_at=expires_at,
+        counted=True
     )
     db.add(new_key)
-
-    expired_key.revoked = True
-
-    db.commit()
+    await api_keys.count_key(db, user_id)
+    await db.commit()
+    await invalidate_api_key(expired_key.key_hash)
 
     return ApiKeyResponse(api_id=new_key.id, api_key=raw_key, expires_at=expires_at)
 
@@ -100,24 +137,25 @@ async def rollover_api_key(
 async def revoke_api_key(
     key_id: str,
     current_user: tuple = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Revoke an API key"""
     user_id, _ = current_user
 
-    api_key = db.query(ApiKey).filter(
+    result = await db.execute(select(ApiKey).filter(
         ApiKey.id == key_id,
         ApiKey.user_id == user_id
-    ).first()
+    ))
+    api_key = result.scalars().first()
 
     if not api_key:
         raise HTTPException(status_code=404, detail="API key not found")
 
-    if api_key.revoked:
+    if not await api_keys.revoke_key(db, api_key.id):
+        await db.rollback()
         raise HTTPException(
             status_code=400, detail="API key is already revoked")
-
-    api_key.revoked = True
-    db.commit()
+    await db.commit()
+    await invalidate_api_key(api_key.key_hash)
 
     return {"status": "success", "message": "API key revoked"}
@@ -1,115 +1,151 @@
-from fastapi import APIRouter, HTTPException, Depends, Header, Request
-from app.schemas.schemas import User, Wallet, Transaction
-from app.models.models import WalletBalance, DepositRequest, DepositResponse, PermissionEnum, TransactionResponse, TransferRequest, TransferResponse
-from app.utils.utils import get_current_user, get_db, check_permission
+from fastapi import APIRouter, HTTPException, Depends, Header, Request, Query
+from app.schemas.schemas import Wallet, Transaction, TransactionArchive, WebhookEvent
+from app.models.models import WalletBalance, DepositRequest, DepositResponse, PermissionEnum, TransactionResponse, TransactionPage, TransferRequest, TransferResponse, ExportFormatEnum, BatchTransferRequest, BatchTransferResponse, BatchTransferItemResult, WalletSummary, SummaryTotals, DailySummary
+from app.utils.utils import get_principal, Principal, get_db, check_permission, encode_cursor, decode_cursor
 from app.db.connectDB import get_db
-from sqlalchemy.orm import Session
-from typing import Optional, List
-from dotenv import load_dotenv
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, tuple_
+from typing import Optional
+from datetime import datetime, date
+from fastapi.responses import StreamingResponse
+from app.utils import paystack, transfers, idempotency, rollups
+from app.utils.export import stream_transactions
+from app.utils.replicas import get_read_db, note_write, read_session_factory
+from app.utils.ledger import from_minor, balance_at
+from app.utils.shards import sharded_balance
+from app.utils.deposits import deposit_channel, deposit_event
+from app.utils import pubsub, lifecycle
+from app.db.connectDB import AsyncSessionLocal
+from app.config import settings
+from app.workers import webhooks
+from app.utils.paystack import PAYSTACK_SECRET
+from app.utils.circuit_breaker import CircuitOpenError
 import hashlib
 import hmac
 import json
+import math
 import secrets
+import asyncio
 import httpx
-import os
-
-load_dotenv()
-
-PAYSTACK_SECRET = os.getenv("PAYSTACK_SECRET")
-PAYSTACK_BASE_URL = "https://api.paystack.co"
 
 router = APIRouter(prefix="/wallet", tags=["Wallet"])
 
+SUMMARY_MAX_DAYS = 366
+DEPOSIT_STREAM_TIMEOUT = settings.deposit_stream_timeout
+SSE_HEARTBEAT_INTERVAL = settings.sse_heartbeat_interval
+
 
 @router.post("/deposit", response_model=DepositResponse)
 async def deposit_wallet(
     req: DepositRequest,
-    current_user: tuple = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    idempotency_key: Optional[str] = Header(None),
+    principal: Principal = Depends(get_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """Initialize Paystack deposit"""
-    user_id, permissions = current_user
-    check_permission(permissions, PermissionEnum.DEPOSIT)
+    check_permission(principal.permissions, PermissionEnum.DEPOSIT)
+
+    if paystack.breaker.is_open():
+        raise payment_service_unavailable(paystack.breaker.retry_after())
+
+    if idempotency_key:
+        return await idempotency.run_once(
+            db, principal.user_id, idempotency_key,
+            idempotency.fingerprint("deposit", req),
+            lambda: initialize_deposit(req, principal))
+    # Resolving the principal on a cache miss checked out a connection;
+    # hand it back rather than hold it through the Paystack call
+    await db.close()
+    return await initialize_deposit(req, principal)
+
+
+def payment_service_unavailable(retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Payment service unavailable, retry shortly",
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
 
-    user = db.query(User).filter(User.id == user_id).first()
-    wallet = db.query(Wallet).filter(Wallet.user_id == user_id).first()
 
-    if not wallet:
-        raise HTTPException(status_code=404, detail="Wallet not found")
+async def mark_deposit_failed(reference: str):
+    """Record a failed initialization on its own short session"""
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(Transaction)
+            .where(Transaction.reference == reference, Transaction.status == "pending")
+            .values(status="failed")
+        )
+        await db.commit()
+
 
+async def initialize_deposit(req: DepositRequest, principal: Principal) -> DepositResponse:
+    """Create the pending deposit and initialize it with Paystack
+
+    Uses short sessions on either side of the Paystack call, so no pooled
+    connection waits on Paystack.
+    """
     reference = f"txn_{secrets.token_hex(8)}"
-    transaction = Transaction(
-        id=secrets.token_hex(8),
-        wallet_id=wallet.id,
-        type="deposit",
-        amount=req.amount,
-        reference=reference,
-        status="pending"
-    )
-    db.add(transaction)
-    db.commit()
+    async with AsyncSessionLocal() as db:
+        db.add(Transaction(
+            id=secrets.token_hex(8),
+            wallet_id=principal.wallet_id,
+            type="deposit",
+            amount=req.amount,
+            reference=reference,
+            status="pending"
+        ))
+        await db.commit()
+    await note_write(principal.user_id)
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{PAYSTACK_BASE_URL}/transaction/initialize",
-                json={
-                    "email": user.email,
-                    "amount": int(req.amount * 100),
-                    "reference": reference
-                },
-                headers={"Authorization": f"Bearer {PAYSTACK_SECRET}"},
-                timeout=10.0
-            )
-
-        response.raise_for_status()
-        data = response.json()
-
-        if not data.get("status"):
-            transaction.status = "failed"
-            db.commit()
-            raise HTTPException(
-                status_code=400,
-                detail="Failed to initialize payment"
-            )
-
-        return DepositResponse(
-            reference=reference,
-            authorization_url=data["data"]["authorization_url"]
-        )
+        data = await paystack.initialize_transaction(
+            principal.email, req.amount, reference)
+
+    except CircuitOpenError as e:
+        await mark_deposit_failed(reference)
+        raise payment_service_unavailable(e.retry_after)
 
     except httpx.RequestError as e:
-        transaction.status = "failed"
-        db.commit()
+        await mark_deposit_failed(reference)
         raise HTTPException(
             status_code=503,
             detail=f"Payment service unavailable: {str(e)}"
         )
 
     except httpx.HTTPStatusError as e:
-        transaction.status = "failed"
-        db.commit()
+        await mark_deposit_failed(reference)
         raise HTTPException(
             status_code=e.response.status_code,
             detail=f"Payment service error: {e.response.text}"
         )
 
     except Exception as e:
-        transaction.status = "failed"
-        db.commit()
+        await mark_deposit_failed(reference)
         raise HTTPException(
             status_code=500,
             detail=f"Unexpected error: {str(e)}"
         )
 
+    if not data.get("status"):
+        await mark_deposit_failed(reference)
+        raise HTTPException(
+            status_code=400,
+            detail="Failed to initialize payment"
+        )
+
+    return DepositResponse(
+        reference=reference,
+        authorization_url=data["data"]["authorization_url"]
+    )
+
 
 @router.post("/paystack/webhook")
 async def paystack_webhook(
     request: Request,
     x_paystack_signature: Optional[str] = Header(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Handle Paystack webhook"""
+    """Verify and enqueue a Paystack webhook; crediting happens in the webhook worker"""
     if not x_paystack_signature:
         raise HTTPException(status_code=401, detail="Missing signature")
 
@@ -122,54 +158,55 @@ async def paystack_webhook(
     )
     expected_sig = hash_obj.hexdigest()
 
-    if x_paystack_signature != expected_sig:
+    if not hmac.compare_digest(x_paystack_signature, expected_sig):
         raise HTTPException(status_code=401, detail="Invalid signature")
 
-    data = await request.json()
+    try:
+        data = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid payload")
+
+    event_data = data.get("data") or {}
+    db.add(WebhookEvent(
+        event=data.get("event"),
+        reference=event_data.get("reference"),
+        status=event_data.get("status"),
+        payload=body.decode()
+    ))
+    await db.commit()
+    webhooks.notify()
 
-    reference = data["data"]["reference"]
+    return {"status": True}
 
-    transaction = db.query(Transaction).filter(
-        Transaction.reference == reference).first()
 
+async def find_deposit(db: AsyncSession, reference: str, wallet_id: str):
+    """The caller's transaction for reference, hot or archived; 404 or 403 otherwise"""
+    transaction = await db.scalar(select(Transaction).filter(
+        Transaction.reference == reference))
     if not transaction:
-        return {"status": True}
-
-    if transaction.status == "success":
-        return {"status": True}
-
-    if data["data"]['status'] == 'success':
-        transaction.status = "success"
-        wallet = db.query(Wallet).filter(
-            Wallet.id == transaction.wallet_id).first()
-        wallet.balance += transaction.amount
-    else:
-        transaction.status = data["data"]['status']
+        # Pending deposits are never archived, so only old or unknown
+        # references pay for the second lookup
+        transaction = await db.scalar(select(TransactionArchive).filter(
+            TransactionArchive.reference == reference))
+    if not transaction:
+        raise HTTPException(status_code=404, detail="Transaction not found")
 
-    db.commit()
-    return {"status": True}
+    if transaction.wallet_id != wallet_id:
+        raise HTTPException(
+            status_code=403, detail="Unauthorized access to transaction")
+    return transaction
 
 
 @router.get("/deposit/{reference}/status")
 async def deposit_status(
     reference: str,
-    current_user: tuple = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    principal: Principal = Depends(get_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get deposit status (does not credit wallet)"""
-    user_id, permissions = current_user
-    check_permission(permissions, PermissionEnum.READ)
-
-    transaction = db.query(Transaction).filter(
-        Transaction.reference == reference).first()
-    if not transaction:
-        raise HTTPException(status_code=404, detail="Transaction not found")
-
-    wallet = db.query(Wallet).filter(Wallet.user_id == user_id).first()
-    if transaction.wallet_id != wallet.id:
-        raise HTTPException(
-            status_code=403, detail="Unauthorized access to transaction")
+    check_permission(principal.permissions, PermissionEnum.READ)
 
+    transaction = await find_deposit(db, reference, principal.wallet_id)
     return {
         "reference": reference,
         "status": transaction.status,
@@ -177,83 +214,308 @@ async def deposit_status(
     }
 
 
+@router.get("/deposit/{reference}/events")
+async def deposit_events(
+    reference: str,
+    principal: Principal = Depends(get_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    """Stream the deposit's status as Server-Sent Events until it settles"""
+    check_permission(principal.permissions, PermissionEnum.READ)
+    # Fail with the same status codes as the polling endpoint, before the
+    # 200 of the stream is sent
+    await find_deposit(db, reference, principal.wallet_id)
+    # Release the request session's connection rather than holding it for
+    # the life of the stream
+    await db.close()
+
+    return StreamingResponse(
+        stream_deposit_status(reference, principal.wallet_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def stream_deposit_status(reference: str, wallet_id: str):
+    """Current status, then the settled status when it is published
+
+    Waiting costs one future: no task, no DB session and no polling. A
+    pub/sub reconnect wakes the future with None, since the settlement may
+    have been published while it was down; the status is then re-read.
+    """
+    deadline = asyncio.get_running_loop().time() + DEPOSIT_STREAM_TIMEOUT
+    last_event = None
+    while True:
+        with pubsub.subscription(deposit_channel(reference)) as update:
+            # Subscribed first, so an outcome committed after this read still arrives
+            async with AsyncSessionLocal() as db:
+                transaction = await db.scalar(select(Transaction).filter(
+                    Transaction.reference == reference))
+                if not transaction:
+                    transaction = await db.scalar(select(TransactionArchive).filter(
+                        TransactionArchive.reference == reference))
+            if not transaction or transaction.wallet_id != wallet_id:
+                yield f"event: error\ndata: {json.dumps({'detail': 'Transaction not found'})}\n\n"
+                return
+
+            event = deposit_event(transaction)
+            if event != last_event:
+                yield f"event: status\ndata: {event}\n\n"
+                last_event = event
+            if transaction.status != "pending":
+                return
+
+            while not update.done():
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    yield "event: timeout\ndata: {}\n\n"
+                    return
+                await asyncio.wait({update}, timeout=min(SSE_HEARTBEAT_INTERVAL, remaining))
+                if not update.done():
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+            if update.result() is not None:
+                yield f"event: status\ndata: {update.result()}\n\n"
+                return
+
+
 @router.get("/balance", response_model=WalletBalance)
 async def get_balance(
-    current_user: tuple = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    at: Optional[datetime] = None,
+    principal: Principal = Depends(get_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get wallet balance"""
-    user_id, permissions = current_user
-    check_permission(permissions, PermissionEnum.READ)
+    """Get wallet balance, now or as of a past time"""
+    check_permission(principal.permissions, PermissionEnum.READ)
 
-    wallet = db.query(Wallet).filter(Wallet.user_id == user_id).first()
-    if not wallet:
-        raise HTTPException(status_code=404, detail="Wallet not found")
+    if at:
+        return WalletBalance(balance=from_minor(await balance_at(db, principal.wallet_id, at)))
 
-    return WalletBalance(balance=wallet.balance)
+    wallet = await db.get(Wallet, principal.wallet_id)
+    return WalletBalance(balance=from_minor(await sharded_balance(db, wallet)))
 
 
 @router.post("/transfer", response_model=TransferResponse)
 async def transfer_funds(
     req: TransferRequest,
-    current_user: tuple = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    idempotency_key: Optional[str] = Header(None),
+    principal: Principal = Depends(get_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """Transfer funds to another wallet"""
-    user_id, permissions = current_user
-    check_permission(permissions, PermissionEnum.TRANSFER)
-
-    sender_wallet = db.query(Wallet).filter(Wallet.user_id == user_id).first()
-    recipient_wallet = db.query(Wallet).filter(
-        Wallet.wallet_number == req.wallet_number).first()
-
-    if not sender_wallet or not recipient_wallet:
+    check_permission(principal.permissions, PermissionEnum.TRANSFER)
+
+    with lifecycle.transfer_in_flight():
+        if idempotency_key:
+            response = await idempotency.run_once(
+                db, principal.user_id, idempotency_key,
+                idempotency.fingerprint("transfer", req),
+                lambda: perform_transfer(req, principal, db))
+        else:
+            response = await perform_transfer(req, principal, db)
+            await db.commit()
+    await note_write(principal.user_id)
+    return response
+
+
+async def perform_transfer(req: TransferRequest, principal: Principal, db: AsyncSession) -> TransferResponse:
+    """Validate the recipient and run the transfer; the caller commits"""
+    recipient_wallet = await db.scalar(select(Wallet).filter(
+        Wallet.wallet_number == req.wallet_number))
+
+    if not recipient_wallet:
         raise HTTPException(status_code=404, detail="Wallet not found")
 
-    if sender_wallet.id == recipient_wallet.id:
+    if recipient_wallet.id == principal.wallet_id:
         raise HTTPException(
             status_code=400,
             detail="You cannot transfer money to your own wallet"
         )
 
-    if sender_wallet.balance < req.amount:
-        raise HTTPException(status_code=400, detail="Insufficient balance")
+    shard_counts = {recipient_wallet.id: recipient_wallet.shard_count} if recipient_wallet.shard_count else {}
+    await transfers.transfer(
+        db, principal.wallet_id, recipient_wallet.id, req.amount, shard_counts, commit=False)
+    return TransferResponse(status="success", message="Transfer completed")
 
-    sender_wallet.balance -= req.amount
-    recipient_wallet.balance += req.amount
 
-    for wallet, t_type in [(sender_wallet, "transfer_out"), (recipient_wallet, "transfer_in")]:
-        transaction = Transaction(
-            id=secrets.token_hex(8),
-            wallet_id=wallet.id,
-            type="transfer",
-            amount=req.amount,
-            status="success",
-            recipient_wallet_id=recipient_wallet.id if t_type == "transfer_out" else sender_wallet.id
-        )
-        db.add(transaction)
-
-    db.commit()
-    return TransferResponse(status="success", message="Transfer completed")
+@router.post("/transfer/batch", response_model=BatchTransferResponse)
+async def transfer_funds_batch(
+    req: BatchTransferRequest,
+    idempotency_key: Optional[str] = Header(None),
+    principal: Principal = Depends(get_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    """Pay many wallets in one request and one DB transaction"""
+    check_permission(principal.permissions, PermissionEnum.TRANSFER)
+
+    with lifecycle.transfer_in_flight():
+        if idempotency_key:
+            response = await idempotency.run_once(
+                db, principal.user_id, idempotency_key,
+                idempotency.fingerprint("transfer_batch", req),
+                lambda: perform_batch_transfer(req, principal, db))
+        else:
+            response = await perform_batch_transfer(req, principal, db)
+            await db.commit()
+    await note_write(principal.user_id)
+    return response
+
+
+async def perform_batch_transfer(req: BatchTransferRequest, principal: Principal, db: AsyncSession) -> BatchTransferResponse:
+    """Resolve recipients and run the batch as one transfer; the caller commits"""
+    wallet_numbers = {item.wallet_number for item in req.transfers}
+    result = await db.execute(select(Wallet.wallet_number, Wallet.id, Wallet.shard_count).filter(
+        Wallet.wallet_number.in_(wallet_numbers)))
+    recipients = {}
+    shard_counts = {}
+    for wallet_number, wallet_id, shard_count in result.all():
+        recipients[wallet_number] = wallet_id
+        if shard_count:
+            shard_counts[wallet_id] = shard_count
+
+    results = []
+    credits = []
+    for item in req.transfers:
+        recipient_id = recipients.get(item.wallet_number)
+        if not recipient_id:
+            message, status = "Wallet not found", "failed"
+        elif recipient_id == principal.wallet_id:
+            message, status = "You cannot transfer money to your own wallet", "failed"
+        else:
+            message, status = "Transfer completed", "success"
+            credits.append((recipient_id, item.amount))
+        results.append(BatchTransferItemResult(
+            wallet_number=item.wallet_number, amount=item.amount,
+            status=status, message=message))
+
+    if not credits:
+        # Nothing was paid: a client error, not a partial success
+        raise HTTPException(status_code=400, detail=BatchTransferResponse(
+            status="failed", total=0, results=results).model_dump())
+
+    await transfers.transfer_many(
+        db, principal.wallet_id, credits, shard_counts, commit=False)
+
+    return BatchTransferResponse(
+        status="success" if len(credits) == len(results) else "partial",
+        total=sum(amount for _, amount in credits),
+        results=results
+    )
 
 
-@router.get("/transactions", response_model=List[TransactionResponse])
+@router.get("/transactions", response_model=TransactionPage)
 async def get_transactions(
-    current_user: tuple = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    type: Optional[str] = None,
+    status: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    include_archive: bool = False,
+    principal: Principal = Depends(get_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get transaction history"""
-    user_id, permissions = current_user
-    check_permission(permissions, PermissionEnum.READ)
+    """Get transaction history, newest first, one page at a time
+
+    Only the hot months are searched unless include_archive is set.
+    """
+    check_permission(principal.permissions, PermissionEnum.READ)
+
+    cursor_key = decode_cursor(cursor) if cursor else None
+    models = [Transaction, TransactionArchive] if include_archive else [Transaction]
+    transactions = []
+    for model in models:
+        query = select(model).filter(model.wallet_id == principal.wallet_id)
+        if type:
+            query = query.filter(model.type == type)
+        if status:
+            query = query.filter(model.status == status)
+        if start:
+            query = query.filter(model.created_at >= start)
+        if end:
+            query = query.filter(model.created_at < end)
+        if cursor_key:
+            query = query.filter(tuple_(model.created_at, model.id) < cursor_key)
+
+        result = await db.execute(query.order_by(
+            model.created_at.desc(), model.id.desc()).limit(limit + 1))
+        transactions.extend(result.scalars().all())
+
+    if include_archive:
+        # Each table returned its own newest limit + 1; merge them
+        transactions.sort(key=lambda t: (t.created_at, t.id), reverse=True)
+
+    next_cursor = None
+    if len(transactions) > limit:
+        transactions = transactions[:limit]
+        last = transactions[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+
+    return TransactionPage(
+        transactions=[
+            TransactionResponse(
+                id=t.id, type=t.type, amount=t.amount, status=t.status,
+                reference=t.reference, created_at=t.created_at)
+            for t in transactions
+        ],
+        next_cursor=next_cursor
+    )
 
-    wallet = db.query(Wallet).filter(Wallet.user_id == user_id).first()
-    if not wallet:
-        raise HTTPException(status_code=404, detail="Wallet not found")
 
-    transactions = db.query(Transaction).filter(
-        Transaction.wallet_id == wallet.id).all()
+@router.get("/summary", response_model=WalletSummary)
+async def get_summary(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    principal: Principal = Depends(get_principal),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Daily deposit and transfer totals for start <= day < end (default: last 30 days)"""
+    check_permission(principal.permissions, PermissionEnum.READ)
 
-    return [
-        TransactionResponse(type=t.type, amount=t.amount, status=t.status)
-        for t in transactions
-    ]
+    start, end = rollups.default_range(start, end)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if (end - start).days > SUMMARY_MAX_DAYS:
+        raise HTTPException(
+            status_code=400, detail=f"Range cannot exceed {SUMMARY_MAX_DAYS} days")
+
+    rows = await rollups.summarize(db, principal.wallet_id, start, end)
+    # Add up in minor units so totals carry no float rounding
+    totals = {
+        column: sum(row[column] for row in rows) for column in rollups.ROLLUP_COLUMNS
+    }
+    return WalletSummary(
+        start=start,
+        end=end,
+        totals=SummaryTotals(**summary_values(totals)),
+        days=[DailySummary(day=row["day"], **summary_values(row)) for row in rows]
+    )
+
+
+def summary_values(row: dict) -> dict:
+    """Rollup columns with amounts converted to major units"""
+    return {
+        column: row[column] if column.endswith("_count") else from_minor(row[column])
+        for column in rollups.ROLLUP_COLUMNS
+    }
+
+
+@router.get("/transactions/export")
+async def export_transactions(
+    format: ExportFormatEnum = ExportFormatEnum.NDJSON,
+    include_archive: bool = True,
+    principal: Principal = Depends(get_principal)
+):
+    """Stream the full transaction history as NDJSON or CSV"""
+    check_permission(principal.permissions, PermissionEnum.READ)
+
+    media_type = "text/csv" if format == ExportFormatEnum.CSV else "application/x-ndjson"
+    return StreamingResponse(
+        stream_transactions(
+            principal.wallet_id, format, read_session_factory(principal.user_id),
+            include_archive),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="transactions-{principal.wallet_number}.{format.value}"'
+        }
+    )
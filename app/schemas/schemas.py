@@ -1,7 +1,6 @@
-from sqlalchemy import Column, String, Float, DateTime, Boolean
+from sqlalchemy import Column, String, Float, DateTime, Date, Boolean, Index, Integer, Text, BigInteger
 from datetime import datetime
 from app.db.connectDB import Base
-from app.db.connectDB import engine
 
 
 class User(Base):
@@ -9,6 +8,8 @@ class User(Base):
     id = Column(String, primary_key=True)
     email = Column(String, unique=True, index=True)
     name = Column(String)
+    # Keys counted as active (see ApiKey.counted); kept in step by app/utils/api_keys.py
+    active_api_keys = Column(Integer, default=0, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
@@ -17,32 +18,180 @@ class Wallet(Base):
     id = Column(String, primary_key=True)
     user_id = Column(String, index=True)
     wallet_number = Column(String, unique=True, index=True)
-    balance = Column(Float, default=0.0)
+    # Running total in minor units (kobo); only ever changed by deltas
+    balance = Column(BigInteger, default=0)
+    # 0 for a normal wallet; N when the balance is spread over N wallet_shards rows
+    shard_count = Column(Integer, default=0, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
+# Sub-balance of a hot wallet; the wallet's balance is its own row plus all shards
+class WalletShard(Base):
+    __tablename__ = "wallet_shards"
+    wallet_id = Column(String, primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    balance = Column(BigInteger, default=0, nullable=False)
+
+
+class WalletDailyRollup(Base):
+    """Per-wallet daily totals in minor units, kept current by the write paths
+
+    Sharded wallets spread their rows over `shard` like their balance, so
+    a hot wallet's rollup row does not become the new contention point.
+    """
+    __tablename__ = "wallet_daily_rollups"
+    wallet_id = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    shard = Column(Integer, primary_key=True, default=0)
+    deposits = Column(BigInteger, default=0, nullable=False)
+    deposits_count = Column(Integer, default=0, nullable=False)
+    transfers_in = Column(BigInteger, default=0, nullable=False)
+    transfers_in_count = Column(Integer, default=0, nullable=False)
+    transfers_out = Column(BigInteger, default=0, nullable=False)
+    transfers_out_count = Column(Integer, default=0, nullable=False)
+
+
+# On Postgres both transaction tables are range-partitioned by month on
+# created_at (see app/utils/partitions.py), which requires created_at in
+# the primary key and rules out a table-wide unique index on reference.
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        # Serves history keyset pagination: WHERE wallet_id = ? ORDER BY created_at, id
+        Index("ix_transactions_wallet_created_id",
+              "wallet_id", "created_at", "id"),
+        # Serves the reconciler's scan: WHERE status = 'pending' AND type = 'deposit' ORDER BY created_at, id
+        Index("ix_transactions_status_type_created_id",
+              "status", "type", "created_at", "id"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
     id = Column(String, primary_key=True)
-    wallet_id = Column(String, index=True)
+    wallet_id = Column(String)
     type = Column(String)
     amount = Column(Float)
     status = Column(String, default="pending")
-    reference = Column(String, unique=True, index=True, nullable=True)
+    reference = Column(String, index=True, nullable=True)
     recipient_wallet_id = Column(String, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, primary_key=True, default=datetime.utcnow)
+
+
+# Cold history moved out of transactions by the archival job: whole monthly
+# partitions on Postgres, batches of rows elsewhere
+class TransactionArchive(Base):
+    __tablename__ = "transactions_archive"
+    __table_args__ = (
+        Index("ix_transactions_archive_wallet_created_id",
+              "wallet_id", "created_at", "id"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+    id = Column(String, primary_key=True)
+    wallet_id = Column(String)
+    type = Column(String)
+    amount = Column(Float)
+    status = Column(String)
+    reference = Column(String, index=True, nullable=True)
+    recipient_wallet_id = Column(String, nullable=True)
+    created_at = Column(DateTime, primary_key=True)
 
 
 class ApiKey(Base):
     __tablename__ = "api_keys"
+    __table_args__ = (
+        # Serves GET /keys and the per-user recount: WHERE user_id = ? AND revoked = false AND expires_at > now
+        Index("ix_api_keys_user_revoked_expires", "user_id", "revoked", "expires_at"),
+        # Serves the sweeper: expired keys still counted, and keys past their grace period
+        Index("ix_api_keys_expires_at", "expires_at"),
+    )
     id = Column(String, primary_key=True)
-    user_id = Column(String, index=True)
+    user_id = Column(String)
     key_hash = Column(String, unique=True)
     name = Column(String)
     permissions = Column(String)
+    # Cost units per minute; NULL uses API_KEY_RATE_LIMIT
+    rate_limit = Column(Integer, nullable=True)
+    expires_at = Column(DateTime)
+    revoked = Column(Boolean, default=False)
+    revoked_at = Column(DateTime, nullable=True)
+    # True while the key is included in its user's active_api_keys
+    counted = Column(Boolean, default=False, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+# Expired and revoked keys moved out of api_keys by the sweeper, so the
+# key_hash index that every API-key request uses only covers live keys
+class ApiKeyArchive(Base):
+    __tablename__ = "api_keys_archive"
+    id = Column(String, primary_key=True)
+    user_id = Column(String, index=True)
+    key_hash = Column(String)
+    name = Column(String)
+    permissions = Column(String)
+    rate_limit = Column(Integer, nullable=True)
     expires_at = Column(DateTime)
     revoked = Column(Boolean, default=False)
+    revoked_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+
+
+class WebhookEvent(Base):
+    __tablename__ = "webhook_events"
+    __table_args__ = (
+        # Serves the worker's queue scan: WHERE processed_at IS NULL ORDER BY id
+        Index("ix_webhook_events_pending", "processed_at", "id"),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    event = Column(String)
+    reference = Column(String, index=True, nullable=True)
+    status = Column(String, nullable=True)
+    payload = Column(Text)
+    received_at = Column(DateTime, default=datetime.utcnow)
+    processed_at = Column(DateTime, nullable=True)
+
+
+
+# SQLite only auto-increments INTEGER PRIMARY KEY columns
+LedgerId = BigInteger().with_variant(Integer, "sqlite")
+
+
+# Append-only record of every balance movement, in minor units
+class LedgerEntry(Base):
+    __tablename__ = "ledger_entries"
+    __table_args__ = (
+        Index("ix_ledger_entries_wallet_id_id", "wallet_id", "id"),
+    )
+    id = Column(LedgerId, primary_key=True, autoincrement=True)
+    wallet_id = Column(String, nullable=False)
+    transaction_id = Column(String, nullable=True)
+    amount = Column(BigInteger, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
-Base.metadata.create_all(bind=engine)
+# Wallet balance as of a ledger entry, so historical replays stay short
+class BalanceSnapshot(Base):
+    __tablename__ = "balance_snapshots"
+    __table_args__ = (
+        Index("ix_balance_snapshots_wallet_entry", "wallet_id", "entry_id"),
+        Index("ix_balance_snapshots_wallet_as_of", "wallet_id", "as_of"),
+    )
+    id = Column(LedgerId, primary_key=True, autoincrement=True)
+    wallet_id = Column(String, nullable=False)
+    entry_id = Column(BigInteger, nullable=False)
+    balance = Column(BigInteger, nullable=False)
+    as_of = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    user_id = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    fingerprint = Column(String, nullable=False)
+    status = Column(String, default="in_progress", nullable=False)
+    response_code = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
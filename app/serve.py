@@ -0,0 +1,73 @@
+from gunicorn.app.base import BaseApplication
+from uvicorn_worker import UvicornWorker
+from app.config import settings
+from app.db.connectDB import async_engine, replica_engine, pool_limits
+from app.utils import lifecycle
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Worker(UvicornWorker):
+    CONFIG_KWARGS = {
+        **UvicornWorker.CONFIG_KWARGS,
+        # In-flight requests (and so transfers) get this long to finish
+        "timeout_graceful_shutdown": settings.graceful_timeout,
+    }
+
+
+def pre_fork(server, worker):
+    """Give the background jobs to exactly one live worker (runs in the master)"""
+    # A replacement for the background worker inherits the role
+    worker.runs_background = settings.background_workers and not any(
+        getattr(other, "runs_background", False) for other in server.WORKERS.values())
+
+
+def post_fork(server, worker):
+    """Drop pooled connections inherited from the master and record the worker's role"""
+    async_engine.sync_engine.dispose(close=False)
+    if replica_engine is not None:
+        replica_engine.sync_engine.dispose(close=False)
+    lifecycle.configure(worker.age, worker.runs_background)
+
+
+class Server(BaseApplication):
+    """Gunicorn with the app imported once in the master, then forked"""
+
+    def __init__(self, options: dict):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from app.main import app
+        return app
+
+
+def main():
+    workers = settings.web_concurrency
+    pool_size, max_overflow = pool_limits(workers)
+    logger.info(
+        "Starting %d workers, each with a DB pool of %d + %d overflow",
+        workers, pool_size, max_overflow)
+    if workers > 1 and settings.pubsub_backend == "local":
+        logger.warning("PUBSUB_BACKEND=local: deposit streams only see events from their own worker")
+
+    Server({
+        "bind": f"0.0.0.0:{settings.port}",
+        "workers": workers,
+        "worker_class": Worker,
+        "preload_app": True,
+        # Headroom for the lifespan shutdown after uvicorn's own drain
+        "graceful_timeout": settings.graceful_timeout + 5,
+        "pre_fork": pre_fork,
+        "post_fork": post_fork,
+    }).run()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
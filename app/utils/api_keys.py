@@ -0,0 +1,165 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, delete, insert, func, or_, and_, case, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.schemas.schemas import ApiKey, ApiKeyArchive, User
+from app.config import settings
+from typing import Optional
+
+MAX_ACTIVE_API_KEYS = 5
+API_KEY_SWEEP_BATCH_SIZE = settings.api_key_sweep_batch_size
+# Expired keys stay rollover-able, and revoked keys listable, for this long
+API_KEY_ARCHIVE_GRACE = timedelta(days=settings.api_key_archive_grace_days)
+
+ARCHIVE_COLUMNS = [column.key for column in ApiKeyArchive.__table__.columns if column.key != "archived_at"]
+
+users_table = User.__table__
+
+# Executed once per affected user in a single executemany round trip
+release_many_stmt = (
+    update(users_table)
+    .where(users_table.c.id == bindparam("release_user_id"))
+    .values(active_api_keys=users_table.c.active_api_keys - bindparam("release_count"))
+)
+
+
+async def claim_slot(db: AsyncSession, user_id: str) -> bool:
+    """Count one more active key for the user if under the limit; does not commit"""
+    result = await db.execute(
+        update(User)
+        .where(User.id == user_id, User.active_api_keys < MAX_ACTIVE_API_KEYS)
+        .values(active_api_keys=User.active_api_keys + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 1:
+        return True
+
+    # At the limit: keys that expired since the sweeper last ran may still
+    # be counted, so settle this user's before refusing
+    if not await release_expired(db, user_id):
+        return False
+    return await claim_slot(db, user_id)
+
+
+async def count_key(db: AsyncSession, user_id: str):
+    """Count a replacement key without the limit check (rollover); does not commit"""
+    await db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(active_api_keys=User.active_api_keys + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def revoke_key(db: AsyncSession, key_id: str) -> bool:
+    """Revoke a key and stop counting it; False if it was already revoked; does not commit
+
+    Both steps are conditional UPDATEs, so a concurrent revoke, rollover or
+    sweep of the same key (which would wait on the row lock) cannot
+    release it twice.
+    """
+    result = await db.execute(
+        update(ApiKey)
+        .where(ApiKey.id == key_id, ApiKey.revoked == False)
+        .values(revoked=True, revoked_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return False
+
+    result = await db.execute(
+        update(ApiKey)
+        .where(ApiKey.id == key_id, ApiKey.counted == True)
+        .values(counted=False)
+        .returning(ApiKey.user_id)
+        .execution_options(synchronize_session=False)
+    )
+    user_id = result.scalar()
+    if user_id is not None:
+        await db.execute(release_many_stmt, [{"release_user_id": user_id, "release_count": 1}])
+    return True
+
+
+async def release_expired(db: AsyncSession, user_id: Optional[str] = None) -> int:
+    """Stop counting one batch of expired keys (all users, or one); does not commit"""
+    query = (
+        select(ApiKey.id, ApiKey.user_id)
+        .filter(ApiKey.counted == True, ApiKey.expires_at <= datetime.utcnow())
+        .limit(API_KEY_SWEEP_BATCH_SIZE)
+        .with_for_update(skip_locked=True)
+    )
+    if user_id:
+        query = query.filter(ApiKey.user_id == user_id)
+    rows = (await db.execute(query)).all()
+    if not rows:
+        return 0
+
+    await db.execute(
+        update(ApiKey)
+        .where(ApiKey.id.in_([row.id for row in rows]))
+        .values(counted=False)
+        .execution_options(synchronize_session=False)
+    )
+    per_user = Counter(row.user_id for row in rows)
+    await db.execute(release_many_stmt, [
+        {"release_user_id": uid, "release_count": count}
+        for uid, count in sorted(per_user.items())
+    ])
+    return len(rows)
+
+
+async def archive_keys(db: AsyncSession) -> int:
+    """Move one batch of keys expired or revoked longer than the grace period; does not commit"""
+    cutoff = datetime.utcnow() - API_KEY_ARCHIVE_GRACE
+    result = await db.execute(
+        select(ApiKey)
+        .filter(
+            ApiKey.counted == False,
+            or_(ApiKey.expires_at <= cutoff,
+                and_(ApiKey.revoked == True,
+                     func.coalesce(ApiKey.revoked_at, ApiKey.created_at) <= cutoff))
+        )
+        .limit(API_KEY_SWEEP_BATCH_SIZE)
+        .with_for_update(skip_locked=True)
+    )
+    keys = result.scalars().all()
+    if not keys:
+        return 0
+
+    await db.execute(insert(ApiKeyArchive), [
+        {column: getattr(key, column) for column in ARCHIVE_COLUMNS} for key in keys
+    ])
+    await db.execute(
+        delete(ApiKey)
+        .where(ApiKey.id.in_([key.id for key in keys]))
+        .execution_options(synchronize_session=False)
+    )
+    return len(keys)
+
+
+async def sweep(db: AsyncSession) -> int:
+    """Release expired keys and archive old ones, one bounded batch each; commits"""
+    released = await release_expired(db)
+    archived = await archive_keys(db)
+    await db.commit()
+    return max(released, archived)
+
+
+async def recount(db: AsyncSession):
+    """Rebuild every user's active_api_keys and each key's counted flag; commits"""
+    now = datetime.utcnow()
+    await db.execute(
+        update(ApiKey)
+        .values(counted=case(
+            (and_(ApiKey.revoked == False, ApiKey.expires_at > now), True), else_=False))
+        .execution_options(synchronize_session=False)
+    )
+    active = (
+        select(func.count())
+        .select_from(ApiKey)
+        .filter(ApiKey.user_id == User.id, ApiKey.counted == True)
+        .scalar_subquery()
+    )
+    await db.execute(
+        update(User).values(active_api_keys=active).execution_options(synchronize_session=False))
+    await db.commit()
@@ -0,0 +1,112 @@
+from contextlib import asynccontextmanager
+from typing import Callable, Optional
+from app.utils.metrics import CIRCUIT_STATE, CIRCUIT_REJECTIONS
+import asyncio
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose breaker is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} circuit is open")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Fails fast after `failure_threshold` consecutive failures
+
+    After `reset_timeout` seconds one trial call is let through (half
+    open); its success closes the circuit, its failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float,
+                 is_failure: Callable[[Exception], bool] = lambda e: True):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.is_failure = is_failure
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._trial_in_flight = False
+        CIRCUIT_STATE.labels(name).set(0)
+
+    def _set_state(self, state: str):
+        self.state = state
+        CIRCUIT_STATE.labels(self.name).set(STATE_VALUES[state])
+
+    def retry_after(self) -> float:
+        """Seconds until a trial call will be allowed (0 if calls are allowed now)"""
+        if self.state == CLOSED:
+            return 0.0
+        if self.state == HALF_OPEN:
+            return 0.0 if not self._trial_in_flight else self.reset_timeout
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def is_open(self) -> bool:
+        """True when a call made now would be rejected"""
+        return self.retry_after() > 0
+
+    def _acquire(self):
+        if self.state == OPEN and self.retry_after() == 0:
+            self._set_state(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self._trial_in_flight:
+                raise self._reject()
+            self._trial_in_flight = True
+        elif self.state == OPEN:
+            raise self._reject()
+
+    def _reject(self) -> CircuitOpenError:
+        CIRCUIT_REJECTIONS.labels(self.name).inc()
+        return CircuitOpenError(self.name, self.retry_after())
+
+    def record_success(self):
+        self.failures = 0
+        self._trial_in_flight = False
+        if self.state != CLOSED:
+            self._set_state(CLOSED)
+
+    def record_failure(self, error: Exception):
+        self.failures += 1
+        self.last_error = repr(error)
+        self._trial_in_flight = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+    @asynccontextmanager
+    async def guard(self):
+        """Run the enclosed call through the breaker"""
+        self._acquire()
+        try:
+            yield
+        except asyncio.CancelledError:
+            # Says nothing about the dependency's health
+            self._trial_in_flight = False
+            raise
+        except Exception as e:
+            if self.is_failure(e):
+                self.record_failure(e)
+            else:
+                self.record_success()
+            raise
+        self.record_success()
+
+    def snapshot(self) -> dict:
+        return {
+            "name": self.name,
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "failure_threshold": self.failure_threshold,
+            "retry_after_seconds": round(self.retry_after(), 2),
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,70 @@
+from collections import defaultdict
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.schemas.schemas import Transaction, Wallet
+from app.utils.transfers import credit_wallets
+from app.utils.ledger import to_minor, record_entries
+from app.utils.rollups import record_rollups
+from app.utils import pubsub
+from typing import Dict, List
+import json
+
+
+async def apply_deposit_outcomes(db: AsyncSession, outcomes: Dict[str, str]) -> List[Transaction]:
+    """Apply Paystack statuses (reference -> status) to deposits without committing
+
+    Transactions already marked success are skipped, so replaying an
+    outcome never credits a wallet twice.
+    """
+    if not outcomes:
+        return []
+
+    result = await db.execute(
+        select(Transaction)
+        .filter(
+            Transaction.reference.in_(outcomes.keys()),
+            Transaction.status != "success"
+        )
+        .with_for_update()
+    )
+    transactions = result.scalars().all()
+
+    credits = defaultdict(int)
+    entries = []
+    for transaction in transactions:
+        status = outcomes[transaction.reference]
+        if status == "success":
+            amount = to_minor(transaction.amount)
+            credits[transaction.wallet_id] += amount
+            entries.append((transaction.wallet_id, transaction.id, amount))
+        transaction.status = status
+
+    shard_counts = {}
+    if credits:
+        result = await db.execute(select(Wallet.id, Wallet.shard_count).filter(
+            Wallet.id.in_(credits.keys()), Wallet.shard_count > 0))
+        shard_counts = dict(result.all())
+
+    await credit_wallets(db, sorted(credits.items()), shard_counts)
+    await record_entries(db, entries)
+    await record_rollups(
+        db, [(wallet_id, "deposit", amount) for wallet_id, _, amount in entries], shard_counts)
+    return transactions
+
+
+def deposit_channel(reference: str) -> str:
+    return f"deposit:{reference}"
+
+
+def deposit_event(transaction: Transaction) -> str:
+    return json.dumps({
+        "reference": transaction.reference,
+        "status": transaction.status,
+        "amount": transaction.amount
+    })
+
+
+async def publish_deposit_outcomes(transactions: List[Transaction]):
+    """Tell status subscribers about committed outcomes (call after commit)"""
+    for transaction in transactions:
+        await pubsub.publish(deposit_channel(transaction.reference), deposit_event(transaction))
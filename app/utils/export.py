@@ -0,0 +1,59 @@
+from typing import AsyncIterator
+from sqlalchemy import select
+from app.db.connectDB import AsyncSessionLocal
+from app.models.models import ExportFormatEnum
+from app.schemas.schemas import Transaction, TransactionArchive
+from app.config import settings
+import csv
+import io
+import json
+
+EXPORT_BATCH_SIZE = settings.export_batch_size
+
+EXPORT_FIELDS = [
+    "id", "type", "amount", "status", "reference", "recipient_wallet_id", "created_at",
+]
+
+
+def _serialize(row) -> dict:
+    data = dict(row._mapping)
+    if data["created_at"] is not None:
+        data["created_at"] = data["created_at"].isoformat()
+    return data
+
+
+async def stream_transactions(
+    wallet_id: str, fmt: ExportFormatEnum, session_factory=AsyncSessionLocal,
+    include_archive: bool = True
+) -> AsyncIterator[str]:
+    """Yield a wallet's full history in fixed-size batches from a server-side cursor
+
+    Opens its own session so the connection lives exactly as long as the
+    response body, independent of the request's dependency lifecycle.
+    The archive holds only months older than the hot table's, so
+    streaming it first keeps the output in created_at order.
+    """
+    if fmt == ExportFormatEnum.CSV:
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+        yield buffer.getvalue()
+
+    models = [TransactionArchive, Transaction] if include_archive else [Transaction]
+    async with session_factory() as db:
+        for model in models:
+            result = await db.stream(
+                select(*(getattr(model, field) for field in EXPORT_FIELDS))
+                .filter(model.wallet_id == wallet_id)
+                .order_by(model.created_at, model.id)
+                .execution_options(yield_per=EXPORT_BATCH_SIZE)
+            )
+
+            async for rows in result.partitions():
+                if fmt == ExportFormatEnum.CSV:
+                    buffer = io.StringIO()
+                    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+                    writer.writerows(_serialize(row) for row in rows)
+                    yield buffer.getvalue()
+                else:
+                    yield "".join(json.dumps(_serialize(row)) + "\n" for row in rows)
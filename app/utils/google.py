@@ -0,0 +1,155 @@
+from typing import Optional
+from app.config import settings
+import asyncio
+import logging
+import re
+import time
+import httpx
+import jwt
+
+GOOGLE_CLIENT_ID = settings.google_client_id
+GOOGLE_CLIENT_SECRET = settings.google_client_secret
+GOOGLE_TOKEN_URL = settings.google_token_url
+GOOGLE_CERTS_URL = settings.google_certs_url
+GOOGLE_TIMEOUT = settings.google_timeout
+# Refresh signing keys this many seconds before the cached set expires
+GOOGLE_JWKS_REFRESH_MARGIN = settings.google_jwks_refresh_margin
+# Used when the certificate response carries no max-age
+GOOGLE_JWKS_DEFAULT_MAX_AGE = 3600
+# Unknown kids force a refetch at most this often, so bogus tokens cannot
+# turn into a stream of certificate requests
+GOOGLE_JWKS_FORCED_REFRESH_INTERVAL = 5
+
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[httpx.AsyncClient] = None
+
+_keys: dict = {}
+_keys_expire_at = 0.0
+_keys_fetched_at: Optional[float] = None
+_refresh_lock = asyncio.Lock()
+_refresh_task: Optional[asyncio.Task] = None
+
+
+def build_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    """Build a keep-alive client for Google's OAuth endpoints"""
+    return httpx.AsyncClient(timeout=GOOGLE_TIMEOUT, transport=transport)
+
+
+async def open_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    """Open the shared client (called from the app lifespan)"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = build_client(transport)
+    return _client
+
+
+async def close_client():
+    """Cancel any background key refresh and close the shared client"""
+    global _client, _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        _refresh_task = None
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it if the lifespan has not run"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = build_client()
+    return _client
+
+
+def parse_max_age(cache_control: Optional[str]) -> int:
+    """Seconds a response may be cached for, from its Cache-Control header"""
+    match = re.search(r"max-age=(\d+)", cache_control or "")
+    return int(match.group(1)) if match else GOOGLE_JWKS_DEFAULT_MAX_AGE
+
+
+async def refresh_keys(force: bool = False) -> dict:
+    """Fetch Google's signing keys and cache them for their max-age
+
+    force refetches a still-fresh set (Google rotated keys early), unless
+    the set was fetched within GOOGLE_JWKS_FORCED_REFRESH_INTERVAL.
+    """
+    global _keys, _keys_expire_at, _keys_fetched_at
+    async with _refresh_lock:
+        now = time.monotonic()
+        # Another caller may have refreshed while we waited for the lock
+        if force:
+            if _keys_fetched_at is not None and now - _keys_fetched_at < GOOGLE_JWKS_FORCED_REFRESH_INTERVAL:
+                return _keys
+        elif _keys and now < _keys_expire_at - GOOGLE_JWKS_REFRESH_MARGIN:
+            return _keys
+        response = await get_client().get(GOOGLE_CERTS_URL)
+        response.raise_for_status()
+        keys = {}
+        for jwk in response.json().get("keys", []):
+            keys[jwk["kid"]] = jwt.PyJWK(jwk)
+        _keys = keys
+        _keys_fetched_at = time.monotonic()
+        _keys_expire_at = _keys_fetched_at + parse_max_age(response.headers.get("cache-control"))
+    return _keys
+
+
+async def _background_refresh():
+    global _refresh_task
+    try:
+        await refresh_keys()
+    except Exception:
+        # The cached keys stay valid until they expire; the next lookup retries
+        logger.exception("Background refresh of Google signing keys failed")
+    finally:
+        _refresh_task = None
+
+
+async def get_signing_key(kid: str) -> jwt.PyJWK:
+    """Signing key for kid, refreshing the cached set when it is stale or lacks kid"""
+    global _refresh_task
+    now = time.monotonic()
+    if kid in _keys and now < _keys_expire_at:
+        if now >= _keys_expire_at - GOOGLE_JWKS_REFRESH_MARGIN and _refresh_task is None:
+            _refresh_task = asyncio.create_task(_background_refresh())
+        return _keys[kid]
+
+    # Expired, or a rotated key we have not seen yet: refresh before answering
+    keys = await refresh_keys(force=kid not in _keys)
+    if kid not in keys:
+        raise jwt.InvalidTokenError("Unknown signing key")
+    return keys[kid]
+
+
+async def exchange_code(code: str, redirect_uri: str) -> str:
+    """Trade an authorization code for the user's Google ID token"""
+    response = await get_client().post(
+        GOOGLE_TOKEN_URL,
+        data={
+            "code": code,
+            "client_id": GOOGLE_CLIENT_ID,
+            "client_secret": GOOGLE_CLIENT_SECRET,
+            "redirect_uri": redirect_uri,
+            "grant_type": "authorization_code"
+        }
+    )
+    response.raise_for_status()
+    id_token = response.json().get("id_token")
+    if not id_token:
+        raise jwt.InvalidTokenError("Token response has no id_token")
+    return id_token
+
+
+async def verify_id_token(id_token: str) -> dict:
+    """Verify a Google ID token's signature, audience, issuer and expiry"""
+    header = jwt.get_unverified_header(id_token)
+    key = await get_signing_key(header.get("kid", ""))
+    claims = jwt.decode(
+        id_token, key.key, algorithms=["RS256"], audience=GOOGLE_CLIENT_ID,
+        options={"require": ["exp", "iat", "iss", "sub"]})
+    if claims["iss"] not in GOOGLE_ISSUERS:
+        raise jwt.InvalidIssuerError("Token was not issued by Google")
+    return claims
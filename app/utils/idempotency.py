@@ -0,0 +1,154 @@
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import select, delete, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.schemas.schemas import IdempotencyKey
+from typing import Awaitable, Callable, Dict
+from app.config import settings
+import asyncio
+import hashlib
+import json
+
+IDEMPOTENCY_TTL_HOURS = settings.idempotency_ttl_hours
+IDEMPOTENCY_WAIT_TIMEOUT = settings.idempotency_wait_timeout
+IDEMPOTENCY_POLL_INTERVAL = settings.idempotency_poll_interval
+IDEMPOTENCY_SWEEP_BATCH_SIZE = settings.idempotency_sweep_batch_size
+
+# (user_id, key) -> set when the request holding that key in this process finishes
+_inflight: Dict[tuple[str, str], asyncio.Event] = {}
+
+
+def fingerprint(operation: str, body: BaseModel) -> str:
+    """Stable hash of what a request asks for, to reject key reuse with a different body"""
+    raw = f"{operation}:{body.model_dump_json()}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _replay(record: IdempotencyKey) -> JSONResponse:
+    return JSONResponse(
+        status_code=record.response_code,
+        content=json.loads(record.response_body),
+        headers={"Idempotent-Replayed": "true"}
+    )
+
+
+async def _claim(db: AsyncSession, user_id: str, key: str, request_fingerprint: str) -> bool:
+    """Insert an in-progress record; False if the key is already taken"""
+    now = datetime.utcnow()
+    db.add(IdempotencyKey(
+        user_id=user_id,
+        key=key,
+        fingerprint=request_fingerprint,
+        status="in_progress",
+        expires_at=now + timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+    ))
+    try:
+        await db.commit()
+        return True
+    except IntegrityError:
+        await db.rollback()
+        return False
+
+
+async def _wait_for_completion(db: AsyncSession, user_id: str, key: str) -> IdempotencyKey:
+    """Wait for the request holding the key, in this process or another, to finish"""
+    event = _inflight.get((user_id, key))
+    deadline = asyncio.get_running_loop().time() + IDEMPOTENCY_WAIT_TIMEOUT
+    while True:
+        record = await db.get(IdempotencyKey, (user_id, key), populate_existing=True)
+        if record is None or record.status == "completed":
+            return record
+
+        remaining = deadline - asyncio.get_running_loop().time()
+        if remaining <= 0:
+            raise HTTPException(
+                status_code=409, detail="A request with this Idempotency-Key is still in progress")
+        await db.rollback()
+        try:
+            if event is not None:
+                await asyncio.wait_for(event.wait(), remaining)
+            else:
+                await asyncio.sleep(min(IDEMPOTENCY_POLL_INTERVAL, remaining))
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_once(
+    db: AsyncSession,
+    user_id: str,
+    key: str,
+    request_fingerprint: str,
+    handler: Callable[[], Awaitable[BaseModel]]
+):
+    """Run handler at most once per (user, Idempotency-Key) and replay its response
+
+    Client errors are stored and replayed like successes; server errors
+    release the key so the client can retry. Writes the handler leaves
+    uncommitted on db are committed together with the stored response, so
+    the outcome and its record are never split by a crash.
+    """
+    while not await _claim(db, user_id, key, request_fingerprint):
+        record = await db.get(IdempotencyKey, (user_id, key), populate_existing=True)
+        if record is None:
+            continue
+        if record.expires_at <= datetime.utcnow():
+            await db.delete(record)
+            await db.commit()
+            continue
+        if record.fingerprint != request_fingerprint:
+            raise HTTPException(
+                status_code=422, detail="Idempotency-Key was used with a different request")
+
+        record = await _wait_for_completion(db, user_id, key)
+        if record is not None:
+            return _replay(record)
+        # The original attempt failed and released the key; try to claim it again
+
+    event = _inflight[(user_id, key)] = asyncio.Event()
+    try:
+        try:
+            response = await handler()
+            code, body = 200, response.model_dump_json()
+        except HTTPException as e:
+            if e.status_code >= 500:
+                raise
+            code, body = e.status_code, json.dumps({"detail": e.detail})
+            response = e
+
+        record = await db.get(IdempotencyKey, (user_id, key), populate_existing=True)
+        record.status = "completed"
+        record.response_code = code
+        record.response_body = body
+        await db.commit()
+    except BaseException:
+        await db.rollback()
+        await db.execute(delete(IdempotencyKey).where(
+            IdempotencyKey.user_id == user_id, IdempotencyKey.key == key))
+        await db.commit()
+        raise
+    finally:
+        event.set()
+        _inflight.pop((user_id, key), None)
+
+    if isinstance(response, HTTPException):
+        raise response
+    return response
+
+
+async def sweep_expired(db: AsyncSession) -> int:
+    """Delete one bounded batch of expired idempotency records; commits"""
+    expired = (
+        select(IdempotencyKey.user_id, IdempotencyKey.key)
+        .filter(IdempotencyKey.expires_at <= datetime.utcnow())
+        .limit(IDEMPOTENCY_SWEEP_BATCH_SIZE)
+    )
+    result = await db.execute(
+        delete(IdempotencyKey)
+        .where(tuple_(IdempotencyKey.user_id, IdempotencyKey.key).in_(expired))
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return result.rowcount
@@ -0,0 +1,137 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, func, inspect, text, Float, Numeric
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from app.schemas.schemas import LedgerEntry, BalanceSnapshot, Wallet
+from typing import List, Optional
+from app.config import settings
+
+SNAPSHOT_MIN_ENTRIES = settings.snapshot_min_entries
+SNAPSHOT_BATCH_SIZE = settings.snapshot_batch_size
+# Entries younger than this may still have uncommitted neighbours with lower ids
+SNAPSHOT_SETTLE_SECONDS = settings.snapshot_settle_seconds
+
+
+def to_minor(amount: float) -> int:
+    """Convert a major-unit amount (naira) to minor units (kobo)"""
+    return int(round(amount * 100))
+
+
+def from_minor(amount: int) -> float:
+    """Convert minor units (kobo) to a major-unit amount (naira)"""
+    return amount / 100
+
+
+async def record_entries(db: AsyncSession, entries: List[tuple[str, Optional[str], int]]):
+    """Append (wallet_id, transaction_id, amount) ledger entries in one round trip"""
+    if entries:
+        await db.execute(insert(LedgerEntry), [
+            {"wallet_id": wallet_id, "transaction_id": transaction_id, "amount": amount}
+            for wallet_id, transaction_id, amount in entries
+        ])
+
+
+async def balance_at(db: AsyncSession, wallet_id: str, at: datetime) -> int:
+    """Balance as of a past time: the snapshot before it plus a short replay"""
+    snapshot = await db.scalar(
+        select(BalanceSnapshot)
+        .filter(BalanceSnapshot.wallet_id == wallet_id, BalanceSnapshot.as_of <= at)
+        .order_by(BalanceSnapshot.as_of.desc(), BalanceSnapshot.entry_id.desc())
+        .limit(1)
+    )
+    base, after_id = (snapshot.balance, snapshot.entry_id) if snapshot else (0, 0)
+
+    delta = await db.scalar(
+        select(func.coalesce(func.sum(LedgerEntry.amount), 0))
+        .filter(
+            LedgerEntry.wallet_id == wallet_id,
+            LedgerEntry.id > after_id,
+            LedgerEntry.created_at <= at
+        )
+    )
+    return base + delta
+
+
+async def take_snapshots(db: AsyncSession) -> int:
+    """Snapshot wallets with enough settled entries since their last snapshot; commits"""
+    latest = (
+        select(BalanceSnapshot.wallet_id, func.max(BalanceSnapshot.entry_id).label("entry_id"))
+        .group_by(BalanceSnapshot.wallet_id)
+        .subquery()
+    )
+    previous = select(BalanceSnapshot).subquery()
+    last_entry_id = func.coalesce(latest.c.entry_id, 0)
+    settled_before = datetime.utcnow() - timedelta(seconds=SNAPSHOT_SETTLE_SECONDS)
+
+    result = await db.execute(
+        select(
+            LedgerEntry.wallet_id,
+            func.coalesce(func.max(previous.c.balance), 0),
+            func.sum(LedgerEntry.amount),
+            func.max(LedgerEntry.id),
+            func.max(LedgerEntry.created_at)
+        )
+        .outerjoin(latest, latest.c.wallet_id == LedgerEntry.wallet_id)
+        .outerjoin(previous, (previous.c.wallet_id == latest.c.wallet_id)
+                   & (previous.c.entry_id == latest.c.entry_id))
+        .filter(
+            LedgerEntry.id > last_entry_id,
+            LedgerEntry.created_at < settled_before
+        )
+        .group_by(LedgerEntry.wallet_id)
+        .having(func.count() >= SNAPSHOT_MIN_ENTRIES)
+        .limit(SNAPSHOT_BATCH_SIZE)
+    )
+    rows = result.all()
+
+    if rows:
+        await db.execute(insert(BalanceSnapshot), [
+            {
+                "wallet_id": wallet_id,
+                "entry_id": entry_id,
+                "balance": base + delta,
+                "as_of": as_of
+            }
+            for wallet_id, base, delta, entry_id, as_of in rows
+        ])
+        await db.commit()
+    return len(rows)
+
+
+async def convert_legacy_balances(conn: AsyncConnection) -> bool:
+    """Convert a pre-ledger wallets.balance column (float naira) to integer kobo
+
+    Also writes each wallet an opening ledger entry dated at its creation,
+    so the ledger sums to the balance. Returns False, doing nothing, when
+    the column is already an integer. Run before serving traffic.
+    """
+    columns = await conn.run_sync(lambda sync: inspect(sync).get_columns("wallets"))
+    balance_type = next(column["type"] for column in columns if column["name"] == "balance")
+    if not isinstance(balance_type, (Float, Numeric)):
+        return False
+
+    if conn.dialect.name == "postgresql":
+        await conn.execute(text(
+            "ALTER TABLE wallets ALTER COLUMN balance TYPE BIGINT "
+            "USING ROUND(COALESCE(balance, 0) * 100)::BIGINT"))
+    else:
+        # SQLite cannot change a column's type in place
+        await conn.execute(text("ALTER TABLE wallets ADD COLUMN balance_minor BIGINT DEFAULT 0"))
+        await conn.execute(text(
+            "UPDATE wallets SET balance_minor = CAST(ROUND(COALESCE(balance, 0) * 100) AS INTEGER)"))
+        await conn.execute(text("ALTER TABLE wallets DROP COLUMN balance"))
+        await conn.execute(text("ALTER TABLE wallets RENAME COLUMN balance_minor TO balance"))
+
+    recorded = (
+        select(LedgerEntry.wallet_id, func.sum(LedgerEntry.amount).label("total"))
+        .group_by(LedgerEntry.wallet_id)
+        .subquery()
+    )
+    opening = Wallet.balance - func.coalesce(recorded.c.total, 0)
+    await conn.execute(insert(LedgerEntry).from_select(
+        ["wallet_id", "transaction_id", "amount", "created_at"],
+        select(Wallet.id, None, opening,
+               func.coalesce(Wallet.created_at, datetime.utcnow()))
+        .outerjoin(recorded, recorded.c.wallet_id == Wallet.id)
+        .filter(opening != 0)
+    ))
+    return True
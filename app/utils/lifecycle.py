@@ -0,0 +1,106 @@
+from contextlib import contextmanager
+from app.db.connectDB import async_engine
+from app.config import settings
+import asyncio
+import logging
+import os
+import signal
+import time
+
+logger = logging.getLogger(__name__)
+
+# Overridden by the launcher in each forked worker (app/serve.py)
+worker_id = 0
+runs_background = settings.background_workers
+started_at = time.time()
+draining = False
+
+_transfers_in_flight = 0
+_idle: asyncio.Event | None = None
+
+
+def configure(new_worker_id: int, background: bool):
+    """Record this worker's identity and role; call right after forking"""
+    global worker_id, runs_background, started_at
+    worker_id = new_worker_id
+    runs_background = background
+    started_at = time.time()
+
+
+def _idle_event() -> asyncio.Event:
+    global _idle
+    if _idle is None:
+        _idle = asyncio.Event()
+        _idle.set()
+    return _idle
+
+
+@contextmanager
+def transfer_in_flight():
+    """Count a transfer so shutdown waits for it to commit or roll back"""
+    global _transfers_in_flight
+    _transfers_in_flight += 1
+    _idle_event().clear()
+    try:
+        yield
+    finally:
+        _transfers_in_flight -= 1
+        if not _transfers_in_flight:
+            _idle_event().set()
+
+
+def start_draining():
+    global draining
+    draining = True
+
+
+def watch_shutdown_signals():
+    """Start draining as soon as SIGTERM/SIGINT arrives, then hand it to the server
+
+    The server's own handlers are installed before the lifespan starts,
+    so they are wrapped rather than replaced.
+    """
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        previous = signal.getsignal(sig)
+        if not callable(previous):
+            continue
+
+        def handler(signum, frame, previous=previous):
+            start_draining()
+            previous(signum, frame)
+
+        try:
+            signal.signal(sig, handler)
+        except ValueError:
+            # Not the main thread (e.g. an embedding test client)
+            return
+
+
+async def drain(timeout: float) -> int:
+    """Wait up to timeout seconds for in-flight transfers; returns how many are left"""
+    start_draining()
+    if _transfers_in_flight:
+        logger.info("Waiting for %d in-flight transfer(s)", _transfers_in_flight)
+        try:
+            await asyncio.wait_for(_idle_event().wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("%d transfer(s) still running after %ss", _transfers_in_flight, timeout)
+    return _transfers_in_flight
+
+
+def stats() -> dict:
+    """This process's identity, role, drain state and DB pool usage"""
+    pool = async_engine.pool
+    return {
+        "pid": os.getpid(),
+        "worker_id": worker_id,
+        "status": "draining" if draining else "ok",
+        "background_workers": runs_background,
+        "uptime_seconds": round(time.time() - started_at, 1),
+        "transfers_in_flight": _transfers_in_flight,
+        "db_pool": {
+            "size": pool.size() if hasattr(pool, "size") else None,
+            "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+            "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+        },
+    }
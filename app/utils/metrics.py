@@ -0,0 +1,160 @@
+from contextlib import asynccontextmanager
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event
+from app.db.connectDB import async_engine, replica_engine
+import httpx
+import time
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route",
+    ["method", "route"])
+REQUESTS = Counter(
+    "http_requests_total", "Requests by route and status",
+    ["method", "route", "status"])
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "Requests currently being served",
+    ["method"])
+
+DB_POOL_IN_USE = Gauge(
+    "db_pool_connections_in_use", "Connections checked out of the pool")
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30))
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Statement execution time (count = queries run)",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1))
+
+REPLICA_HEALTHY = Gauge(
+    "db_replica_healthy", "1 while read-only routes may use the replica")
+REPLICA_LAG = Gauge(
+    "db_replica_lag_seconds", "Replication lag reported by the replica")
+DB_READS = Counter(
+    "db_reads_total", "Read-only requests by the database they were sent to",
+    ["target"])
+
+PUBSUB_SUBSCRIBERS = Gauge(
+    "pubsub_subscribers", "Local subscribers waiting on a pub/sub channel (e.g. open status streams)")
+
+PAYSTACK_LATENCY = Histogram(
+    "paystack_request_duration_seconds", "Paystack API latency",
+    ["endpoint"])
+PAYSTACK_REQUESTS = Counter(
+    "paystack_requests_total", "Paystack API calls by outcome",
+    ["endpoint", "outcome"])
+CIRCUIT_STATE = Gauge(
+    "circuit_breaker_state", "Circuit breaker state (0 closed, 1 half open, 2 open)",
+    ["name"])
+CIRCUIT_REJECTIONS = Counter(
+    "circuit_breaker_rejections_total", "Calls failed fast by an open circuit breaker",
+    ["name"])
+
+WEBHOOK_QUEUE_DEPTH = Gauge(
+    "webhook_queue_depth", "Stored webhook events not yet processed")
+WEBHOOK_QUEUE_LAG = Gauge(
+    "webhook_queue_lag_seconds", "Age of the oldest unprocessed webhook event")
+WEBHOOK_PROCESSING_LAG = Histogram(
+    "webhook_processing_lag_seconds", "Time from webhook receipt to processing",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300))
+
+RECONCILE_BACKLOG = Gauge(
+    "reconcile_backlog", "Pending deposits old enough to reconcile, as of the last pass")
+RECONCILE_CHECKED = Counter(
+    "reconcile_checked_total", "Pending deposits verified with Paystack by result",
+    ["result"])
+RECONCILE_PASS_DURATION = Gauge(
+    "reconcile_last_pass_seconds", "Duration of the last full reconciliation pass")
+
+
+def instrument_engine(engine, pool_metrics: bool = True):
+    """Time statements and (optionally) pool checkouts on an engine"""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        DB_QUERY_DURATION.observe(time.perf_counter() - context._query_started)
+
+    if not pool_metrics:
+        return
+
+    pool = sync_engine.pool
+    if hasattr(pool, "checkedout"):
+        DB_POOL_IN_USE.set_function(pool.checkedout)
+
+    # Pools expose no "checkout started" event, so time the checkout call itself
+    if hasattr(pool, "_do_get"):
+        do_get = pool._do_get
+
+        def timed_do_get():
+            started = time.perf_counter()
+            try:
+                return do_get()
+            finally:
+                DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+
+        pool._do_get = timed_do_get
+
+
+@asynccontextmanager
+async def observe_paystack(endpoint: str):
+    """Record latency and outcome of one Paystack call; callers may override the outcome"""
+    started = time.perf_counter()
+    call = {"outcome": "success"}
+    try:
+        yield call
+    except httpx.TimeoutException:
+        call["outcome"] = "timeout"
+        raise
+    except httpx.HTTPStatusError:
+        call["outcome"] = "http_error"
+        raise
+    except httpx.RequestError:
+        call["outcome"] = "network_error"
+        raise
+    except Exception:
+        call["outcome"] = "error"
+        raise
+    finally:
+        PAYSTACK_LATENCY.labels(endpoint).observe(time.perf_counter() - started)
+        PAYSTACK_REQUESTS.labels(endpoint, call["outcome"]).inc()
+
+
+class MetricsMiddleware:
+    """Per-route latency, status counts and in-flight gauges"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            in_progress.dec()
+            # Route templates keep label cardinality bounded (no raw ids in paths)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_LATENCY.labels(method, route).observe(elapsed)
+            REQUESTS.labels(method, route, status[0]).inc()
+
+
+instrument_engine(async_engine)
+if replica_engine is not None:
+    instrument_engine(replica_engine, pool_metrics=False)
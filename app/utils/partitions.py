@@ -0,0 +1,171 @@
+from datetime import date, datetime
+from sqlalchemy import select, insert, delete, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from app.schemas.schemas import Transaction, TransactionArchive
+from app.config import settings
+from typing import List, Optional
+import logging
+import re
+
+# The current month plus this many earlier months stay in transactions
+TRANSACTION_HOT_MONTHS = settings.transaction_hot_months
+# Postgres partitions are created this many months ahead of time
+TRANSACTION_PARTITIONS_AHEAD = settings.transaction_partitions_ahead
+ARCHIVE_BATCH_SIZE = settings.archive_batch_size
+
+PARTITION_NAME = re.compile(r"^transactions_(\d{4})_(\d{2})$")
+
+logger = logging.getLogger(__name__)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def hot_cutoff(now: Optional[datetime] = None) -> datetime:
+    """Start of the oldest month kept in transactions; older rows belong in the archive"""
+    today = (now or datetime.utcnow()).date()
+    month = add_months(date(today.year, today.month, 1), -TRANSACTION_HOT_MONTHS)
+    return datetime.combine(month, datetime.min.time())
+
+
+def partition_name(month: date) -> str:
+    return f"transactions_{month.year:04d}_{month.month:02d}"
+
+
+async def is_partitioned(conn: AsyncConnection, table: str = "transactions") -> bool:
+    """True when table is a Postgres partitioned table"""
+    if conn.dialect.name != "postgresql":
+        return False
+    return bool(await conn.scalar(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"),
+        {"table": table}))
+
+
+async def ensure_partitions(conn: AsyncConnection) -> List[str]:
+    """Create monthly partitions from the hot cutoff to TRANSACTION_PARTITIONS_AHEAD months out"""
+    if await is_partitioned(conn, "transactions_archive"):
+        # Receives row-by-row archival while transactions is still a plain
+        # table; partitions moved over later attach alongside it
+        await conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS transactions_archive_default "
+            "PARTITION OF transactions_archive DEFAULT"))
+    if not await is_partitioned(conn):
+        return []
+
+    # A default partition rules out DETACH ... CONCURRENTLY; partitions are
+    # kept TRANSACTION_PARTITIONS_AHEAD months ahead instead. Drop one left by
+    # an earlier migrate while it is still empty
+    if await conn.scalar(text("SELECT to_regclass('transactions_default')")):
+        if await conn.scalar(text("SELECT EXISTS (SELECT 1 FROM transactions_default)")):
+            logger.warning("transactions_default holds rows; archival falls back to a blocking DETACH")
+        else:
+            await conn.execute(text("DROP TABLE transactions_default"))
+
+    created = []
+    cutoff = hot_cutoff().date()
+    today = datetime.utcnow().date()
+    month = cutoff
+    last = add_months(date(today.year, today.month, 1), TRANSACTION_PARTITIONS_AHEAD)
+    while month <= last:
+        name = partition_name(month)
+        exists = await conn.scalar(text("SELECT to_regclass(:name)"), {"name": name})
+        if not exists:
+            await conn.execute(text(
+                f"CREATE TABLE {name} PARTITION OF transactions "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"))
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+async def archive_partitions(conn: AsyncConnection) -> List[str]:
+    """Move monthly partitions older than the hot cutoff into transactions_archive
+
+    conn must be in autocommit mode: DETACH ... CONCURRENTLY (Postgres 14+)
+    cannot run in a transaction block, and only briefly blocks writers to
+    transactions. ATTACH validates the range with one scan of the
+    partition; no rows are rewritten. Months that still hold pending
+    deposits stay put so the reconciler can settle them, as archive_rows
+    does. A partition left detached by an interrupted run is finished on
+    the next one.
+    """
+    result = await conn.execute(text("""
+        SELECT child.relname, parent.relname, pg_inherits.inhdetachpending
+        FROM pg_class child
+        LEFT JOIN pg_inherits ON pg_inherits.inhrelid = child.oid
+        LEFT JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        WHERE child.relname ~ '^transactions_[0-9]{4}_[0-9]{2}$'
+          AND child.relkind = 'r'
+          AND pg_table_is_visible(child.oid)
+    """))
+    has_default = bool(await conn.scalar(text("SELECT to_regclass('transactions_default')")))
+    cutoff = hot_cutoff().date()
+    moved = []
+    for name, parent, detach_pending in sorted(result.all()):
+        match = PARTITION_NAME.match(name)
+        month = date(int(match.group(1)), int(match.group(2)), 1)
+        if parent == "transactions_archive" or add_months(month, 1) > cutoff:
+            continue
+
+        if parent == "transactions":
+            if detach_pending:
+                await conn.execute(text(f"ALTER TABLE transactions DETACH PARTITION {name} FINALIZE"))
+            else:
+                if await conn.scalar(text(
+                        f"SELECT EXISTS (SELECT 1 FROM {name} WHERE status = 'pending')")):
+                    logger.info("Keeping %s in transactions: it has pending deposits", name)
+                    continue
+                concurrently = "" if has_default else " CONCURRENTLY"
+                await conn.execute(text(f"ALTER TABLE transactions DETACH PARTITION {name}{concurrently}"))
+
+        await conn.execute(text(
+            f"ALTER TABLE transactions_archive ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"))
+        moved.append(name)
+    return moved
+
+
+async def archive_rows(db: AsyncSession) -> int:
+    """Move one batch of rows older than the hot cutoff into transactions_archive; commits
+
+    Used where transactions is not partitioned. Pending deposits stay put
+    so the reconciler can still settle them.
+    """
+    result = await db.execute(
+        select(Transaction.__table__)
+        .filter(Transaction.created_at < hot_cutoff(), Transaction.status != "pending")
+        .order_by(Transaction.created_at, Transaction.id)
+        .limit(ARCHIVE_BATCH_SIZE)
+    )
+    rows = [dict(row._mapping) for row in result]
+    if not rows:
+        return 0
+
+    await db.execute(insert(TransactionArchive), rows)
+    await db.execute(
+        delete(Transaction)
+        .where(tuple_(Transaction.id, Transaction.created_at).in_(
+            [(row["id"], row["created_at"]) for row in rows]))
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return len(rows)
+
+
+async def archive_once(db: AsyncSession) -> int:
+    """One archival step: partition moves on partitioned Postgres, else a batch of rows"""
+    conn = await db.connection()
+    await ensure_partitions(conn)
+    partitioned = await is_partitioned(conn)
+    await db.commit()
+    if partitioned:
+        async with db.bind.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            moved = await archive_partitions(conn)
+        if moved:
+            logger.info("Archived transaction partitions %s", ", ".join(moved))
+        # Partition moves finish in one step; report no backlog
+        return 0
+    return await archive_rows(db)
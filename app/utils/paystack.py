@@ -0,0 +1,101 @@
+from typing import Optional
+from app.utils.ledger import to_minor
+from app.utils.metrics import observe_paystack
+from app.utils.circuit_breaker import CircuitBreaker
+from app.config import settings
+import httpx
+
+PAYSTACK_SECRET = settings.paystack_secret
+PAYSTACK_BASE_URL = settings.paystack_base_url
+PAYSTACK_MAX_CONNECTIONS = settings.paystack_max_connections
+PAYSTACK_MAX_KEEPALIVE = settings.paystack_max_keepalive
+PAYSTACK_KEEPALIVE_EXPIRY = settings.paystack_keepalive_expiry
+PAYSTACK_TIMEOUT = settings.paystack_timeout
+PAYSTACK_CONNECT_TIMEOUT = settings.paystack_connect_timeout
+PAYSTACK_BREAKER_FAILURES = settings.paystack_breaker_failures
+PAYSTACK_BREAKER_RESET = settings.paystack_breaker_reset
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def is_outage(error: Exception) -> bool:
+    """Errors that say Paystack is unhealthy, as opposed to rejecting our request"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, httpx.RequestError)
+
+
+breaker = CircuitBreaker(
+    "paystack", PAYSTACK_BREAKER_FAILURES, PAYSTACK_BREAKER_RESET, is_failure=is_outage)
+
+
+def build_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    """Build a pooled, keep-alive client for the Paystack API"""
+    return httpx.AsyncClient(
+        base_url=PAYSTACK_BASE_URL,
+        headers={"Authorization": f"Bearer {PAYSTACK_SECRET}"},
+        limits=httpx.Limits(
+            max_connections=PAYSTACK_MAX_CONNECTIONS,
+            max_keepalive_connections=PAYSTACK_MAX_KEEPALIVE,
+            keepalive_expiry=PAYSTACK_KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(PAYSTACK_TIMEOUT, connect=PAYSTACK_CONNECT_TIMEOUT),
+        transport=transport
+    )
+
+
+async def open_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    """Open the shared client (called from the app lifespan)"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = build_client(transport)
+    return _client
+
+
+async def close_client():
+    """Close the shared client and its pooled connections"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it if the lifespan has not run"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = build_client()
+    return _client
+
+
+async def initialize_transaction(email: str, amount: float, reference: str) -> dict:
+    """Initialize a Paystack transaction"""
+    async with breaker.guard(), observe_paystack("transaction/initialize") as call:
+        response = await get_client().post(
+            "/transaction/initialize",
+            json={
+                "email": email,
+                "amount": to_minor(amount),
+                "reference": reference
+            }
+        )
+        response.raise_for_status()
+        data = response.json()
+        if not data.get("status"):
+            call["outcome"] = "declined"
+    return data
+
+
+async def verify_transaction(reference: str) -> dict:
+    """Look up a transaction's current status; unknown references return status false"""
+    async with breaker.guard(), observe_paystack("transaction/verify") as call:
+        response = await get_client().get(f"/transaction/verify/{reference}")
+        # Paystack answers unknown references with 400/404 and status false
+        if response.status_code in (400, 404):
+            call["outcome"] = "declined"
+            return {"status": False, "data": None}
+        response.raise_for_status()
+        data = response.json()
+        if not data.get("status"):
+            call["outcome"] = "declined"
+    return data
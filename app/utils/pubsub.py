@@ -0,0 +1,230 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Optional, Protocol
+from app.utils.metrics import PUBSUB_SUBSCRIBERS
+from app.config import settings
+import asyncio
+import json
+import logging
+
+PUBSUB_BACKEND = settings.pubsub_backend
+PUBSUB_PG_CHANNEL = "wallet_events"
+# The LISTEN connection is pinged this often (seconds), so one dropped
+# without a FIN is noticed too
+PUBSUB_PG_PING_INTERVAL = 15
+# Reconnect attempts back off up to this many seconds apart
+PUBSUB_PG_RECONNECT_MAX_DELAY = 30
+
+logger = logging.getLogger(__name__)
+
+# channel -> futures of everyone currently waiting on it; a subscriber is
+# one future, so idle subscribers cost no task and no DB session
+_waiters: "defaultdict[str, set[asyncio.Future]]" = defaultdict(set)
+
+# channel -> callbacks run for every message, for the life of the process
+_listeners: "defaultdict[str, list[Callable[[str], None]]]" = defaultdict(list)
+
+
+class PubSubBackend(Protocol):
+    async def start(self, deliver: Callable[[str, str], None]):
+        """Begin delivering messages published by any process to deliver(channel, message)"""
+        ...
+
+    async def publish(self, channel: str, message: str):
+        ...
+
+    async def stop(self):
+        ...
+
+
+class LocalBackend:
+    """Delivers within this process only"""
+
+    def __init__(self):
+        self._deliver: Optional[Callable[[str, str], None]] = None
+
+    async def start(self, deliver: Callable[[str, str], None]):
+        self._deliver = deliver
+
+    async def publish(self, channel: str, message: str):
+        (self._deliver or deliver)(channel, message)
+
+    async def stop(self):
+        self._deliver = None
+
+
+class PostgresBackend:
+    """Fans messages out to every worker through Postgres LISTEN/NOTIFY
+
+    A supervisor task reconnects and re-issues LISTEN when the connection
+    drops, then resyncs subscribers, since notifications sent while it was
+    down are lost.
+    """
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self._conn = None
+        self._lock = asyncio.Lock()
+        self._deliver: Optional[Callable[[str, str], None]] = None
+        self._lost: Optional[asyncio.Event] = None
+        self._supervisor: Optional[asyncio.Task] = None
+
+    async def start(self, deliver: Callable[[str, str], None]):
+        self._deliver = deliver
+        self._lost = asyncio.Event()
+        await self._connect()
+        self._supervisor = asyncio.create_task(self._supervise())
+
+    def _on_notify(self, conn, pid, pg_channel, payload):
+        try:
+            envelope = json.loads(payload)
+            self._deliver(envelope["channel"], envelope["message"])
+        except Exception:
+            logger.exception("Dropping malformed notification")
+
+    def _on_termination(self, conn):
+        if conn is self._conn:
+            self._lost.set()
+
+    async def _connect(self):
+        import asyncpg
+        conn = await asyncpg.connect(self.dsn)
+        await conn.add_listener(PUBSUB_PG_CHANNEL, self._on_notify)
+        self._conn = conn
+        conn.add_termination_listener(self._on_termination)
+
+    async def _alive(self) -> bool:
+        try:
+            async with self._lock:
+                await asyncio.wait_for(self._conn.fetchval("SELECT 1"), PUBSUB_PG_PING_INTERVAL)
+            return True
+        except Exception:
+            return False
+
+    async def _reconnect(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            conn.terminate()
+        self._lost.clear()
+        delay = 0.5
+        while True:
+            try:
+                await self._connect()
+                return
+            except Exception as e:
+                logger.warning("Pub/sub reconnect failed (%s); retrying in %.1fs", e, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, PUBSUB_PG_RECONNECT_MAX_DELAY)
+
+    async def _supervise(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._lost.wait(), PUBSUB_PG_PING_INTERVAL)
+            except asyncio.TimeoutError:
+                if await self._alive():
+                    continue
+            logger.warning("Pub/sub connection lost; reconnecting")
+            await self._reconnect()
+            logger.info("Pub/sub connection restored")
+            resync()
+
+    async def publish(self, channel: str, message: str):
+        if self._conn is None:
+            raise ConnectionError("Pub/sub connection is down")
+        payload = json.dumps({"channel": channel, "message": message})
+        # One connection both listens and notifies; asyncpg allows one query at a time
+        async with self._lock:
+            await self._conn.execute("SELECT pg_notify($1, $2)", PUBSUB_PG_CHANNEL, payload)
+
+    async def stop(self):
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+            await asyncio.gather(self._supervisor, return_exceptions=True)
+            self._supervisor = None
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            await conn.close()
+
+
+def _default_backend() -> PubSubBackend:
+    if PUBSUB_BACKEND == "postgres":
+        from app.db.connectDB import DATABASE_URL
+        scheme, sep, rest = DATABASE_URL.partition("://")
+        return PostgresBackend(f"postgresql{sep}{rest}")
+    return LocalBackend()
+
+
+backend: PubSubBackend = _default_backend()
+
+
+def set_backend(new_backend: PubSubBackend):
+    """Swap the transport, e.g. for Redis in deployments without Postgres"""
+    global backend
+    backend = new_backend
+
+
+def deliver(channel: str, message: str):
+    """Wake every local subscriber of channel with message"""
+    for callback in _listeners.get(channel, ()):
+        try:
+            callback(message)
+        except Exception:
+            logger.exception("Listener on %s failed", channel)
+    for future in _waiters.pop(channel, ()):
+        if not future.done():
+            future.set_result(message)
+
+
+def resync():
+    """Wake every subscriber with None: messages may have been missed, so re-read current state"""
+    for channel in list(_waiters):
+        for future in _waiters.pop(channel, ()):
+            if not future.done():
+                future.set_result(None)
+
+
+def add_listener(channel: str, callback: Callable[[str], None]):
+    """Call callback(message) for every message on channel, from any worker"""
+    _listeners[channel].append(callback)
+
+
+def subscriber_count() -> int:
+    return sum(len(futures) for futures in _waiters.values())
+
+
+PUBSUB_SUBSCRIBERS.set_function(subscriber_count)
+
+
+@contextmanager
+def subscription(channel: str):
+    """Future resolved with the next message on channel, or None after resync()
+
+    Subscribe before checking current state, so a message published in
+    between is not missed.
+    """
+    future = asyncio.get_running_loop().create_future()
+    _waiters[channel].add(future)
+    try:
+        yield future
+    finally:
+        futures = _waiters.get(channel)
+        if futures is not None:
+            futures.discard(future)
+            if not futures:
+                del _waiters[channel]
+
+
+async def publish(channel: str, message: str):
+    """Publish to subscribers in every worker; failures are logged, not raised"""
+    try:
+        await backend.publish(channel, message)
+    except Exception:
+        logger.exception("Publishing to %s failed", channel)
+
+
+async def start():
+    await backend.start(deliver)
+
+
+async def stop():
+    await backend.stop()
@@ -0,0 +1,165 @@
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from app.db.connectDB import async_engine, AsyncSessionLocal
+from app.utils.utils import get_api_key_principal, hash_api_key, get_user_from_token
+from typing import Optional, Protocol
+from app.config import settings
+import math
+import threading
+import time
+
+# Cost units per minute; a bucket can burst up to one full minute's allowance
+API_KEY_RATE_LIMIT = settings.api_key_rate_limit
+# Keys created before the cap, or while it was higher, are clamped to it
+API_KEY_MAX_RATE_LIMIT = settings.api_key_max_rate_limit
+USER_RATE_LIMIT = settings.user_rate_limit
+RATE_LIMIT_SHARDS = settings.rate_limit_shards
+RATE_LIMIT_MAX_BUCKETS = settings.rate_limit_max_buckets
+# Shed load once this share of the DB pool (size + overflow) is checked out
+LOAD_SHED_POOL_RATIO = settings.load_shed_pool_ratio
+
+ROUTE_COSTS = {
+    ("POST", "/wallet/deposit"): 5,
+    ("POST", "/wallet/transfer"): 5,
+    ("POST", "/wallet/transfer/batch"): 50,
+    ("GET", "/wallet/transactions"): 2,
+    ("GET", "/wallet/summary"): 2,
+    ("GET", "/wallet/transactions/export"): 50,
+    ("POST", "/keys/create"): 10,
+    ("POST", "/keys/rollover"): 10,
+}
+
+EXEMPT_PREFIXES = ("/healthz", "/metrics", "/wallet/paystack/webhook")
+
+
+class RateLimitBackend(Protocol):
+    def take(self, key: str, cost: float, limit: int) -> float:
+        """Spend cost tokens from key's bucket; returns 0 if allowed, else seconds to wait"""
+        ...
+
+
+class InMemoryBackend:
+    """Per-process token buckets, sharded across locks to limit contention"""
+
+    def __init__(self, shards: int = RATE_LIMIT_SHARDS, max_buckets: int = RATE_LIMIT_MAX_BUCKETS):
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._buckets = [{} for _ in range(shards)]
+        self._max_per_shard = max(1, max_buckets // shards)
+
+    def take(self, key: str, cost: float, limit: int) -> float:
+        index = hash(key) % len(self._locks)
+        rate = limit / 60.0
+        now = time.monotonic()
+        with self._locks[index]:
+            buckets = self._buckets[index]
+            tokens, updated = buckets.get(key, (float(limit), now))
+            tokens = min(float(limit), tokens + (now - updated) * rate)
+            if tokens >= cost:
+                buckets[key] = (tokens - cost, now)
+                wait = 0.0
+            else:
+                buckets[key] = (tokens, now)
+                wait = (cost - tokens) / rate
+            if len(buckets) > self._max_per_shard:
+                self._prune(buckets, now)
+        return wait
+
+    def _prune(self, buckets: dict, now: float):
+        # A bucket idle for a minute has refilled completely, so forgetting it is free
+        for key, (tokens, updated) in list(buckets.items()):
+            if now - updated >= 60:
+                del buckets[key]
+        while len(buckets) > self._max_per_shard:
+            buckets.pop(next(iter(buckets)))
+
+
+backend: RateLimitBackend = InMemoryBackend()
+
+
+def set_backend(new_backend: RateLimitBackend):
+    """Swap the bucket store, e.g. for a shared one in multi-worker deployments"""
+    global backend
+    backend = new_backend
+
+
+def pool_saturated() -> bool:
+    """True when the DB pool is close to exhausted"""
+    pool = async_engine.pool
+    if not hasattr(pool, "checkedout"):
+        return False
+    capacity = pool.size() + max(getattr(pool, "_max_overflow", 0), 0)
+    return capacity > 0 and pool.checkedout() >= capacity * LOAD_SHED_POOL_RATIO
+
+
+async def api_key_limit(raw_key: str) -> Optional[int]:
+    """A key's own per-minute limit, the default for keys without one, or None if unknown
+
+    Resolved through the principal cache; a miss runs the same single
+    query the route would, and leaves the principal (or the key's
+    invalidity) cached for it.
+    """
+    try:
+        async with AsyncSessionLocal() as db:
+            principal = await get_api_key_principal(raw_key, db)
+    except HTTPException:
+        return None
+    return min(principal.rate_limit or API_KEY_RATE_LIMIT, API_KEY_MAX_RATE_LIMIT)
+
+
+async def identify(headers: dict, client: Optional[tuple] = None) -> Optional[tuple[str, int]]:
+    """Bucket key and per-minute limit for a request, or None if unauthenticated
+
+    Unknown API keys share one bucket per client address, so rotating
+    random keys does not earn a fresh bucket each time.
+    """
+    api_key = headers.get(b"x-api-key")
+    if api_key:
+        raw_key = api_key.decode("latin-1")
+        limit = await api_key_limit(raw_key)
+        if limit is None:
+            return f"invalid:{client[0] if client else 'unknown'}", API_KEY_RATE_LIMIT
+        return f"key:{hash_api_key(raw_key)}", limit
+
+    authorization = headers.get(b"authorization")
+    if authorization:
+        try:
+            user_id = get_user_from_token(authorization.decode("latin-1"))
+        except Exception:
+            return None
+        return f"user:{user_id}", USER_RATE_LIMIT
+    return None
+
+
+def reject(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content={"detail": detail},
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+
+class RateLimitMiddleware:
+    """Per-principal token buckets plus early load shedding when the DB pool is nearly full"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        if pool_saturated():
+            await reject(503, "Service overloaded, retry shortly", 1)(scope, receive, send)
+            return
+
+        identity = await identify(dict(scope["headers"]), scope.get("client"))
+        if identity:
+            key, limit = identity
+            cost = min(ROUTE_COSTS.get((scope["method"], scope["path"]), 1), limit)
+            wait = backend.take(key, cost, limit)
+            if wait > 0:
+                await reject(429, "Rate limit exceeded", wait)(scope, receive, send)
+                return
+
+        await self.app(scope, receive, send)
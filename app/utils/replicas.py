@@ -0,0 +1,119 @@
+from fastapi import Depends
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from app.db.connectDB import AsyncSessionLocal, ReplicaSessionLocal, replica_engine
+from app.utils.cache import TTLCache
+from app.utils import pubsub
+from app.utils.metrics import REPLICA_HEALTHY, REPLICA_LAG, DB_READS
+from app.utils.utils import get_principal, Principal, PRINCIPAL_CACHE_SIZE
+from app.config import settings
+from typing import Optional
+import time
+
+# Replicas further behind than this are skipped; it is also how long a
+# user's reads stay on the primary after they write
+REPLICA_MAX_LAG = settings.replica_max_lag
+# After a connection failure, keep reads on the primary this long
+REPLICA_RETRY_SECONDS = settings.replica_retry_seconds
+
+POSTGRES_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+""")
+
+# Writes are announced here so every worker pins the writer's reads, not
+# just the one that served the write
+REPLICA_WRITES_CHANNEL = "replicas.write"
+
+recent_writers = TTLCache(PRINCIPAL_CACHE_SIZE, REPLICA_MAX_LAG)
+
+state = {
+    "configured": replica_engine is not None,
+    "healthy": replica_engine is not None,
+    "lag_seconds": None,
+    "checked_at": None,
+    "last_error": None,
+}
+_unavailable_until = 0.0
+
+
+def _pin_to_primary(user_id: str):
+    recent_writers.set(user_id, True)
+
+
+async def note_write(user_id: str):
+    """Pin a user's reads to the primary in every worker until replicas catch up
+
+    Call after the write commits, so the REPLICA_MAX_LAG window starts
+    when the write becomes visible rather than before a slow commit.
+    """
+    _pin_to_primary(user_id)
+    await pubsub.publish(REPLICA_WRITES_CHANNEL, user_id)
+
+
+pubsub.add_listener(REPLICA_WRITES_CHANNEL, _pin_to_primary)
+
+
+def mark_unhealthy(error: Exception):
+    """Route reads to the primary for REPLICA_RETRY_SECONDS"""
+    global _unavailable_until
+    _unavailable_until = time.monotonic() + REPLICA_RETRY_SECONDS
+    state["healthy"] = False
+    state["last_error"] = str(error)
+    REPLICA_HEALTHY.set(0)
+
+
+def replica_usable() -> bool:
+    return state["healthy"] and time.monotonic() >= _unavailable_until
+
+
+def read_session_factory(user_id: Optional[str] = None):
+    """Session factory for a read: the replica when healthy and the user has no recent write"""
+    if ReplicaSessionLocal is None or not replica_usable():
+        DB_READS.labels("primary").inc()
+        return AsyncSessionLocal
+    if user_id and recent_writers.get(user_id):
+        DB_READS.labels("primary").inc()
+        return AsyncSessionLocal
+    DB_READS.labels("replica").inc()
+    return ReplicaSessionLocal
+
+
+async def get_read_db(principal: Principal = Depends(get_principal)):
+    """Session for read-only routes (replica with fallback to the primary)"""
+    session_factory = read_session_factory(principal.user_id)
+    async with session_factory() as db:
+        try:
+            yield db
+        except DBAPIError as e:
+            if session_factory is ReplicaSessionLocal and e.connection_invalidated:
+                mark_unhealthy(e)
+            raise
+
+
+async def check_replica() -> dict:
+    """Probe the replica's reachability and lag, updating its health"""
+    if replica_engine is None:
+        return state
+    try:
+        async with replica_engine.connect() as conn:
+            if replica_engine.dialect.name == "postgresql":
+                lag = float(await conn.scalar(POSTGRES_LAG_QUERY) or 0)
+            else:
+                await conn.execute(text("SELECT 1"))
+                lag = 0.0
+    except Exception as e:
+        mark_unhealthy(e)
+        state["checked_at"] = time.time()
+        return state
+
+    state["lag_seconds"] = lag
+    state["checked_at"] = time.time()
+    state["healthy"] = lag <= REPLICA_MAX_LAG
+    state["last_error"] = None if state["healthy"] else f"Replica is {lag:.1f}s behind"
+    REPLICA_LAG.set(lag)
+    REPLICA_HEALTHY.set(1 if replica_usable() else 0)
+    return state
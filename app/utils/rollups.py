@@ -0,0 +1,153 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from sqlalchemy import select, delete, func, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.schemas.schemas import WalletDailyRollup, LedgerEntry, Transaction, TransactionArchive
+from typing import Dict, Iterable, List, Optional, Tuple
+import random
+
+ROLLUP_COLUMNS = [
+    "deposits", "deposits_count",
+    "transfers_in", "transfers_in_count",
+    "transfers_out", "transfers_out_count",
+]
+
+# (wallet_id, day, shard) -> column -> delta
+RollupDeltas = Dict[Tuple[str, date, int], Dict[str, int]]
+
+
+def _upsert_stmt(dialect_name: str):
+    insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    stmt = insert(WalletDailyRollup)
+    return stmt.on_conflict_do_update(
+        index_elements=["wallet_id", "day", "shard"],
+        set_={
+            column: getattr(WalletDailyRollup, column) + stmt.excluded[column]
+            for column in ROLLUP_COLUMNS
+        }
+    )
+
+
+def rollup_deltas(
+    entries: Iterable[tuple[str, str, int, date]], shard_counts: Optional[Dict[str, int]] = None
+) -> RollupDeltas:
+    """Group (wallet_id, kind, minor amount, day) movements into per-row deltas
+
+    kind is "deposit", "transfer_out" or "transfer_in"; the amount's sign
+    is ignored, so the direction never depends on it.
+    """
+    shard_counts = shard_counts or {}
+    deltas: RollupDeltas = defaultdict(lambda: dict.fromkeys(ROLLUP_COLUMNS, 0))
+    for wallet_id, kind, amount, day in entries:
+        shards = shard_counts.get(wallet_id)
+        row = deltas[(wallet_id, day, random.randrange(shards) if shards else 0)]
+        if kind == "deposit":
+            row["deposits"] += abs(amount)
+            row["deposits_count"] += 1
+        elif kind == "transfer_in":
+            row["transfers_in"] += abs(amount)
+            row["transfers_in_count"] += 1
+        elif kind == "transfer_out":
+            row["transfers_out"] += abs(amount)
+            row["transfers_out_count"] += 1
+        else:
+            raise ValueError(f"Unknown rollup kind {kind!r}")
+    return deltas
+
+
+async def add_rollups(db: AsyncSession, deltas: RollupDeltas):
+    """Add deltas to the daily rollups in one upsert round trip, without committing
+
+    Rows are written in key order so concurrent writers lock them in the
+    same order.
+    """
+    if not deltas:
+        return
+    await db.execute(_upsert_stmt(db.get_bind().dialect.name), [
+        {"wallet_id": wallet_id, "day": day, "shard": shard, **values}
+        for (wallet_id, day, shard), values in sorted(deltas.items())
+    ])
+
+
+async def record_rollups(
+    db: AsyncSession, movements: List[tuple[str, str, int]],
+    shard_counts: Optional[Dict[str, int]] = None
+):
+    """Roll up (wallet_id, kind, minor amount) movements written now"""
+    today = datetime.utcnow().date()
+    await add_rollups(db, rollup_deltas(
+        ((wallet_id, kind, amount, today) for wallet_id, kind, amount in movements), shard_counts))
+
+
+async def summarize(db: AsyncSession, wallet_id: str, start: date, end: date) -> List[dict]:
+    """Daily totals for start <= day < end; reads at most (days x shards) rows"""
+    result = await db.execute(
+        select(WalletDailyRollup.day, *(
+            func.sum(getattr(WalletDailyRollup, column)).label(column)
+            for column in ROLLUP_COLUMNS
+        ))
+        .filter(
+            WalletDailyRollup.wallet_id == wallet_id,
+            WalletDailyRollup.day >= start,
+            WalletDailyRollup.day < end
+        )
+        .group_by(WalletDailyRollup.day)
+        .order_by(WalletDailyRollup.day)
+    )
+    return [dict(row._mapping) for row in result]
+
+
+def ledger_kind(transaction_type: str, amount: int) -> str:
+    """Rollup kind of a stored ledger entry, whose sign is its only record of direction"""
+    if transaction_type != "transfer":
+        return transaction_type
+    return "transfer_out" if amount < 0 else "transfer_in"
+
+
+async def backfill(db: AsyncSession, until: date, batch_size: int) -> int:
+    """Rebuild rollups for days before `until` from the ledger, one batch per commit
+
+    Live writes only touch the current day, so rebuilding earlier days is
+    safe while traffic flows. Re-running the backfill gives the same result.
+    """
+    await db.execute(delete(WalletDailyRollup).where(WalletDailyRollup.day < until))
+    await db.commit()
+
+    cutoff = datetime.combine(until, datetime.min.time())
+    # Ledger entries outlive the transactions moved to the archive
+    types = union_all(
+        select(Transaction.id, Transaction.type),
+        select(TransactionArchive.id, TransactionArchive.type),
+    ).subquery()
+    after_id = 0
+    processed = 0
+    while True:
+        result = await db.execute(
+            select(LedgerEntry.id, LedgerEntry.wallet_id, LedgerEntry.amount,
+                   LedgerEntry.created_at, types.c.type)
+            .join(types, types.c.id == LedgerEntry.transaction_id)
+            .filter(LedgerEntry.id > after_id, LedgerEntry.created_at < cutoff)
+            .order_by(LedgerEntry.id)
+            .limit(batch_size)
+        )
+        rows = result.all()
+        if not rows:
+            return processed
+        after_id = rows[-1].id
+
+        await add_rollups(db, rollup_deltas(
+            (row.wallet_id, ledger_kind(row.type, row.amount), row.amount, row.created_at.date())
+            for row in rows
+            # A zero transfer moved nothing and its direction is unknowable
+            if row.type != "transfer" or row.amount
+        ))
+        await db.commit()
+        processed += len(rows)
+
+
+def default_range(start: Optional[date], end: Optional[date], days: int = 30) -> tuple[date, date]:
+    """Fill in a missing end (tomorrow, so today is included) and start"""
+    end = end or datetime.utcnow().date() + timedelta(days=1)
+    start = start or end - timedelta(days=days)
+    return start, end
@@ -0,0 +1,67 @@
+from sqlalchemy import inspect, literal, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.db.connectDB import Base
+from typing import Dict, List, Set
+
+
+def _existing_names(sync_conn, getter: str) -> Dict[str, Set[str]]:
+    """table -> names of its columns or indexes, per the live database"""
+    inspector = inspect(sync_conn)
+    return {
+        table: {item["name"] for item in getattr(inspector, getter)(table)}
+        for table in inspector.get_table_names()
+    }
+
+
+def _column_ddl(column, dialect) -> str:
+    ddl = f"{column.name} {column.type.compile(dialect=dialect)}"
+    default = column.default
+    if default is not None and default.is_scalar:
+        value = literal(default.arg, column.type).compile(
+            dialect=dialect, compile_kwargs={"literal_binds": True})
+        ddl += f" DEFAULT {value}"
+    elif not column.nullable:
+        raise RuntimeError(
+            f"Cannot add NOT NULL column {column.table.name}.{column.name} without a scalar default")
+    if not column.nullable:
+        ddl += " NOT NULL"
+    return ddl
+
+
+async def add_missing_columns(conn: AsyncConnection) -> List[str]:
+    """Add model columns missing from tables that already exist; returns "table.column" names
+
+    create_all only creates whole tables, so columns added to a model
+    after its table was created are added here. Existing rows get the
+    column's scalar default.
+    """
+    existing = await conn.run_sync(_existing_names, "get_columns")
+    added = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing:
+            continue
+        for column in table.columns:
+            if column.name in existing[table.name]:
+                continue
+            await conn.execute(text(
+                f"ALTER TABLE {table.name} ADD COLUMN {_column_ddl(column, conn.dialect)}"))
+            added.append(f"{table.name}.{column.name}")
+    return added
+
+
+async def add_missing_indexes(conn: AsyncConnection) -> List[str]:
+    """Create model indexes missing from tables that already exist; returns their names
+
+    Plain CREATE INDEX: on a large Postgres table it blocks writes while it
+    builds, so run migrate before the upgraded app takes traffic.
+    """
+    existing = await conn.run_sync(_existing_names, "get_indexes")
+    missing = [
+        index
+        for table in Base.metadata.sorted_tables if table.name in existing
+        for index in sorted(table.indexes, key=lambda index: index.name)
+        if index.name not in existing[table.name]
+    ]
+    for index in missing:
+        await conn.run_sync(index.create)
+    return [index.name for index in missing]
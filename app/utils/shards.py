@@ -0,0 +1,133 @@
+from fastapi import HTTPException
+from sqlalchemy import select, update, delete, insert, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.schemas.schemas import Wallet, WalletShard
+import random
+
+
+async def credit_shard(db: AsyncSession, wallet_id: str, shard_count: int, amount: int):
+    """Credit a random shard of a hot wallet, falling back to the wallet row"""
+    result = await db.execute(
+        update(WalletShard)
+        .where(WalletShard.wallet_id == wallet_id,
+               WalletShard.shard == random.randrange(shard_count))
+        .values(balance=WalletShard.balance + amount)
+        .execution_options(synchronize_session=False)
+    )
+    # The shard is gone if the wallet was unsharded after shard_count was read;
+    # the wallet row always counts towards the balance, so credit it instead.
+    if result.rowcount != 1:
+        await db.execute(
+            update(Wallet)
+            .where(Wallet.id == wallet_id)
+            .values(balance=Wallet.balance + amount)
+            .execution_options(synchronize_session=False)
+        )
+
+
+async def debit_sharded(db: AsyncSession, wallet_id: str, amount: int) -> bool:
+    """Gather a debit from a hot wallet's row and shards; False if funds are short"""
+    wallet_balance = await db.scalar(
+        select(Wallet.balance).filter(Wallet.id == wallet_id).with_for_update())
+    result = await db.execute(
+        select(WalletShard.shard, WalletShard.balance)
+        .filter(WalletShard.wallet_id == wallet_id)
+        .order_by(WalletShard.shard)
+        .with_for_update()
+    )
+    shards = result.all()
+
+    if wallet_balance is None or wallet_balance + sum(b for _, b in shards) < amount:
+        return False
+
+    remaining = amount
+    take = min(max(wallet_balance, 0), remaining)
+    if take:
+        await db.execute(
+            update(Wallet)
+            .where(Wallet.id == wallet_id)
+            .values(balance=Wallet.balance - take)
+            .execution_options(synchronize_session=False)
+        )
+        remaining -= take
+
+    for shard, balance in shards:
+        if not remaining:
+            break
+        take = min(max(balance, 0), remaining)
+        if take:
+            await db.execute(
+                update(WalletShard)
+                .where(WalletShard.wallet_id == wallet_id, WalletShard.shard == shard)
+                .values(balance=WalletShard.balance - take)
+                .execution_options(synchronize_session=False)
+            )
+            remaining -= take
+    return True
+
+
+async def sharded_balance(db: AsyncSession, wallet: Wallet) -> int:
+    """Total balance in minor units: the wallet row plus any shards"""
+    if not wallet.shard_count:
+        return wallet.balance
+    shard_total = await db.scalar(
+        select(func.coalesce(func.sum(WalletShard.balance), 0))
+        .filter(WalletShard.wallet_id == wallet.id))
+    return wallet.balance + shard_total
+
+
+async def set_shard_count(db: AsyncSession, wallet_id: str, shard_count: int):
+    """Spread a wallet over shard_count shards (0 unshards it) and commit
+
+    Safe to run online: the wallet row and its shards are locked, shards
+    being removed are folded back into the wallet row, and the total
+    balance never changes.
+    """
+    if shard_count < 0:
+        raise HTTPException(status_code=400, detail="Shard count must not be negative")
+
+    try:
+        wallet = await db.scalar(
+            select(Wallet).filter(Wallet.id == wallet_id).with_for_update())
+        if not wallet:
+            raise HTTPException(status_code=404, detail="Wallet not found")
+
+        result = await db.execute(
+            select(WalletShard.shard, WalletShard.balance)
+            .filter(WalletShard.wallet_id == wallet_id)
+            .order_by(WalletShard.shard)
+            .with_for_update()
+        )
+        existing = dict(result.all())
+
+        removed = {s: b for s, b in existing.items() if s >= shard_count}
+        if removed:
+            await db.execute(
+                update(Wallet)
+                .where(Wallet.id == wallet_id)
+                .values(balance=Wallet.balance + sum(removed.values()))
+                .execution_options(synchronize_session=False)
+            )
+            await db.execute(
+                delete(WalletShard)
+                .where(WalletShard.wallet_id == wallet_id,
+                       WalletShard.shard >= shard_count)
+                .execution_options(synchronize_session=False)
+            )
+
+        added = [s for s in range(shard_count) if s not in existing]
+        if added:
+            await db.execute(insert(WalletShard), [
+                {"wallet_id": wallet_id, "shard": s, "balance": 0} for s in added
+            ])
+
+        await db.execute(
+            update(Wallet)
+            .where(Wallet.id == wallet_id)
+            .values(shard_count=shard_count)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
@@ -0,0 +1,132 @@
+from fastapi import HTTPException
+from sqlalchemy import update, insert, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.schemas.schemas import Wallet, Transaction
+from app.utils.ledger import to_minor, record_entries
+from app.utils.shards import credit_shard, debit_sharded
+from app.utils.rollups import record_rollups
+from collections import defaultdict
+from typing import List, Dict, Optional
+import secrets
+
+wallets_table = Wallet.__table__
+
+# Executed once per credited wallet in a single executemany round trip
+credit_many_stmt = (
+    update(wallets_table)
+    .where(wallets_table.c.id == bindparam("credit_wallet_id"))
+    .values(balance=wallets_table.c.balance + bindparam("credit_amount"))
+)
+
+
+async def debit_wallet(db: AsyncSession, wallet_id: str, amount: int) -> bool:
+    """Conditionally debit minor units in one statement; False if funds are short"""
+    result = await db.execute(
+        update(Wallet)
+        .where(Wallet.id == wallet_id, Wallet.balance >= amount)
+        .values(balance=Wallet.balance - amount)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+async def credit_wallet(db: AsyncSession, wallet_id: str, amount: int):
+    """Credit minor units with an in-place increment"""
+    await db.execute(
+        update(Wallet)
+        .where(Wallet.id == wallet_id)
+        .values(balance=Wallet.balance + amount)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def credit_wallets(db: AsyncSession, credits: List[tuple[str, int]], shard_counts: Optional[Dict[str, int]] = None):
+    """Credit minor units to several wallets, in the given order
+
+    Plain wallets are credited in one executemany round trip; sharded
+    wallets (shard_counts maps wallet id -> shard count) get a random shard.
+    """
+    shard_counts = shard_counts or {}
+    plain = [(w, a) for w, a in credits if not shard_counts.get(w)]
+    if plain:
+        await db.execute(credit_many_stmt, [
+            {"credit_wallet_id": wallet_id, "credit_amount": amount}
+            for wallet_id, amount in plain
+        ])
+    for wallet_id, amount in credits:
+        if shard_counts.get(wallet_id):
+            await credit_shard(db, wallet_id, shard_counts[wallet_id], amount)
+
+
+async def transfer_many(db: AsyncSession, sender_wallet_id: str, credits: List[tuple[str, float]], shard_counts: Optional[Dict[str, int]] = None, commit: bool = True):
+    """Atomically pay several recipients from one wallet and commit
+
+    With commit=False the caller commits, so other writes (e.g. the
+    idempotency record) can land in the same transaction; on failure the
+    transaction is still rolled back here.
+
+    Balances are only changed through conditional UPDATEs, never read and
+    written back from Python, so concurrent transfers cannot overdraw a
+    wallet. Rows are touched in wallet id order, so two transfers in
+    opposite directions always lock in the same order and cannot deadlock.
+    shard_counts maps the ids of any sharded recipients to their shard
+    count.
+    """
+    shard_counts = shard_counts or {}
+    totals = defaultdict(int)
+    for wallet_id, amount in credits:
+        totals[wallet_id] += to_minor(amount)
+    total = sum(totals.values())
+
+    ordered = sorted(totals.items())
+    before = [item for item in ordered if item[0] < sender_wallet_id]
+    after = [item for item in ordered if item[0] > sender_wallet_id]
+
+    try:
+        await credit_wallets(db, before, shard_counts)
+        # A sharded sender's row may not hold enough on its own, so fall
+        # back to gathering across its shards before giving up.
+        debited = (await debit_wallet(db, sender_wallet_id, total)
+                   or await debit_sharded(db, sender_wallet_id, total))
+        if not debited:
+            raise HTTPException(status_code=400, detail="Insufficient balance")
+        await credit_wallets(db, after, shard_counts)
+
+        rows = []
+        entries = []
+        movements = []
+        for wallet_id, amount in credits:
+            out_id, in_id = secrets.token_hex(8), secrets.token_hex(8)
+            rows.append({
+                "id": out_id,
+                "wallet_id": sender_wallet_id,
+                "type": "transfer",
+                "amount": amount,
+                "status": "success",
+                "recipient_wallet_id": wallet_id
+            })
+            rows.append({
+                "id": in_id,
+                "wallet_id": wallet_id,
+                "type": "transfer",
+                "amount": amount,
+                "status": "success",
+                "recipient_wallet_id": sender_wallet_id
+            })
+            entries.append((sender_wallet_id, out_id, -to_minor(amount)))
+            entries.append((wallet_id, in_id, to_minor(amount)))
+            movements.append((sender_wallet_id, "transfer_out", to_minor(amount)))
+            movements.append((wallet_id, "transfer_in", to_minor(amount)))
+        await db.execute(insert(Transaction), rows)
+        await record_entries(db, entries)
+        await record_rollups(db, movements, shard_counts)
+        if commit:
+            await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+
+async def transfer(db: AsyncSession, sender_wallet_id: str, recipient_wallet_id: str, amount: float, shard_counts: Optional[Dict[str, int]] = None, commit: bool = True):
+    """Atomically move funds between two wallets and commit (see transfer_many)"""
+    await transfer_many(db, sender_wallet_id, [(recipient_wallet_id, amount)], shard_counts, commit)
@@ -1,21 +1,45 @@
 from app.models.models import ExpiryEnum
 from datetime import datetime, timedelta
-from typing import Optional, List
+from typing import Optional, List, NamedTuple
 from fastapi import HTTPException, Depends, Header
-from app.schemas.schemas import ApiKey
+from app.schemas.schemas import ApiKey, User, Wallet
 from app.models.models import PermissionEnum
 from app.db.connectDB import get_db
-from sqlalchemy.orm import Session
-from dotenv import load_dotenv
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from app.utils.cache import TTLCache
+from app.utils import pubsub
+from app.config import settings
 import hashlib
+import base64
 import jwt
-import os
 
-load_dotenv()
+JWT_SECRET = settings.jwt_secret
+JWT_ALGORITHM = settings.jwt_algorithm
+JWT_EXPIRY_HOURS = settings.jwt_expiry_hours
+API_KEY_CACHE_SIZE = settings.api_key_cache_size
+API_KEY_CACHE_TTL = settings.api_key_cache_ttl
+INVALID_API_KEY_CACHE_TTL = settings.invalid_api_key_cache_ttl
+PRINCIPAL_CACHE_SIZE = settings.principal_cache_size
+PRINCIPAL_CACHE_TTL = settings.principal_cache_ttl
 
-JWT_SECRET = os.getenv("JWT_SECRET")
-JWT_ALGORITHM = os.getenv("JWT_ALGORITHM")
-JWT_EXPIRY_HOURS = os.getenv("JWT_EXPIRY_HOURS")
+JWT_PERMISSIONS = [PermissionEnum.DEPOSIT, PermissionEnum.TRANSFER, PermissionEnum.READ]
+
+# key_hash -> Principal for recently verified API keys
+api_key_cache = TTLCache(maxsize=API_KEY_CACHE_SIZE, ttl=API_KEY_CACHE_TTL)
+
+# key_hash -> True for keys that matched no live key, so repeated bogus keys
+# cost one query per INVALID_API_KEY_CACHE_TTL, not one (or two) per request
+invalid_api_key_cache = TTLCache(maxsize=API_KEY_CACHE_SIZE, ttl=INVALID_API_KEY_CACHE_TTL)
+
+# user_id -> Principal for JWT callers; a user's wallet never changes
+user_principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+
+# Revoked and rolled-over key hashes are published here so every worker
+# drops them; a worker that misses the message (PUBSUB_BACKEND=local with
+# several workers, or a failed publish) serves the key for at most
+# API_KEY_CACHE_TTL seconds more
+API_KEY_INVALIDATION_CHANNEL = "api_keys.invalidate"
 
 
 def convert_expiry(expiry: ExpiryEnum) -> datetime:
@@ -31,6 +55,20 @@ def convert_expiry(expiry: ExpiryEnum) -> datetime:
         return now + timedelta(days=365)
 
 
+def hash_api_key(raw_key: str) -> str:
+    """Hash a raw API key for storage and lookup"""
+    return hashlib.sha256(raw_key.encode()).hexdigest()
+
+
+async def invalidate_api_key(key_hash: str):
+    """Drop a cached API key here and in every other worker"""
+    api_key_cache.pop(key_hash)
+    await pubsub.publish(API_KEY_INVALIDATION_CHANNEL, key_hash)
+
+
+pubsub.add_listener(API_KEY_INVALIDATION_CHANNEL, api_key_cache.pop)
+
+
 def get_user_from_token(authorization: Optional[str] = Header(None)) -> str:
     """Extract and verify JWT token"""
     if not authorization:
@@ -50,45 +88,139 @@ def get_user_from_token(authorization: Optional[str] = Header(None)) -> str:
         raise HTTPException(status_code=401, detail="Invalid token")
 
 
-def get_api_key_user(x_api_key: Optional[str] = Header(None), db: Session = Depends(get_db)) -> tuple[str, list]:
-    """Extract and verify API key"""
-    if not x_api_key:
-        raise HTTPException(status_code=401, detail="Missing API key")
+class Principal(NamedTuple):
+    """Everything a wallet route needs to know about the caller"""
+    user_id: str
+    wallet_id: Optional[str]
+    wallet_number: Optional[str]
+    email: Optional[str]
+    permissions: List[str]
+    rate_limit: Optional[int] = None
 
-    key_hash = hashlib.sha256(x_api_key.encode()).hexdigest()
 
-    api_key_record = db.query(ApiKey).filter(
-        ApiKey.key_hash == key_hash,
-        ApiKey.revoked == False,
-        ApiKey.expires_at > datetime.utcnow()
-    ).first()
+async def get_api_key_principal(x_api_key: str, db: AsyncSession) -> Principal:
+    """Resolve an API key, its user and wallet in one joined query (cached)"""
+    key_hash = hash_api_key(x_api_key)
+
+    cached = api_key_cache.get(key_hash)
+    if cached is not None:
+        return cached
+    if invalid_api_key_cache.get(key_hash):
+        raise HTTPException(
+            status_code=401, detail="Invalid or expired API key")
 
-    if not api_key_record:
+    result = await db.execute(
+        select(ApiKey.user_id, ApiKey.permissions, ApiKey.rate_limit, ApiKey.expires_at,
+               Wallet.id, Wallet.wallet_number, User.email)
+        .outerjoin(User, User.id == ApiKey.user_id)
+        .outerjoin(Wallet, Wallet.user_id == ApiKey.user_id)
+        .filter(
+            ApiKey.key_hash == key_hash,
+            ApiKey.revoked == False,
+            ApiKey.expires_at > datetime.utcnow()
+        )
+        .limit(1)
+    )
+    row = result.first()
+
+    if not row:
+        invalid_api_key_cache.set(key_hash, True)
         raise HTTPException(
             status_code=401, detail="Invalid or expired API key")
 
-    permissions = api_key_record.permissions.split(",")
-    return api_key_record.user_id, permissions
+    user_id, permissions, rate_limit, expires_at, wallet_id, wallet_number, email = row
+    principal = Principal(
+        user_id, wallet_id, wallet_number, email, permissions.split(","), rate_limit)
+
+    ttl = (expires_at - datetime.utcnow()).total_seconds()
+    api_key_cache.set(key_hash, principal, ttl)
+    return principal
+
+
+async def get_token_principal(authorization: str, db: AsyncSession) -> Principal:
+    """Resolve a JWT's user and wallet, cached per user"""
+    user_id = get_user_from_token(authorization)
+
+    cached = user_principal_cache.get(user_id)
+    if cached is not None:
+        return cached
 
+    result = await db.execute(
+        select(User.email, Wallet.id, Wallet.wallet_number)
+        .outerjoin(Wallet, Wallet.user_id == User.id)
+        .filter(User.id == user_id)
+        .limit(1)
+    )
+    row = result.first()
+    email, wallet_id, wallet_number = row if row else (None, None, None)
 
-def get_current_user(
+    principal = Principal(user_id, wallet_id, wallet_number, email, JWT_PERMISSIONS)
+    if wallet_id:
+        user_principal_cache.set(user_id, principal)
+    return principal
+
+
+async def get_api_key_user(x_api_key: Optional[str] = Header(None), db: AsyncSession = Depends(get_db)) -> tuple[str, list]:
+    """Extract and verify API key"""
+    if not x_api_key:
+        raise HTTPException(status_code=401, detail="Missing API key")
+
+    principal = await get_api_key_principal(x_api_key, db)
+    return principal.user_id, principal.permissions
+
+
+async def get_current_user(
     authorization: Optional[str] = Header(None),
     x_api_key: Optional[str] = Header(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> tuple[str, List[str]]:
     """Get current user from JWT or API key"""
     if authorization:
         user_id = get_user_from_token(authorization)
-        return user_id, [PermissionEnum.DEPOSIT, PermissionEnum.TRANSFER, PermissionEnum.READ]
+        return user_id, JWT_PERMISSIONS
 
     if x_api_key:
-        return get_api_key_user(x_api_key, db)
+        return await get_api_key_user(x_api_key, db)
 
     raise HTTPException(status_code=401, detail="Missing authentication")
 
 
+async def get_principal(
+    authorization: Optional[str] = Header(None),
+    x_api_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db)
+) -> Principal:
+    """Get the caller's principal from JWT or API key; 404 if they have no wallet"""
+    if authorization:
+        principal = await get_token_principal(authorization, db)
+    elif x_api_key:
+        principal = await get_api_key_principal(x_api_key, db)
+    else:
+        raise HTTPException(status_code=401, detail="Missing authentication")
+
+    if not principal.wallet_id:
+        raise HTTPException(status_code=404, detail="Wallet not found")
+    return principal
+
+
 def check_permission(permissions: List[str], required: str):
     """Check if user has required permission"""
     if required not in permissions:
         raise HTTPException(
             status_code=403, detail=f"Missing permission: {required}")
+
+
+def encode_cursor(created_at: datetime, row_id: str) -> str:
+    """Encode a (created_at, id) keyset position as an opaque cursor"""
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), row_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
@@ -0,0 +1,17 @@
+from app.db.connectDB import AsyncSessionLocal
+from app.utils.api_keys import sweep, API_KEY_SWEEP_BATCH_SIZE
+from app.workers.periodic import run_periodically
+from app.config import settings
+
+API_KEY_SWEEP_INTERVAL = settings.api_key_sweep_interval
+
+
+async def sweep_once() -> int:
+    async with AsyncSessionLocal() as db:
+        return await sweep(db)
+
+
+async def run():
+    """Periodically release expired API keys and archive old ones until cancelled"""
+    await run_periodically(
+        sweep_once, API_KEY_SWEEP_INTERVAL, API_KEY_SWEEP_BATCH_SIZE, "API key sweep")
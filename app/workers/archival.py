@@ -0,0 +1,16 @@
+from app.db.connectDB import AsyncSessionLocal
+from app.utils.partitions import archive_once, ARCHIVE_BATCH_SIZE
+from app.workers.periodic import run_periodically
+from app.config import settings
+
+ARCHIVE_INTERVAL = settings.archive_interval
+
+
+async def archive_batch() -> int:
+    async with AsyncSessionLocal() as db:
+        return await archive_once(db)
+
+
+async def run():
+    """Periodically move transactions older than the hot window to the archive until cancelled"""
+    await run_periodically(archive_batch, ARCHIVE_INTERVAL, ARCHIVE_BATCH_SIZE, "Transaction archival")
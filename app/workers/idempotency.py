@@ -0,0 +1,17 @@
+from app.db.connectDB import AsyncSessionLocal
+from app.utils.idempotency import sweep_expired, IDEMPOTENCY_SWEEP_BATCH_SIZE
+from app.workers.periodic import run_periodically
+from app.config import settings
+
+IDEMPOTENCY_SWEEP_INTERVAL = settings.idempotency_sweep_interval
+
+
+async def sweep_once() -> int:
+    async with AsyncSessionLocal() as db:
+        return await sweep_expired(db)
+
+
+async def run():
+    """Periodically delete expired idempotency records until cancelled"""
+    await run_periodically(
+        sweep_once, IDEMPOTENCY_SWEEP_INTERVAL, IDEMPOTENCY_SWEEP_BATCH_SIZE, "Idempotency sweep")
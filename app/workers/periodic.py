@@ -0,0 +1,24 @@
+from typing import Awaitable, Callable
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+async def run_periodically(job: Callable[[], Awaitable[int]], interval: float, batch_size: int, name: str):
+    """Run a batched job every interval seconds until cancelled
+
+    The job returns how many items it handled; while it keeps filling
+    whole batches it is re-run immediately to work through the backlog.
+    """
+    while True:
+        try:
+            handled = await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("%s run failed", name)
+            handled = 0
+
+        if handled < batch_size:
+            await asyncio.sleep(interval)
@@ -0,0 +1,167 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select, func, tuple_
+from app.db.connectDB import AsyncSessionLocal
+from app.schemas.schemas import Transaction
+from app.utils import paystack
+from app.utils.circuit_breaker import CircuitOpenError
+from app.utils.deposits import apply_deposit_outcomes, publish_deposit_outcomes
+from app.utils.metrics import RECONCILE_BACKLOG, RECONCILE_CHECKED, RECONCILE_PASS_DURATION
+from app.config import settings
+from typing import Optional
+import asyncio
+import logging
+import time
+
+RECONCILE_INTERVAL = settings.reconcile_interval
+# Deposits younger than this are left for their webhook
+RECONCILE_MIN_AGE = settings.reconcile_min_age
+RECONCILE_BATCH_SIZE = settings.reconcile_batch_size
+# At most this many verify calls in flight, and at most RECONCILE_RATE per second
+RECONCILE_CONCURRENCY = settings.reconcile_concurrency
+RECONCILE_RATE = settings.reconcile_rate
+
+# Paystack's final statuses; anything else (ongoing, queued, ...) stays pending
+PAYSTACK_OUTCOMES = {
+    "success": "success",
+    "failed": "failed",
+    "abandoned": "failed",
+    "reversed": "failed",
+}
+
+logger = logging.getLogger(__name__)
+
+stats = {
+    "backlog": 0,
+    "checked_total": 0,
+    "resolved_total": 0,
+    "errors_total": 0,
+    "last_pass_started_at": None,
+    "last_pass_seconds": None,
+}
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` acquisitions per second, bursting up to `rate`"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def pending_deposits(cutoff: datetime):
+    return (
+        Transaction.status == "pending",
+        Transaction.type == "deposit",
+        Transaction.created_at < cutoff,
+    )
+
+
+async def verify(reference: str, limiter: RateLimiter, semaphore: asyncio.Semaphore) -> Optional[str]:
+    """Final outcome of one deposit according to Paystack, or None if undecided"""
+    async with semaphore:
+        await limiter.acquire()
+        try:
+            data = await paystack.verify_transaction(reference)
+        except CircuitOpenError:
+            RECONCILE_CHECKED.labels("circuit_open").inc()
+            return None
+        except Exception:
+            logger.warning("Verifying deposit %s failed", reference, exc_info=True)
+            stats["errors_total"] += 1
+            RECONCILE_CHECKED.labels("error").inc()
+            return None
+
+    stats["checked_total"] += 1
+    if not data.get("status"):
+        # Never reached Paystack (e.g. the process died before initializing it)
+        outcome = "failed"
+    else:
+        outcome = PAYSTACK_OUTCOMES.get((data.get("data") or {}).get("status"))
+    RECONCILE_CHECKED.labels(outcome or "pending").inc()
+    return outcome
+
+
+async def reconcile_pass(limiter: RateLimiter, semaphore: asyncio.Semaphore) -> int:
+    """Verify every old pending deposit once, crediting results a page at a time
+
+    Pages by (created_at, id) over ix_transactions_status_type_created_id
+    and holds no DB connection while Paystack calls are in flight.
+    """
+    started = time.perf_counter()
+    stats["last_pass_started_at"] = datetime.utcnow()
+    cutoff = datetime.utcnow() - timedelta(seconds=RECONCILE_MIN_AGE)
+
+    async with AsyncSessionLocal() as db:
+        backlog = await db.scalar(
+            select(func.count()).select_from(Transaction).filter(*pending_deposits(cutoff)))
+    stats["backlog"] = backlog
+    RECONCILE_BACKLOG.set(backlog)
+
+    resolved = 0
+    cursor = None
+    while True:
+        query = (
+            select(Transaction.reference, Transaction.created_at, Transaction.id)
+            .filter(*pending_deposits(cutoff), Transaction.reference.isnot(None))
+            .order_by(Transaction.created_at, Transaction.id)
+            .limit(RECONCILE_BATCH_SIZE)
+        )
+        if cursor:
+            query = query.filter(tuple_(Transaction.created_at, Transaction.id) > cursor)
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(query)).all()
+        if not rows:
+            break
+        cursor = (rows[-1].created_at, rows[-1].id)
+
+        results = await asyncio.gather(
+            *(verify(row.reference, limiter, semaphore) for row in rows))
+        outcomes = {
+            row.reference: outcome for row, outcome in zip(rows, results) if outcome}
+
+        if outcomes:
+            # Same path as the webhook worker: success rows are skipped, so
+            # a deposit credited by a late webhook is never credited twice
+            async with AsyncSessionLocal() as db:
+                transactions = await apply_deposit_outcomes(db, outcomes)
+                await db.commit()
+            await publish_deposit_outcomes(transactions)
+        resolved += len(outcomes)
+        stats["resolved_total"] += len(outcomes)
+        stats["backlog"] = max(0, stats["backlog"] - len(outcomes))
+        RECONCILE_BACKLOG.set(stats["backlog"])
+
+    elapsed = time.perf_counter() - started
+    stats["last_pass_seconds"] = elapsed
+    RECONCILE_PASS_DURATION.set(elapsed)
+    return resolved
+
+
+async def run():
+    """Reconcile old pending deposits every RECONCILE_INTERVAL seconds until cancelled"""
+    limiter = RateLimiter(RECONCILE_RATE)
+    semaphore = asyncio.Semaphore(RECONCILE_CONCURRENCY)
+    while True:
+        try:
+            resolved = await reconcile_pass(limiter, semaphore)
+            if resolved:
+                logger.info("Reconciled %d pending deposits", resolved)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            stats["errors_total"] += 1
+            logger.exception("Deposit reconciliation pass failed")
+        await asyncio.sleep(RECONCILE_INTERVAL)
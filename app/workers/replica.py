@@ -0,0 +1,20 @@
+from app.utils.replicas import check_replica
+from app.config import settings
+import asyncio
+import logging
+
+REPLICA_CHECK_INTERVAL = settings.replica_check_interval
+
+logger = logging.getLogger(__name__)
+
+
+async def run():
+    """Probe the read replica's health and lag until cancelled"""
+    while True:
+        try:
+            await check_replica()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Replica health check failed")
+        await asyncio.sleep(REPLICA_CHECK_INTERVAL)
@@ -0,0 +1,17 @@
+from app.db.connectDB import AsyncSessionLocal
+from app.utils.ledger import take_snapshots, SNAPSHOT_BATCH_SIZE
+from app.workers.periodic import run_periodically
+from app.config import settings
+
+SNAPSHOT_INTERVAL = settings.snapshot_interval
+
+
+async def snapshot_once() -> int:
+    async with AsyncSessionLocal() as db:
+        return await take_snapshots(db)
+
+
+async def run():
+    """Periodically snapshot wallet balances until cancelled"""
+    await run_periodically(
+        snapshot_once, SNAPSHOT_INTERVAL, SNAPSHOT_BATCH_SIZE, "Balance snapshot")
@@ -0,0 +1,107 @@
+from datetime import datetime
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.connectDB import AsyncSessionLocal
+from app.schemas.schemas import WebhookEvent
+from app.utils.deposits import apply_deposit_outcomes, publish_deposit_outcomes
+from app.utils.metrics import WEBHOOK_QUEUE_DEPTH, WEBHOOK_QUEUE_LAG, WEBHOOK_PROCESSING_LAG
+from app.config import settings
+import asyncio
+import logging
+
+WEBHOOK_BATCH_SIZE = settings.webhook_batch_size
+WEBHOOK_POLL_INTERVAL = settings.webhook_poll_interval
+
+logger = logging.getLogger(__name__)
+
+_wakeup = asyncio.Event()
+
+stats = {
+    "processed_total": 0,
+    "credited_total": 0,
+    "last_batch_size": 0,
+    "last_batch_at": None,
+    "errors_total": 0,
+}
+
+
+def notify():
+    """Wake the worker after a new event has been stored"""
+    _wakeup.set()
+
+
+async def process_batch() -> int:
+    """Drain one batch of stored webhook events; returns the number of events handled"""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(WebhookEvent)
+            .filter(WebhookEvent.processed_at.is_(None))
+            .order_by(WebhookEvent.id)
+            .limit(WEBHOOK_BATCH_SIZE)
+            .with_for_update(skip_locked=True)
+        )
+        events = result.scalars().all()
+        if not events:
+            return 0
+
+        # Dedupe by reference: a success outcome wins, otherwise the latest event
+        outcomes = {}
+        for event in events:
+            if not event.reference or not event.status:
+                continue
+            if outcomes.get(event.reference) == "success":
+                continue
+            outcomes[event.reference] = event.status
+
+        transactions = await apply_deposit_outcomes(db, outcomes)
+
+        now = datetime.utcnow()
+        for event in events:
+            event.processed_at = now
+        await db.commit()
+    await publish_deposit_outcomes(transactions)
+
+    for event in events:
+        WEBHOOK_PROCESSING_LAG.observe((now - event.received_at).total_seconds())
+
+    stats["processed_total"] += len(events)
+    stats["credited_total"] += sum(
+        1 for t in transactions if t.status == "success")
+    stats["last_batch_size"] = len(events)
+    stats["last_batch_at"] = now
+    return len(events)
+
+
+async def queue_stats(db: AsyncSession) -> dict:
+    """Queue depth and lag (age of the oldest unprocessed event)"""
+    result = await db.execute(
+        select(func.count(), func.min(WebhookEvent.received_at))
+        .filter(WebhookEvent.processed_at.is_(None))
+    )
+    depth, oldest = result.one()
+    lag = (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0
+    WEBHOOK_QUEUE_DEPTH.set(depth)
+    WEBHOOK_QUEUE_LAG.set(lag)
+    return {"depth": depth, "lag_seconds": lag, **stats}
+
+
+async def run():
+    """Process stored webhook events until cancelled"""
+    while True:
+        try:
+            processed = await process_batch()
+            async with AsyncSessionLocal() as db:
+                await queue_stats(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            stats["errors_total"] += 1
+            logger.exception("Webhook batch failed")
+            processed = 0
+
+        if processed < WEBHOOK_BATCH_SIZE:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), WEBHOOK_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            _wakeup.clear()
@@ -0,0 +1,41 @@
+"""Compare two benchmark result files written by benchmarks.run
+
+    python -m benchmarks.compare baseline.json candidate.json
+"""
+import json
+import sys
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        results = json.load(f)
+    return {
+        (run["database_url"], level["concurrency"]): level
+        for run in results["runs"]
+        for level in run["levels"]
+    }
+
+
+def change(before: float, after: float) -> str:
+    if not before:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def main(baseline_path: str, candidate_path: str):
+    baseline, candidate = load(baseline_path), load(candidate_path)
+    print(f"{'database':<40} {'conc':>4} {'rps':>18} {'p95 ms':>18} {'p99 ms':>18} {'q/req':>12}")
+    for key in sorted(baseline.keys() & candidate.keys()):
+        b, c = baseline[key], candidate[key]
+        bo, co = b["overall"], c["overall"]
+        print(f"{key[0]:<40} {key[1]:>4} "
+              f"{co['throughput_rps']:>9} {change(bo['throughput_rps'], co['throughput_rps']):>8} "
+              f"{co['p95_ms']:>9} {change(bo['p95_ms'], co['p95_ms']):>8} "
+              f"{co['p99_ms']:>9} {change(bo['p99_ms'], co['p99_ms']):>8} "
+              f"{c['queries_per_request']:>5} {change(b['queries_per_request'], c['queries_per_request']):>6}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit(__doc__)
+    main(sys.argv[1], sys.argv[2])
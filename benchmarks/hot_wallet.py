@@ -0,0 +1,78 @@
+"""Transfer throughput into one hot wallet at increasing shard counts
+
+    DATABASE_URL=postgresql://... python -m benchmarks.hot_wallet --shards 0 1 2 4 8
+
+Each run funds a fresh merchant wallet and `--senders` sender wallets, then
+has every sender pay the merchant in a tight loop for `--duration` seconds.
+Contention on the merchant's row only shows up on a real Postgres server;
+SQLite serializes all writers and will not scale with shards.
+"""
+from sqlalchemy import insert
+from app.db.connectDB import AsyncSessionLocal, async_engine
+from app.manage import migrate
+from app.schemas.schemas import Wallet
+from app.utils.shards import set_shard_count
+from app.utils import transfers
+import argparse
+import asyncio
+import json
+import secrets
+import time
+
+
+async def create_wallets(count: int, balance: int) -> list[str]:
+    ids = [secrets.token_hex(8) for _ in range(count)]
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(Wallet), [
+            {"id": wallet_id, "user_id": f"bench_{wallet_id}",
+             "wallet_number": secrets.token_hex(6), "balance": balance}
+            for wallet_id in ids
+        ])
+        await db.commit()
+    return ids
+
+
+async def run_once(shard_count: int, senders: int, duration: float) -> dict:
+    merchant_id, = await create_wallets(1, 0)
+    sender_ids = await create_wallets(senders, 10 ** 12)
+    if shard_count:
+        async with AsyncSessionLocal() as db:
+            await set_shard_count(db, merchant_id, shard_count)
+    shard_counts = {merchant_id: shard_count} if shard_count else {}
+
+    completed = 0
+    deadline = time.perf_counter() + duration
+
+    async def pay(sender_id: str):
+        nonlocal completed
+        async with AsyncSessionLocal() as db:
+            while time.perf_counter() < deadline:
+                await transfers.transfer(db, sender_id, merchant_id, 1.0, shard_counts)
+                completed += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(pay(sender_id) for sender_id in sender_ids))
+    elapsed = time.perf_counter() - started
+    return {
+        "shards": shard_count,
+        "senders": senders,
+        "transfers": completed,
+        "transfers_per_second": round(completed / elapsed, 1),
+    }
+
+
+async def main(args):
+    try:
+        await migrate()
+        for shard_count in args.shards:
+            print(json.dumps(await run_once(shard_count, args.senders, args.duration)))
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shards", type=int, nargs="+", default=[0, 1, 2, 4, 8])
+    parser.add_argument("--senders", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,112 @@
+"""Login spike against local stand-ins for Google's token and certificate endpoints
+
+    python -m benchmarks.login --logins 2000 --concurrency 64 --max-age 5
+
+Signs ID tokens with a throwaway RSA key, serves its JWKS with
+Cache-Control max-age=--max-age, and drives concurrent /auth/google/callback
+requests through the app in-process. Reports login latency and how many
+times the certificate endpoint was hit: with a warm cache that should be
+about one fetch per max-age window, never one per login.
+"""
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import time
+from urllib.parse import parse_qs
+
+from benchmarks.run import configure_env, summarize
+
+CLIENT_ID = "bench-client.apps.googleusercontent.com"
+
+
+def google_stub(max_age: int, latency: float, counters: dict):
+    import httpx
+    import jwt
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+    jwk.update({"kid": "bench-key", "alg": "RS256", "use": "sig"})
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        if request.url.path.endswith("/certs"):
+            counters["certs"] += 1
+            return httpx.Response(200, json={"keys": [jwk]},
+                                  headers={"Cache-Control": f"public, max-age={max_age}"})
+        if request.url.path.endswith("/token"):
+            counters["token"] += 1
+            code = parse_qs(request.content.decode())["code"][0]
+            now = int(time.time())
+            id_token = jwt.encode({
+                "iss": "https://accounts.google.com", "aud": CLIENT_ID,
+                "sub": f"google_{code}", "email": f"{code}@bench.test", "name": code,
+                "iat": now, "exp": now + 3600,
+            }, private_key, algorithm="RS256", headers={"kid": "bench-key"})
+            return httpx.Response(200, json={"id_token": id_token})
+        return httpx.Response(404)
+
+    return httpx.MockTransport(handler)
+
+
+async def bench(args) -> dict:
+    import httpx
+    from app.main import app
+    from app.manage import migrate
+    from app.utils import google
+
+    counters = {"certs": 0, "token": 0}
+    await migrate()
+    await google.open_client(transport=google_stub(args.max_age, args.google_latency, counters))
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            latencies, errors = [], 0
+            remaining = iter(range(args.logins))
+
+            async def worker():
+                nonlocal errors
+                for _ in remaining:
+                    started = time.perf_counter()
+                    response = await client.get(
+                        "/auth/google/callback", params={"code": secrets.token_hex(6)})
+                    if response.status_code == 200:
+                        latencies.append(time.perf_counter() - started)
+                    else:
+                        errors += 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+
+    return {
+        "logins": args.logins,
+        "concurrency": args.concurrency,
+        "max_age_s": args.max_age,
+        "certificate_fetches": counters["certs"],
+        "token_exchanges": counters["token"],
+        **summarize(latencies, errors, elapsed),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default="sqlite:///./bench.db")
+    parser.add_argument("--logins", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--max-age", type=int, default=3600)
+    parser.add_argument("--google-latency", type=float, default=0.05)
+    args = parser.parse_args(argv)
+
+    configure_env(args.database_url)
+    os.environ["GOOGLE_CLIENT_ID"] = CLIENT_ID
+    os.environ.setdefault("GOOGLE_CLIENT_SECRET", "bench-secret")
+    os.environ.setdefault("BACKGROUND_WORKERS", "false")
+    result = asyncio.run(bench(args))
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""Load benchmark for the wallet API with a local Paystack stub
+
+    python -m benchmarks.run --database-url sqlite:///./bench.db \\
+        --database-url postgresql://postgres@localhost/wallet_bench \\
+        --concurrency 1 8 32 --duration 15 --output bench-results.json
+
+Boots the FastAPI app in-process (lifespan and background workers included)
+for each database URL, replaces Paystack with a stub that sleeps
+--paystack-latency seconds, and drives a weighted mix of balance, transfer,
+deposit, transaction-history and signed-webhook calls at each concurrency
+level. Reports p50/p95/p99 latency, throughput and DB queries per request,
+and writes everything as JSON so runs can be diffed.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import secrets
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+MIX = {
+    "balance": 40,
+    "transactions": 20,
+    "transfer": 20,
+    "deposit": 10,
+    "webhook": 10,
+}
+
+
+def configure_env(database_url: str):
+    """Settings the app reads at import time; must run before importing app"""
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("JWT_SECRET", "bench-secret")
+    os.environ.setdefault("JWT_ALGORITHM", "HS256")
+    os.environ.setdefault("JWT_EXPIRY_HOURS", "1")
+    os.environ.setdefault("PAYSTACK_SECRET", "sk_bench")
+    # The benchmark measures the service, not the rate limiter
+    os.environ.setdefault("USER_RATE_LIMIT", str(10 ** 9))
+    os.environ.setdefault("API_KEY_RATE_LIMIT", str(10 ** 9))
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+    }
+
+
+def paystack_stub(latency: float):
+    import httpx
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        if request.url.path.endswith("/transaction/initialize"):
+            body = json.loads(request.content)
+            return httpx.Response(200, json={
+                "status": True,
+                "data": {
+                    "authorization_url": f"https://checkout.paystack.test/{body['reference']}",
+                    "reference": body["reference"],
+                }
+            })
+        if "/transaction/verify/" in request.url.path:
+            return httpx.Response(200, json={
+                "status": True, "data": {"status": "success"}})
+        return httpx.Response(404, json={"status": False})
+
+    return httpx.MockTransport(handler)
+
+
+async def seed(users: int) -> list[dict]:
+    """Create funded users and wallets and mint a JWT for each"""
+    from sqlalchemy import insert
+    from app.db.connectDB import AsyncSessionLocal
+    from app.schemas.schemas import User, Wallet
+    from app.utils.utils import JWT_SECRET, JWT_ALGORITHM
+    import jwt
+
+    accounts = []
+    for _ in range(users):
+        user_id = f"bench_{secrets.token_hex(6)}"
+        accounts.append({
+            "user_id": user_id,
+            "wallet_id": secrets.token_hex(8),
+            "wallet_number": secrets.token_hex(6),
+            "token": jwt.encode(
+                {"sub": user_id, "exp": datetime.utcnow() + timedelta(hours=1)},
+                JWT_SECRET, algorithm=JWT_ALGORITHM),
+        })
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(User), [
+            {"id": a["user_id"], "email": f"{a['user_id']}@bench.test", "name": a["user_id"]}
+            for a in accounts
+        ])
+        await db.execute(insert(Wallet), [
+            {"id": a["wallet_id"], "user_id": a["user_id"],
+             "wallet_number": a["wallet_number"], "balance": 10 ** 12}
+            for a in accounts
+        ])
+        await db.commit()
+    return accounts
+
+
+def query_count() -> float:
+    from prometheus_client import REGISTRY
+    return REGISTRY.get_sample_value("db_query_duration_seconds_count") or 0.0
+
+
+async def run_level(client, accounts: list[dict], concurrency: int, duration: float) -> dict:
+    from app.utils.paystack import PAYSTACK_SECRET
+    import hashlib
+    import hmac
+
+    operations = list(MIX)
+    weights = [MIX[op] for op in operations]
+    latencies = {op: [] for op in operations}
+    errors = {op: 0 for op in operations}
+    references = []
+
+    async def call(op: str, account: dict):
+        headers = {"Authorization": f"Bearer {account['token']}"}
+        if op == "balance":
+            return await client.get("/wallet/balance", headers=headers)
+        if op == "transactions":
+            return await client.get("/wallet/transactions?limit=50", headers=headers)
+        if op == "transfer":
+            recipient = random.choice(accounts)
+            while recipient is account and len(accounts) > 1:
+                recipient = random.choice(accounts)
+            return await client.post("/wallet/transfer", headers=headers, json={
+                "wallet_number": recipient["wallet_number"], "amount": 1.0})
+        if op == "deposit":
+            response = await client.post("/wallet/deposit", headers=headers, json={"amount": 50.0})
+            if response.status_code == 200:
+                references.append(response.json()["reference"])
+            return response
+        reference = references.pop() if references else f"txn_{secrets.token_hex(8)}"
+        body = json.dumps({"event": "charge.success",
+                           "data": {"reference": reference, "status": "success"}}).encode()
+        signature = hmac.new(PAYSTACK_SECRET.encode(), body, hashlib.sha512).hexdigest()
+        return await client.post("/wallet/paystack/webhook", content=body, headers={
+            "x-paystack-signature": signature, "content-type": "application/json"})
+
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            op = random.choices(operations, weights)[0]
+            started = time.perf_counter()
+            try:
+                response = await call(op, random.choice(accounts))
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            if ok:
+                latencies[op].append(time.perf_counter() - started)
+            else:
+                errors[op] += 1
+
+    queries_before = query_count()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    queries = query_count() - queries_before
+
+    everything = [l for samples in latencies.values() for l in samples]
+    total_requests = len(everything) + sum(errors.values())
+    return {
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 2),
+        "overall": summarize(everything, sum(errors.values()), elapsed),
+        "queries_per_request": round(queries / total_requests, 2) if total_requests else 0.0,
+        "operations": {
+            op: summarize(latencies[op], errors[op], elapsed) for op in operations
+        },
+    }
+
+
+async def bench_database(args) -> dict:
+    import httpx
+    from app.main import app
+    from app.manage import migrate
+    from app.utils import paystack
+
+    await migrate()
+
+    await paystack.open_client(transport=paystack_stub(args.paystack_latency))
+    async with app.router.lifespan_context(app):
+        accounts = await seed(args.users)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            levels = []
+            for concurrency in args.concurrency:
+                levels.append(await run_level(client, accounts, concurrency, args.duration))
+                print(json.dumps({"database": args.database_url.split(":")[0], **levels[-1]["overall"],
+                                  "concurrency": concurrency}), file=sys.stderr)
+    return {"database_url": args.database_url.split("@")[-1], "levels": levels}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", action="append", dest="database_urls",
+                        help="repeat to benchmark several databases (default: local SQLite)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per level")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--paystack-latency", type=float, default=0.15)
+    parser.add_argument("--output", default="bench-results.json")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    database_urls = args.database_urls or ["sqlite:///./bench.db"]
+
+    if args.single:
+        # Child process: DATABASE_URL is read at import time, so one URL per process
+        args.database_url = database_urls[0]
+        configure_env(args.database_url)
+        print(json.dumps(asyncio.run(bench_database(args))))
+        return
+
+    runs = []
+    for database_url in database_urls:
+        command = [sys.executable, "-m", "benchmarks.run", "--single",
+                   "--database-url", database_url,
+                   "--concurrency", *map(str, args.concurrency),
+                   "--duration", str(args.duration),
+                   "--users", str(args.users),
+                   "--paystack-latency", str(args.paystack_latency)]
+        output = subprocess.check_output(command, text=True)
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    results = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "mix": MIX,
+        "paystack_latency_s": args.paystack_latency,
+        "runs": runs,
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
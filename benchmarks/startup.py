@@ -0,0 +1,70 @@
+"""Cold-start time of the wallet API
+
+    python -m benchmarks.startup --runs 20 --output startup-results.json
+
+Imports app.main in --runs fresh interpreters and reports how long the import
+took, plus whether it opened any database connection. It should not: schema
+creation lives in `python -m app.manage migrate`.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+from benchmarks.run import git_revision, percentile
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+from app.db.connectDB import async_engine
+pool = async_engine.sync_engine.pool
+print(json.dumps({
+    "import_s": elapsed,
+    "db_connections": pool.checkedin() + pool.checkedout() if hasattr(pool, "checkedin") else 0,
+    "modules": len(sys.modules),
+}))
+"""
+
+
+def probe(env: dict) -> dict:
+    output = subprocess.check_output([sys.executable, "-c", PROBE],
+                                     env=env, text=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--database-url", default="sqlite:///./bench.db")
+    parser.add_argument("--output", default="startup-results.json")
+    args = parser.parse_args(argv)
+
+    env = {**os.environ, "DATABASE_URL": args.database_url}
+    probe(env)  # warm the bytecode cache so every timed run is equally cold
+    samples = [probe(env) for _ in range(args.runs)]
+    timings = [s["import_s"] for s in samples]
+
+    results = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "runs": args.runs,
+        "import_p50_ms": round(percentile(timings, 50) * 1000, 1),
+        "import_p95_ms": round(percentile(timings, 95) * 1000, 1),
+        "import_mean_ms": round(statistics.fmean(timings) * 1000, 1),
+        "db_connections_at_import": max(s["db_connections"] for s in samples),
+        "modules_loaded": samples[-1]["modules"],
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
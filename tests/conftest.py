@@ -0,0 +1,26 @@
+import os
+import tempfile
+
+# Settings are read once at import time, so configure them before any app import
+_db_dir = tempfile.mkdtemp(prefix="wallet-tests-")
+# TEST_DATABASE_URL runs the suite against Postgres; every test drops all tables
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL") or f"sqlite:///{_db_dir}/test.db"
+os.environ["BACKGROUND_WORKERS"] = "false"
+os.environ.setdefault("JWT_SECRET", "test-secret")
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
+os.environ.setdefault("JWT_EXPIRY_HOURS", "1")
+os.environ.setdefault("PAYSTACK_SECRET", "sk_test")
+os.environ.setdefault("GOOGLE_CLIENT_ID", "test-client")
+os.environ.setdefault("GOOGLE_CLIENT_SECRET", "test-secret")
+os.environ.setdefault("REDIRECT_URL", "http://testserver/auth/google/callback")
+
+
+import pytest
+
+from tests.helpers import reset_database, run
+
+
+@pytest.fixture
+def database():
+    """An empty, migrated database"""
+    run(reset_database())
@@ -0,0 +1,41 @@
+import secrets
+
+from app.db.connectDB import AsyncSessionLocal, Base, async_engine, replica_engine
+from app.manage import migrate
+from app.schemas.schemas import User, Wallet, LedgerEntry
+from app.utils import paystack, google
+import asyncio
+
+
+def run(coro):
+    """Run coro on a fresh event loop, then drop pooled connections bound to it"""
+    async def wrapper():
+        try:
+            return await coro
+        finally:
+            await paystack.close_client()
+            await google.close_client()
+            await async_engine.dispose()
+            if replica_engine is not None:
+                await replica_engine.dispose()
+    return asyncio.run(wrapper())
+
+
+async def reset_database():
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await migrate()
+
+
+async def create_wallet(balance: int = 0) -> Wallet:
+    """A user and wallet holding balance minor units, backed by an opening ledger entry"""
+    async with AsyncSessionLocal() as db:
+        user = User(id=secrets.token_hex(8), email=f"{secrets.token_hex(4)}@test", name="Test")
+        wallet = Wallet(
+            id=secrets.token_hex(8), user_id=user.id,
+            wallet_number=str(secrets.randbelow(10 ** 12)).zfill(13), balance=balance)
+        db.add_all([user, wallet])
+        if balance:
+            db.add(LedgerEntry(wallet_id=wallet.id, transaction_id=None, amount=balance))
+        await db.commit()
+        return wallet
@@ -0,0 +1,55 @@
+import asyncio
+import json
+
+
+class StubServer:
+    """Minimal keep-alive HTTP/1.1 server that counts the connections it accepts
+
+    handler(method, path, body) returns (status, payload, headers).
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.connections = 0
+        self.requests = 0
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    async def __aenter__(self):
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        return self
+
+    async def __aexit__(self, *exc):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _serve(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    return
+                method, path, _ = request_line.decode().split(" ", 2)
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b""):
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                self.requests += 1
+                status, payload, extra = await self.handler(method, path, body)
+                data = json.dumps(payload).encode()
+                head = [f"HTTP/1.1 {status} OK", "Content-Type: application/json",
+                        f"Content-Length: {len(data)}"]
+                head += [f"{name}: {value}" for name, value in extra.items()]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + data)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
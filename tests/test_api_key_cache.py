@@ -0,0 +1,59 @@
+import asyncio
+
+from app.utils import pubsub, utils
+from app.utils.utils import Principal
+
+
+class RecordingBackend:
+    """Stands in for a shared transport; only records what this worker publishes"""
+
+    def __init__(self):
+        self.published = []
+
+    async def start(self, deliver):
+        pass
+
+    async def publish(self, channel, message):
+        self.published.append((channel, message))
+
+    async def stop(self):
+        pass
+
+
+def cached_principal(key_hash):
+    principal = Principal("user", "wallet", "123", "a@test", ["read"])
+    utils.api_key_cache.set(key_hash, principal)
+    return principal
+
+
+def test_revocation_is_published_to_other_workers(monkeypatch):
+    backend = RecordingBackend()
+    monkeypatch.setattr(pubsub, "backend", backend)
+    cached_principal("revoked-hash")
+
+    asyncio.run(utils.invalidate_api_key("revoked-hash"))
+
+    assert utils.api_key_cache.get("revoked-hash") is None
+    assert backend.published == [(utils.API_KEY_INVALIDATION_CHANNEL, "revoked-hash")]
+
+
+def test_invalidation_from_another_worker_clears_the_cache():
+    cached_principal("remote-hash")
+    cached_principal("other-hash")
+
+    pubsub.deliver(utils.API_KEY_INVALIDATION_CHANNEL, "remote-hash")
+
+    assert utils.api_key_cache.get("remote-hash") is None
+    assert utils.api_key_cache.get("other-hash") is not None
+
+
+def test_missed_invalidation_is_bounded_by_cache_ttl(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("app.utils.cache.time.monotonic", lambda: clock[0])
+    # A key valid for a year is still cached for no longer than the TTL
+    utils.api_key_cache.set("long-lived", "principal", 365 * 86400)
+
+    clock[0] += utils.API_KEY_CACHE_TTL - 1
+    assert utils.api_key_cache.get("long-lived") == "principal"
+    clock[0] += 2
+    assert utils.api_key_cache.get("long-lived") is None
@@ -0,0 +1,65 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+import jwt
+from sqlalchemy import select
+
+from app.db.connectDB import AsyncSessionLocal
+from app.main import app
+from app.schemas.schemas import ApiKey, User
+from app.utils import api_keys
+from app.utils.utils import JWT_ALGORITHM, JWT_SECRET
+from tests.helpers import run, create_wallet
+
+
+async def expired_counted_key(user_id: str) -> ApiKey:
+    async with AsyncSessionLocal() as db:
+        key = ApiKey(
+            id="expired", user_id=user_id, key_hash="expired-hash", name="old",
+            permissions="read", expires_at=datetime.utcnow() - timedelta(minutes=1), counted=True)
+        db.add(key)
+        user = await db.get(User, user_id)
+        user.active_api_keys = 1
+        await db.commit()
+        return key
+
+
+async def active_api_keys(user_id: str) -> int:
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(select(User.active_api_keys).filter(User.id == user_id))
+
+
+def test_revoke_after_sweep_releases_the_key_once(database):
+    async def scenario():
+        wallet = await create_wallet()
+        await expired_counted_key(wallet.user_id)
+        async with AsyncSessionLocal() as db:
+            # Loaded while still counted, then the sweeper releases it
+            stale = await db.get(ApiKey, "expired")
+            async with AsyncSessionLocal() as sweeper:
+                await api_keys.sweep(sweeper)
+            first = await api_keys.revoke_key(db, stale.id)
+            second = await api_keys.revoke_key(db, stale.id)
+            await db.commit()
+        return first, second, await active_api_keys(wallet.user_id)
+
+    assert run(scenario()) == (True, False, 0)
+
+
+def test_concurrent_rollovers_mint_one_replacement(database):
+    async def scenario():
+        wallet = await create_wallet()
+        await expired_counted_key(wallet.user_id)
+        token = jwt.encode({"sub": wallet.user_id}, JWT_SECRET, algorithm=JWT_ALGORITHM)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            responses = await asyncio.gather(*(
+                client.post("/keys/rollover", json={"expired_key_id": "expired", "expiry": "1D"},
+                            headers={"authorization": f"Bearer {token}"})
+                for _ in range(2)))
+        async with AsyncSessionLocal() as db:
+            keys = (await db.scalars(select(ApiKey.id).filter(ApiKey.user_id == wallet.user_id))).all()
+        return sorted(r.status_code for r in responses), len(keys), await active_api_keys(wallet.user_id)
+
+    assert run(scenario()) == ([200, 400], 2, 1)
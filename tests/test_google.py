@@ -0,0 +1,91 @@
+from urllib.parse import parse_qs
+import asyncio
+import json
+import time
+
+import httpx
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from app.main import app
+from app.utils import google
+from tests.helpers import run
+
+
+class RotatingGoogle:
+    """Token and certificate endpoints whose signing key can be rotated"""
+
+    def __init__(self):
+        self.certs_fetches = 0
+        self.rotate()
+
+    def rotate(self):
+        self.kid = f"key-{self.certs_fetches}-{time.monotonic_ns()}"
+        self.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    def sign(self, claims: dict, kid: str) -> str:
+        return jwt.encode(claims, self.private_key, algorithm="RS256", headers={"kid": kid})
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/certs"):
+            self.certs_fetches += 1
+            jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(self.private_key.public_key()))
+            jwk.update({"kid": self.kid, "alg": "RS256", "use": "sig"})
+            # Google serves its keys for hours; a rotation must not wait that long
+            return httpx.Response(200, json={"keys": [jwk]},
+                                  headers={"Cache-Control": "public, max-age=3600"})
+        code = parse_qs(request.content.decode())["code"][0]
+        now = int(time.time())
+        kid = "bogus-key" if code == "bogus" else self.kid
+        return httpx.Response(200, json={"id_token": self.sign({
+            "iss": "https://accounts.google.com", "aud": google.GOOGLE_CLIENT_ID,
+            "sub": f"google_{code}", "email": f"{code}@test", "name": code,
+            "iat": now, "exp": now + 3600,
+        }, kid)})
+
+
+def reset_key_cache(monkeypatch):
+    monkeypatch.setattr(google, "_keys", {})
+    monkeypatch.setattr(google, "_keys_expire_at", 0.0)
+    monkeypatch.setattr(google, "_keys_fetched_at", None)
+    monkeypatch.setattr(google, "_refresh_lock", asyncio.Lock())
+
+
+def test_login_succeeds_right_after_key_rotation(database, monkeypatch):
+    reset_key_cache(monkeypatch)
+    # Pretend the first fetch is long past the forced-refresh throttle
+    monkeypatch.setattr(google, "GOOGLE_JWKS_FORCED_REFRESH_INTERVAL", 0)
+    stub = RotatingGoogle()
+
+    async def scenario():
+        await google.open_client(transport=httpx.MockTransport(stub.handler))
+        statuses = []
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            for code in ("before", "after"):
+                response = await client.get("/auth/google/callback", params={"code": code})
+                statuses.append(response.status_code)
+                stub.rotate()
+        return statuses
+
+    assert run(scenario()) == [200, 200]
+    assert stub.certs_fetches == 2
+
+
+def test_unknown_kid_refetches_at_most_once_per_interval(database, monkeypatch):
+    reset_key_cache(monkeypatch)
+    stub = RotatingGoogle()
+
+    async def scenario():
+        await google.open_client(transport=httpx.MockTransport(stub.handler))
+        statuses = []
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            for _ in range(5):
+                response = await client.get("/auth/google/callback", params={"code": "bogus"})
+                statuses.append(response.status_code)
+        return statuses
+
+    assert run(scenario()) == [400] * 5
+    # The cold fetch, then nothing: the set is younger than the throttle
+    assert stub.certs_fetches == 1
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from app.db.connectDB import AsyncSessionLocal
+from app.models.models import TransferResponse
+from app.schemas.schemas import IdempotencyKey, Wallet
+from app.utils import idempotency, transfers
+from tests.helpers import run, create_wallet
+
+
+async def balances(*wallet_ids):
+    async with AsyncSessionLocal() as db:
+        rows = await db.execute(select(Wallet.id, Wallet.balance).filter(Wallet.id.in_(wallet_ids)))
+        return dict(rows.all())
+
+
+async def stored_record(user_id, key):
+    async with AsyncSessionLocal() as db:
+        return await db.get(IdempotencyKey, (user_id, key))
+
+
+def test_transfer_and_stored_response_commit_together(database):
+    async def scenario():
+        sender = await create_wallet(1000)
+        recipient = await create_wallet()
+
+        async with AsyncSessionLocal() as db:
+            async def handler():
+                await transfers.transfer(db, sender.id, recipient.id, 2.5, commit=False)
+                return TransferResponse(status="success", message="Transfer completed")
+
+            await idempotency.run_once(db, sender.user_id, "key-1", "fp", handler)
+        return (await balances(sender.id, recipient.id),
+                await stored_record(sender.user_id, "key-1"), sender.id, recipient.id)
+
+    moved, record, sender_id, recipient_id = run(scenario())
+    assert moved == {sender_id: 750, recipient_id: 250}
+    assert record.status == "completed"
+
+
+def test_interrupted_before_response_is_stored_moves_no_money(database, monkeypatch):
+    async def scenario():
+        sender = await create_wallet(1000)
+        recipient = await create_wallet()
+        real_get = AsyncSessionLocal.class_.get
+
+        async def cancelled_get(self, entity, *args, **kwargs):
+            # The worker is cancelled right after the handler returns
+            if entity is IdempotencyKey and transfer_done:
+                raise asyncio.CancelledError
+            return await real_get(self, entity, *args, **kwargs)
+
+        transfer_done = []
+        monkeypatch.setattr(AsyncSessionLocal.class_, "get", cancelled_get)
+
+        async with AsyncSessionLocal() as db:
+            async def handler():
+                await transfers.transfer(db, sender.id, recipient.id, 2.5, commit=False)
+                transfer_done.append(True)
+                return TransferResponse(status="success", message="Transfer completed")
+
+            with pytest.raises(asyncio.CancelledError):
+                await idempotency.run_once(db, sender.user_id, "key-2", "fp", handler)
+
+        monkeypatch.setattr(AsyncSessionLocal.class_, "get", real_get)
+        return (await balances(sender.id, recipient.id),
+                await stored_record(sender.user_id, "key-2"), sender.id)
+
+    moved, record, sender_id = run(scenario())
+    # Neither the transfer nor a stuck in-progress key survives
+    assert moved[sender_id] == 1000
+    assert record is None
@@ -0,0 +1,21 @@
+import pytest
+
+from app import manage
+
+
+@pytest.mark.parametrize("argv, message", [
+    (["shard", "4566678954356", "-1"], "must not be negative"),
+    (["backfill-rollups", "--until", "2999-01-01"], "cannot be later than today"),
+    (["backfill-rollups", "--until", "soon"], "expected YYYY-MM-DD"),
+])
+def test_invalid_arguments_exit_with_usage_error(argv, message, capsys):
+    with pytest.raises(SystemExit) as exit:
+        manage.main(argv)
+    assert exit.value.code == 2
+    assert message in capsys.readouterr().err
+
+
+def test_unknown_wallet_exits_non_zero_with_message(database):
+    with pytest.raises(SystemExit) as exit:
+        manage.main(["shard", "0000000000000", "2"])
+    assert exit.value.code == "error: wallet 0000000000000 not found"
@@ -0,0 +1,128 @@
+from datetime import datetime, timedelta
+
+import httpx
+import jwt
+import pytest
+from sqlalchemy import func, select, text
+
+from app.db.connectDB import AsyncSessionLocal, async_engine
+from app.main import app
+from app.manage import migrate
+from app.schemas.schemas import ApiKey, User, Wallet, LedgerEntry
+from app.utils import api_keys
+from app.utils.ledger import balance_at
+from app.utils.utils import JWT_ALGORITHM, JWT_SECRET, api_key_cache, hash_api_key
+from tests.helpers import run, create_wallet
+
+
+@pytest.mark.skipif(async_engine.dialect.name != "sqlite", reason="builds a SQLite legacy table")
+def test_migrate_converts_legacy_float_balances(database):
+    async def scenario():
+        async with async_engine.begin() as conn:
+            await conn.execute(text("DROP TABLE wallets"))
+            await conn.execute(text(
+                "CREATE TABLE wallets (id VARCHAR PRIMARY KEY, user_id VARCHAR, "
+                "wallet_number VARCHAR UNIQUE, balance FLOAT, "
+                "shard_count INTEGER NOT NULL DEFAULT 0, created_at DATETIME)"))
+            await conn.execute(text(
+                "INSERT INTO wallets VALUES "
+                "('w1', 'u1', '1', 12.34, 0, '2024-01-01 00:00:00'), "
+                "('w2', 'u2', '2', 0.0, 0, '2024-01-01 00:00:00'), "
+                "('w3', 'u3', '3', 0.29, 0, '2024-01-01 00:00:00')"))
+
+        await migrate()
+        # A second run finds nothing to convert
+        await migrate()
+
+        async with AsyncSessionLocal() as db:
+            balances = dict((await db.execute(select(Wallet.id, Wallet.balance))).all())
+            entries = (await db.execute(
+                select(LedgerEntry.wallet_id, LedgerEntry.amount).order_by(LedgerEntry.wallet_id))).all()
+            history = await balance_at(db, "w1", datetime(2025, 1, 1))
+        return balances, entries, history
+
+    balances, entries, history = run(scenario())
+    assert balances == {"w1": 1234, "w2": 0, "w3": 29}
+    assert [tuple(entry) for entry in entries] == [("w1", 1234), ("w3", 29)]
+    assert history == 1234
+
+
+@pytest.mark.skipif(async_engine.dialect.name != "sqlite", reason="drops a column the SQLite way")
+def test_migrate_adds_wallet_shard_count_to_existing_wallets(database):
+    async def scenario():
+        wallet = await create_wallet(balance=700)
+        async with async_engine.begin() as conn:
+            await conn.execute(text("ALTER TABLE wallets DROP COLUMN shard_count"))
+
+        await migrate()
+        token = jwt.encode({"sub": wallet.user_id}, JWT_SECRET, algorithm=JWT_ALGORITHM)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get("/wallet/balance", headers={"authorization": f"Bearer {token}"})
+        return response.status_code, response.json()
+
+    assert run(scenario()) == (200, {"balance": 7.0})
+
+
+@pytest.mark.skipif(async_engine.dialect.name != "sqlite", reason="drops a column the SQLite way")
+def test_migrate_adds_api_key_rate_limit_to_existing_keys(database):
+    async def scenario():
+        wallet = await create_wallet()
+        async with AsyncSessionLocal() as db:
+            db.add(ApiKey(
+                id="old-key", user_id=wallet.user_id, key_hash=hash_api_key("sk_test_old"),
+                name="old", permissions="read",
+                expires_at=datetime.utcnow() + timedelta(days=1), counted=True))
+            await db.commit()
+        async with async_engine.begin() as conn:
+            await conn.execute(text("ALTER TABLE api_keys DROP COLUMN rate_limit"))
+
+        await migrate()
+        api_key_cache.clear()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get("/wallet/balance", headers={"x-api-key": "sk_test_old"})
+        return response.status_code
+
+    assert run(scenario()) == 200
+
+
+@pytest.mark.skipif(async_engine.dialect.name != "sqlite", reason="drops a column the SQLite way")
+def test_migrate_counts_existing_active_api_keys(database):
+    async def scenario():
+        wallet = await create_wallet()
+        async with AsyncSessionLocal() as db:
+            for i, (revoked, days) in enumerate([(False, 1)] * 5 + [(True, 1), (False, -1)]):
+                db.add(ApiKey(
+                    id=f"key-{i}", user_id=wallet.user_id, key_hash=f"hash-{i}", name="old",
+                    permissions="read", revoked=revoked,
+                    expires_at=datetime.utcnow() + timedelta(days=days)))
+            await db.commit()
+        async with async_engine.begin() as conn:
+            for table, column in [("users", "active_api_keys"), ("api_keys", "counted"),
+                                  ("api_keys", "revoked_at")]:
+                await conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+
+        await migrate()
+        async with AsyncSessionLocal() as db:
+            active = await db.scalar(select(User.active_api_keys).filter(User.id == wallet.user_id))
+            counted = await db.scalar(select(func.count()).select_from(ApiKey).filter(ApiKey.counted == True))
+            # Already at the cap, so a sixth key is refused
+            claimed = await api_keys.claim_slot(db, wallet.user_id)
+        return active, counted, claimed
+
+    assert run(scenario()) == (5, 5, False)
+
+
+@pytest.mark.skipif(async_engine.dialect.name != "sqlite", reason="inspects SQLite indexes")
+def test_migrate_adds_indexes_to_existing_tables(database):
+    async def scenario():
+        async with async_engine.begin() as conn:
+            await conn.execute(text("DROP INDEX ix_transactions_wallet_created_id"))
+            await conn.execute(text("DROP INDEX ix_api_keys_user_revoked_expires"))
+        await migrate()
+        async with async_engine.connect() as conn:
+            return set(await conn.scalars(text("SELECT name FROM sqlite_master WHERE type = 'index'")))
+
+    indexes = run(scenario())
+    assert {"ix_transactions_wallet_created_id", "ix_api_keys_user_revoked_expires"} <= indexes
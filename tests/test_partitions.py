@@ -0,0 +1,60 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select, text
+
+from app.db.connectDB import AsyncSessionLocal, async_engine
+from app.schemas.schemas import Transaction, TransactionArchive
+from app.utils.partitions import add_months, archive_once, archive_rows, hot_cutoff, partition_name
+from tests.helpers import run
+
+
+def old_transaction(id, month, status):
+    return Transaction(
+        id=id, wallet_id="w", type="deposit", amount=1, reference=f"txn_{id}",
+        status=status, created_at=datetime.combine(month, datetime.min.time()))
+
+
+def test_row_archival_leaves_pending_deposits(database):
+    month = add_months(hot_cutoff().date(), -1)
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            db.add_all([old_transaction("settled", month, "success"),
+                        old_transaction("pending", month, "pending")])
+            await db.commit()
+            await archive_rows(db)
+            hot = (await db.scalars(select(Transaction.id))).all()
+            archived = (await db.scalars(select(TransactionArchive.id))).all()
+        return hot, archived
+
+    assert run(scenario()) == (["pending"], ["settled"])
+
+
+@pytest.mark.skipif(async_engine.dialect.name != "postgresql", reason="needs partitioned Postgres")
+def test_partition_archival_skips_months_with_pending_deposits(database):
+    settled_month = add_months(hot_cutoff().date(), -1)
+    pending_month = add_months(hot_cutoff().date(), -2)
+
+    async def scenario():
+        async with async_engine.begin() as conn:
+            for month in (settled_month, pending_month):
+                await conn.execute(text(
+                    f"CREATE TABLE {partition_name(month)} PARTITION OF transactions "
+                    f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"))
+        async with AsyncSessionLocal() as db:
+            db.add_all([old_transaction("settled", settled_month, "success"),
+                        old_transaction("pending", pending_month, "pending")])
+            await db.commit()
+            await archive_once(db)
+
+        async with async_engine.connect() as conn:
+            parents = dict((await conn.execute(text("""
+                SELECT child.relname, parent.relname
+                FROM pg_inherits
+                JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+                JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            """))).all())
+        return parents[partition_name(settled_month)], parents[partition_name(pending_month)]
+
+    assert run(scenario()) == ("transactions_archive", "transactions")
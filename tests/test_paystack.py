@@ -0,0 +1,71 @@
+import asyncio
+import json
+
+import httpx
+import jwt
+
+from app.db.connectDB import async_engine
+from app.main import app
+from app.utils import paystack
+from app.utils.utils import JWT_ALGORITHM, JWT_SECRET, user_principal_cache
+from tests.helpers import run, create_wallet
+from tests.stubs import StubServer
+
+
+async def initialize_handler(method, path, body):
+    await asyncio.sleep(0.01)
+    reference = json.loads(body)["reference"]
+    return 200, {"status": True, "data": {
+        "authorization_url": f"https://checkout.test/{reference}", "reference": reference}}, {}
+
+
+def test_deposits_reuse_pooled_connections(monkeypatch):
+    pool_size = 4
+    monkeypatch.setattr(paystack, "PAYSTACK_MAX_CONNECTIONS", pool_size)
+    monkeypatch.setattr(paystack, "PAYSTACK_MAX_KEEPALIVE", pool_size)
+
+    async def scenario():
+        async with StubServer(initialize_handler) as stub:
+            monkeypatch.setattr(paystack, "PAYSTACK_BASE_URL", stub.url)
+            await paystack.open_client()
+            try:
+                for wave in range(3):
+                    results = await asyncio.gather(*(
+                        paystack.initialize_transaction("payer@test", 100, f"txn_{wave}_{i}")
+                        for i in range(25)
+                    ))
+                    assert all(result["status"] for result in results)
+            finally:
+                await paystack.close_client()
+            return stub
+
+    stub = asyncio.run(scenario())
+    assert stub.requests == 75
+    # One connection per pool slot, reused across all three waves
+    assert stub.connections <= pool_size
+
+
+def test_deposit_holds_no_db_connection_during_paystack_call(database, monkeypatch):
+    checked_out = []
+
+    async def initialize_transaction(email, amount, reference):
+        checked_out.append(async_engine.pool.checkedout())
+        return {"status": True, "data": {"authorization_url": f"https://checkout.test/{reference}"}}
+
+    monkeypatch.setattr(paystack, "initialize_transaction", initialize_transaction)
+
+    async def scenario():
+        wallet = await create_wallet()
+        token = jwt.encode({"sub": wallet.user_id}, JWT_SECRET, algorithm=JWT_ALGORITHM)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            for headers in ({}, {"idempotency-key": "deposit-once"}):
+                # Cold principal cache, so the request's session has queried first
+                user_principal_cache.clear()
+                response = await client.post(
+                    "/wallet/deposit", json={"amount": 100},
+                    headers={"authorization": f"Bearer {token}", **headers})
+                assert response.status_code == 200, response.text
+
+    run(scenario())
+    assert checked_out == [0, 0]
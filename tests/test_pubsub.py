@@ -0,0 +1,130 @@
+import asyncio
+import json
+
+import asyncpg
+import httpx
+import jwt
+from sqlalchemy import update
+
+from app.db.connectDB import AsyncSessionLocal
+from app.main import app
+from app.routes.wallet.wallet import stream_deposit_status
+from app.schemas.schemas import Transaction
+from app.utils import pubsub
+from app.utils.utils import JWT_ALGORITHM, JWT_SECRET
+from tests.helpers import run, create_wallet
+
+
+class FakeConnection:
+    """Just enough of an asyncpg connection to drop and watch it come back"""
+
+    def __init__(self, connections):
+        self.listeners = {}
+        self.on_termination = None
+        self.closed = False
+        connections.append(self)
+
+    async def add_listener(self, channel, callback):
+        self.listeners[channel] = callback
+
+    def add_termination_listener(self, callback):
+        self.on_termination = callback
+
+    async def fetchval(self, query):
+        return 1
+
+    async def execute(self, query, *args):
+        for callback in self.listeners.values():
+            callback(self, 0, args[0], args[1])
+
+    def drop(self):
+        self.closed = True
+        self.on_termination(self)
+
+    def terminate(self):
+        self.closed = True
+
+    async def close(self):
+        self.closed = True
+
+
+def test_postgres_backend_relistens_and_resyncs_after_connection_loss(monkeypatch):
+    connections = []
+
+    async def connect(dsn):
+        return FakeConnection(connections)
+
+    monkeypatch.setattr(asyncpg, "connect", connect)
+
+    async def scenario():
+        backend = pubsub.PostgresBackend("postgresql://fake")
+        received = []
+        await backend.start(lambda channel, message: received.append((channel, message)))
+        try:
+            with pubsub.subscription("deposit.ref") as waiting:
+                connections[0].drop()
+                resynced = await asyncio.wait_for(waiting, 1)
+            await backend.publish("deposit.ref", "settled")
+        finally:
+            await backend.stop()
+        return resynced, received
+
+    resynced, received = run(scenario())
+    assert len(connections) == 2
+    assert connections[0].closed and connections[1].closed
+    assert pubsub.PUBSUB_PG_CHANNEL in connections[1].listeners
+    # Woken to re-read state, then messages flow over the new connection
+    assert resynced is None
+    assert received == [("deposit.ref", "settled")]
+
+
+def test_deposit_stream_rereads_status_after_resync(database):
+    async def scenario():
+        wallet = await create_wallet()
+        async with AsyncSessionLocal() as db:
+            db.add(Transaction(
+                id="resync", wallet_id=wallet.id, type="deposit", amount=10,
+                reference="txn_resync", status="pending"))
+            await db.commit()
+
+        stream = stream_deposit_status("txn_resync", wallet.id)
+        events = [await stream.__anext__()]
+        next_event = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+
+        # Settled while the notification was lost with the connection
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(Transaction).where(
+                Transaction.reference == "txn_resync").values(status="success"))
+            await db.commit()
+        pubsub.resync()
+
+        events.append(await asyncio.wait_for(next_event, 1))
+        await stream.aclose()
+        return events
+
+    events = run(scenario())
+    statuses = [json.loads(event.split("data: ", 1)[1])["status"] for event in events]
+    assert statuses == ["pending", "success"]
+
+
+def test_deposit_events_reject_unknown_and_foreign_references(database):
+    async def scenario():
+        owner = await create_wallet()
+        other = await create_wallet()
+        async with AsyncSessionLocal() as db:
+            db.add(Transaction(
+                id="owned", wallet_id=owner.id, type="deposit", amount=10,
+                reference="txn_owned", status="success"))
+            await db.commit()
+        token = jwt.encode({"sub": other.user_id}, JWT_SECRET, algorithm=JWT_ALGORITHM)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [
+                (await client.get(f"/wallet/deposit/{reference}/{endpoint}",
+                                  headers={"authorization": f"Bearer {token}"})).status_code
+                for reference in ("txn_missing", "txn_owned")
+                for endpoint in ("status", "events")
+            ]
+
+    assert run(scenario()) == [404, 404, 403, 403]
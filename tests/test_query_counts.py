@@ -0,0 +1,108 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import httpx
+import jwt
+from sqlalchemy import event
+
+from app.db.connectDB import AsyncSessionLocal, async_engine
+from app.main import app
+from app.schemas.schemas import ApiKey, Transaction
+from app.utils.utils import (
+    JWT_ALGORITHM, JWT_SECRET, api_key_cache, get_api_key_principal,
+    get_token_principal, hash_api_key, user_principal_cache)
+from tests.helpers import run, create_wallet
+
+RAW_KEY = "sk_test_query_counts"
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+async def setup():
+    api_key_cache.clear()
+    user_principal_cache.clear()
+    sender = await create_wallet(100_000)
+    recipient = await create_wallet()
+    async with AsyncSessionLocal() as db:
+        db.add(ApiKey(
+            id="key1", user_id=sender.user_id, key_hash=hash_api_key(RAW_KEY), name="test",
+            permissions="deposit,transfer,read",
+            expires_at=datetime.utcnow() + timedelta(days=1), counted=True))
+        db.add(Transaction(
+            id="dep1", wallet_id=sender.id, type="deposit", amount=5.0,
+            reference="txn_counted", status="pending"))
+        await db.commit()
+    return sender, recipient
+
+
+def test_api_key_lookup_is_one_query_cold_and_none_cached(database):
+    async def scenario():
+        await setup()
+        async with AsyncSessionLocal() as db:
+            with count_queries() as cold:
+                await get_api_key_principal(RAW_KEY, db)
+            with count_queries() as warm:
+                await get_api_key_principal(RAW_KEY, db)
+        return len(cold), len(warm)
+
+    assert run(scenario()) == (1, 0)
+
+
+def test_token_lookup_is_one_query_cold_and_none_cached(database):
+    async def scenario():
+        sender, _ = await setup()
+        token = jwt.encode({"sub": sender.user_id}, JWT_SECRET, algorithm=JWT_ALGORITHM)
+        async with AsyncSessionLocal() as db:
+            with count_queries() as cold:
+                await get_token_principal(f"Bearer {token}", db)
+            with count_queries() as warm:
+                await get_token_principal(f"Bearer {token}", db)
+        return len(cold), len(warm)
+
+    assert run(scenario()) == (1, 0)
+
+
+def test_wallet_route_query_counts(database):
+    async def scenario():
+        _, recipient = await setup()
+        counts = {}
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            # Warm the principal cache so only the route's own queries are counted
+            await client.get("/wallet/balance", headers={"x-api-key": RAW_KEY})
+            for name, method, path, body in [
+                ("balance", "GET", "/wallet/balance", None),
+                ("transactions", "GET", "/wallet/transactions", None),
+                ("summary", "GET", "/wallet/summary", None),
+                ("deposit_status", "GET", "/wallet/deposit/txn_counted/status", None),
+                ("transfer", "POST", "/wallet/transfer",
+                 {"wallet_number": recipient.wallet_number, "amount": 1}),
+            ]:
+                with count_queries() as statements:
+                    response = await client.request(
+                        method, path, json=body, headers={"x-api-key": RAW_KEY})
+                assert response.status_code == 200, (name, response.text)
+                counts[name] = len(statements)
+        return counts
+
+    assert run(scenario()) == {
+        "balance": 1,
+        "transactions": 1,
+        "summary": 1,
+        "deposit_status": 1,
+        # Recipient lookup, debit, credit, then one insert each for
+        # transactions, ledger entries and rollups
+        "transfer": 6,
+    }
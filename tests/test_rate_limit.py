@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+
+import httpx
+import jwt
+from sqlalchemy import event
+
+from app.db.connectDB import AsyncSessionLocal, async_engine
+from app.main import app
+from app.schemas.schemas import ApiKey
+from app.utils import rate_limit
+from app.utils.utils import JWT_ALGORITHM, JWT_SECRET, api_key_cache, hash_api_key
+from tests.helpers import run, create_wallet
+
+RAW_KEY = "sk_test_limited"
+
+
+def test_key_limit_holds_across_principal_cache_misses(database, monkeypatch):
+    monkeypatch.setattr(rate_limit, "backend", rate_limit.InMemoryBackend())
+
+    async def scenario():
+        wallet = await create_wallet()
+        async with AsyncSessionLocal() as db:
+            db.add(ApiKey(
+                id="limited", user_id=wallet.user_id, key_hash=hash_api_key(RAW_KEY),
+                name="limited", permissions="read", rate_limit=3,
+                expires_at=datetime.utcnow() + timedelta(days=1), counted=True))
+            await db.commit()
+
+        statuses = []
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            for _ in range(6):
+                # Every request starts cold, as after the cache TTL runs out
+                api_key_cache.clear()
+                response = await client.get("/wallet/balance", headers={"x-api-key": RAW_KEY})
+                statuses.append(response.status_code)
+        return statuses
+
+    assert run(scenario()) == [200, 200, 200, 429, 429, 429]
+
+
+def test_key_rate_limit_is_capped(database):
+    async def scenario():
+        wallet = await create_wallet()
+        token = jwt.encode({"sub": wallet.user_id}, JWT_SECRET, algorithm=JWT_ALGORITHM)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            statuses = []
+            for limit in (rate_limit.API_KEY_MAX_RATE_LIMIT, rate_limit.API_KEY_MAX_RATE_LIMIT + 1):
+                response = await client.post("/keys/create", json={
+                    "name": "fast", "permissions": ["read"], "expiry": "1D", "rate_limit": limit},
+                    headers={"authorization": f"Bearer {token}"})
+                statuses.append(response.status_code)
+
+        # A key stored before the cap existed is clamped to it
+        async with AsyncSessionLocal() as db:
+            db.add(ApiKey(
+                id="legacy", user_id=wallet.user_id, key_hash=hash_api_key("sk_test_legacy"),
+                name="legacy", permissions="read", rate_limit=10 ** 8,
+                expires_at=datetime.utcnow() + timedelta(days=1), counted=True))
+            await db.commit()
+        return statuses, await rate_limit.api_key_limit("sk_test_legacy")
+
+    assert run(scenario()) == ([200, 422], rate_limit.API_KEY_MAX_RATE_LIMIT)
+
+
+def test_bogus_keys_share_a_bucket_and_are_looked_up_once(database, monkeypatch):
+    monkeypatch.setattr(rate_limit, "backend", rate_limit.InMemoryBackend())
+    monkeypatch.setattr(rate_limit, "API_KEY_RATE_LIMIT", 3)
+    queries = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if "api_keys" in statement:
+            queries.append(statement)
+
+    async def scenario():
+        event.listen(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                statuses = [
+                    (await client.get("/wallet/balance", headers={"x-api-key": f"sk_bogus_{i}"})).status_code
+                    for i in range(5)]
+                # The same bogus key again is answered from the negative cache
+                await client.get("/wallet/balance", headers={"x-api-key": "sk_bogus_0"})
+        finally:
+            event.remove(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+        return statuses
+
+    assert run(scenario()) == [401, 401, 401, 429, 429]
+    # One lookup per distinct key, shared by the middleware and the route
+    assert len(queries) == 5
@@ -0,0 +1,50 @@
+import httpx
+import jwt
+from sqlalchemy import select
+
+from app.db.connectDB import AsyncSessionLocal
+from app.main import app
+from app.routes.wallet import wallet as wallet_routes
+from app.schemas.schemas import Wallet
+from app.utils import pubsub, replicas
+from app.utils.utils import JWT_ALGORITHM, JWT_SECRET
+from tests.helpers import run, create_wallet
+
+REPLICA = object()
+
+
+def test_write_announced_by_another_worker_pins_reads_to_primary(monkeypatch):
+    monkeypatch.setattr(replicas, "ReplicaSessionLocal", REPLICA)
+    monkeypatch.setitem(replicas.state, "healthy", True)
+    replicas.recent_writers.clear()
+
+    pubsub.deliver(replicas.REPLICA_WRITES_CHANNEL, "writer")
+
+    assert replicas.read_session_factory("writer") is AsyncSessionLocal
+    assert replicas.read_session_factory("reader") is REPLICA
+
+
+def test_transfer_is_committed_before_it_is_announced(database, monkeypatch):
+    seen = []
+
+    async def note_write(user_id):
+        # A fresh session only sees committed data
+        async with AsyncSessionLocal() as db:
+            seen.append(await db.scalar(select(Wallet.balance).filter(Wallet.user_id == user_id)))
+
+    monkeypatch.setattr(wallet_routes, "note_write", note_write)
+
+    async def scenario():
+        sender = await create_wallet(balance=500)
+        recipient = await create_wallet()
+        token = jwt.encode({"sub": sender.user_id}, JWT_SECRET, algorithm=JWT_ALGORITHM)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            for headers in ({}, {"idempotency-key": "announce-once"}):
+                response = await client.post(
+                    "/wallet/transfer", json={"wallet_number": recipient.wallet_number, "amount": 1},
+                    headers={"authorization": f"Bearer {token}", **headers})
+                assert response.status_code == 200, response.text
+
+    run(scenario())
+    assert seen == [400, 300]
@@ -0,0 +1,24 @@
+from datetime import datetime, timedelta
+
+from app.db.connectDB import AsyncSessionLocal
+from app.utils import rollups, transfers
+from tests.helpers import run, create_wallet
+
+
+def test_transfer_direction_does_not_depend_on_amount_sign(database):
+    async def scenario():
+        sender = await create_wallet(balance=500)
+        recipient = await create_wallet()
+        async with AsyncSessionLocal() as db:
+            # 0.001 rounds to zero kobo, which used to count as an incoming transfer
+            for amount in (1, 2, 0.001):
+                await transfers.transfer(db, sender.id, recipient.id, amount)
+            today = datetime.utcnow().date()
+            tomorrow = today + timedelta(days=1)
+            sent = await rollups.summarize(db, sender.id, today, tomorrow)
+            received = await rollups.summarize(db, recipient.id, today, tomorrow)
+        return sent[0], received[0]
+
+    sent, received = run(scenario())
+    assert (sent["transfers_out_count"], sent["transfers_in_count"], sent["transfers_out"]) == (3, 0, 300)
+    assert (received["transfers_in_count"], received["transfers_out_count"], received["transfers_in"]) == (3, 0, 300)
@@ -0,0 +1,122 @@
+import asyncio
+import time
+
+import httpx
+import jwt
+from fastapi import HTTPException
+from sqlalchemy import select, func
+
+from app.db.connectDB import AsyncSessionLocal
+from app.main import app
+from app.schemas.schemas import Wallet, LedgerEntry
+from app.utils import transfers
+from app.utils.utils import JWT_ALGORITHM, JWT_SECRET
+from tests.helpers import run, create_wallet
+
+AMOUNT = 10.0  # naira
+AMOUNT_MINOR = 1000
+FUNDED_TRANSFERS = 25
+ATTEMPTS = 60
+
+
+async def balance(wallet_id: str) -> int:
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(select(Wallet.balance).filter(Wallet.id == wallet_id))
+
+
+async def ledger_sum(wallet_id: str) -> int:
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(
+            select(func.coalesce(func.sum(LedgerEntry.amount), 0))
+            .filter(LedgerEntry.wallet_id == wallet_id))
+
+
+def test_concurrent_debits_never_overdraw(database, record_property):
+    async def scenario():
+        sender = await create_wallet(FUNDED_TRANSFERS * AMOUNT_MINOR)
+        recipient = await create_wallet()
+
+        async def attempt() -> bool:
+            async with AsyncSessionLocal() as db:
+                try:
+                    await transfers.transfer(db, sender.id, recipient.id, AMOUNT)
+                    return True
+                except HTTPException as e:
+                    assert e.status_code == 400
+                    return False
+
+        observed = []
+        done = asyncio.Event()
+
+        async def watch():
+            while not done.is_set():
+                observed.append(await balance(sender.id))
+                await asyncio.sleep(0)
+
+        watcher = asyncio.create_task(watch())
+        started = time.perf_counter()
+        results = await asyncio.gather(*(attempt() for _ in range(ATTEMPTS)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await watcher
+
+        return sender, recipient, results, observed, elapsed, (
+            await balance(sender.id), await balance(recipient.id),
+            await ledger_sum(sender.id), await ledger_sum(recipient.id))
+
+    sender, recipient, results, observed, elapsed, final = run(scenario())
+    sender_balance, recipient_balance, sender_ledger, recipient_ledger = final
+    successes = sum(results)
+
+    rate = ATTEMPTS / elapsed
+    record_property("transfers_per_second", round(rate, 1))
+    print(f"\n{ATTEMPTS} concurrent transfers ({successes} succeeded) "
+          f"in {elapsed:.2f}s: {rate:.1f} transfers/s")
+
+    assert min(observed + [sender_balance]) >= 0
+    assert successes == FUNDED_TRANSFERS
+    debited = FUNDED_TRANSFERS * AMOUNT_MINOR - sender_balance
+    assert debited == successes * AMOUNT_MINOR
+    assert recipient_balance == successes * AMOUNT_MINOR
+    assert sender_ledger == sender_balance
+    assert recipient_ledger == recipient_balance
+
+
+def test_sub_kobo_amounts_are_rejected(database):
+    async def scenario():
+        sender = await create_wallet(balance=500)
+        recipient = await create_wallet()
+        token = jwt.encode({"sub": sender.user_id}, JWT_SECRET, algorithm=JWT_ALGORITHM)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            statuses = []
+            for amount in (0.001, 1.005, 0.01):
+                response = await client.post(
+                    "/wallet/transfer", json={"wallet_number": recipient.wallet_number, "amount": amount},
+                    headers={"authorization": f"Bearer {token}"})
+                statuses.append(response.status_code)
+        return statuses, await balance(sender.id), await balance(recipient.id)
+
+    assert run(scenario()) == ([422, 422, 200], 499, 1)
+
+
+def test_batch_with_no_payable_item_fails(database):
+    async def scenario():
+        sender = await create_wallet(balance=500)
+        recipient = await create_wallet()
+        token = jwt.encode({"sub": sender.user_id}, JWT_SECRET, algorithm=JWT_ALGORITHM)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            responses = []
+            for numbers in (["0000000000000", sender.wallet_number],
+                            ["0000000000000", recipient.wallet_number]):
+                response = await client.post(
+                    "/wallet/transfer/batch",
+                    json={"transfers": [{"wallet_number": n, "amount": 1} for n in numbers]},
+                    headers={"authorization": f"Bearer {token}"})
+                body = response.json()
+                body = body.get("detail", body)
+                responses.append((response.status_code, body["status"], body["total"]))
+        return responses, await balance(sender.id)
+
+    assert run(scenario()) == ([(400, "failed", 0), (200, "partial", 1)], 400)